@@ -0,0 +1,2 @@
+# benchmarks are plain scripts, run them from the root with e.g.
+# `python -m bench.bench_lexer`
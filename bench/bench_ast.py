@@ -0,0 +1,102 @@
+import sys
+import tracemalloc
+from dataclasses import field, fields, make_dataclass
+
+from src.python.lexer import tokenise
+from src.python.parser import Parser
+from src.python import ast_nodes as ast
+from .programs import data_pipeline
+
+
+def count_nodes(root):
+    # walks the tree without recursing, counting the nodes in it, which are
+    # the dataclasses
+    n = 0
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif hasattr(node, "__dataclass_fields__"):
+            n += 1
+            stack.extend(getattr(node, name) for name in node.__dataclass_fields__)
+    return n
+
+
+def unslotted_classes():
+    # the node classes as they were before slots: dataclasses with an
+    # instance dict, and with the `typ` of expressions and `checked_type` of
+    # declarations that the type checker no longer used
+    classes = {}
+    for cls in vars(ast).values():
+        if not isinstance(cls, type) or not issubclass(cls, ast.Node):
+            continue
+        names = [f.name for f in fields(cls)]
+        if issubclass(cls, ast.Expr):
+            names.append("typ")
+        if issubclass(cls, ast.Declr):
+            names.append("checked_type")
+        classes[cls] = make_dataclass(
+            cls.__name__, [(name, object, field(default=None, kw_only=True)) for name in names]
+        )
+    return classes
+
+
+def unslotted(tree, classes):
+    # a copy of `tree` made of the unslotted classes, built bottom up
+    # without recursing
+    copies = {}
+    stack = [(tree, False)]
+    while stack:
+        node, built = stack.pop()
+        if isinstance(node, list):
+            children = node
+        elif isinstance(node, ast.Node):
+            children = [getattr(node, name) for name in node.__dataclass_fields__]
+        else:
+            continue
+        if not built:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+        elif isinstance(node, list):
+            copies[id(node)] = [copies.get(id(child), child) for child in node]
+        else:
+            copies[id(node)] = classes[type(node)](**{
+                name: copies.get(id(child), child)
+                for name, child in zip(node.__dataclass_fields__, children)
+            })
+    return copies[id(tree)]
+
+
+def report(name, n, size, peak):
+    print(
+        f"{name:>10}: {n} nodes  {size / 1e6:7.2f} MB  {size / n:6.1f} B/node  "
+        f"peak {peak / 1e6:7.2f} MB"
+    )
+
+
+def main(n_funcs=2000):
+    # the tokens are made first, so only the tree is measured
+    tokens = tokenise(data_pipeline(n_funcs))
+    tracemalloc.start()
+    tree = Parser(tokens).parse_program()
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n = count_nodes(tree)
+
+    # the same tree as it was before the nodes had slots, measured as it is
+    # copied, so its peak includes the map from the nodes to their copies
+    classes = unslotted_classes()
+    tracemalloc.start()
+    copy = unslotted(tree, classes)
+    before = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert count_nodes(copy) == n
+
+    report("before", n, *before)
+    report("slotted", n, size, peak)
+    print(f"{before[0] / size:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,64 @@
+import sys
+import tracemalloc
+
+from bench.bench_calls import BACKENDS, bench
+from src.python.interpreter import StaArray, StaObject, StaVariable, new_sequence
+from src.python import builtin
+from src.python import type_defs as types
+
+
+SUM = """
+fn main() int {
+    var a = [0:%d]
+    var i = 0
+    var s = 0
+    while i < %d {
+        a[i] = a[i] * 2
+        s = s + a[i]
+        i = i + 1
+    }
+    return s
+}
+"""
+
+
+def allocated(make):
+    tracemalloc.start()
+    obj = make()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return size
+
+
+def main(n=1_000_000, n_loop=5000):
+    int_t = builtin.types["int"]
+    typ = types.ArrayType(int_t, n)
+    # a list of variables, each holding a boxed element, as sequences were stored
+    boxed = allocated(
+        lambda: StaArray(typ, [StaVariable("", StaObject(int_t, i)) for i in range(n)])
+    )
+    buffer = allocated(lambda: new_sequence(typ, range(n)))
+    lazy = allocated(lambda: StaArray(typ, range(n)))
+    print(f"arr[int] of {n} elements:")
+    print(f"  {'boxed list':>12}: {boxed / n:6.1f} B/element")
+    print(f"  {'buffer':>12}: {buffer / n:6.1f} B/element  x{boxed / buffer:.0f} smaller")
+    print(f"  {'range':>12}: {lazy:6d} B in all")
+
+    str_t, char_t = builtin.types["str"], builtin.types["char"]
+    chars = allocated(
+        lambda: StaArray(str_t, [StaVariable("", StaObject(char_t, "a")) for _ in range(n)])
+    )
+    packed = allocated(lambda: StaObject(str_t, "a" * n))
+    print(f"str of {n} chars:")
+    print(f"  {'boxed chars':>12}: {chars / n:6.1f} B/char")
+    print(f"  {'packed':>12}: {packed / n:6.1f} B/char  x{chars / packed:.0f} smaller")
+
+    print(f"indexed loop over {n_loop} elements:")
+    for backend, run in BACKENDS.items():
+        t = bench(SUM % (n_loop, n_loop), run)
+        print(f"  {backend:>12}: {t * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
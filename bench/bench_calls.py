@@ -0,0 +1,98 @@
+import sys
+import timeit
+
+from src.python import cmd
+from src.python.closure import ClosureCompiler
+from src.python.interpreter import Interpreter
+from src.python.transpiler import Transpiler
+from src.python.vm import VM
+
+
+FIB = """
+fn fib(n int) int {
+    if n < 2 {return n;}
+    return fib(n - 1) + fib(n - 2)
+}
+fn main() int {
+    return fib(%d)
+}
+"""
+
+HELPER_LOOP = """
+fn add(a int, b int) int {
+    return a + b
+}
+fn main() int {
+    var i = 0
+    var s = 0
+    while i < %d {
+        s = add(s, i)
+        i = i + 1
+    }
+    return s
+}
+"""
+
+
+def fib_calls(n):
+    return 1 if n < 2 else fib_calls(n - 1) + fib_calls(n - 2) + 1
+
+
+def run_interpreter(iir, unboxed=False):
+    interpreter = Interpreter(unboxed=unboxed)
+    interpreter.eval_node(iir)
+    return interpreter.call(interpreter.entry)
+
+
+def run_unboxed(iir):
+    return run_interpreter(iir, unboxed=True)
+
+
+def run_closure(iir):
+    compiler = ClosureCompiler()
+    compiler.compile(iir)(None)
+    return compiler.call(compiler.entry)
+
+
+def run_vm(iir):
+    vm = VM()
+    vm.invoke(vm.load(iir), [])
+    return vm.call(vm.entry)
+
+
+def run_python(iir):
+    transpiler = Transpiler()
+    transpiler.load(iir)
+    return transpiler.call(transpiler.entry)
+
+
+BACKENDS = {
+    "interpreter": run_interpreter,
+    "unboxed": run_unboxed,
+    "closure": run_closure,
+    "vm": run_vm,
+    "python": run_python,
+}
+
+
+def bench(src, run, number=3):
+    # times the backend alone, the program is translated once
+    iir = cmd.translate(src)
+    return min(timeit.repeat(lambda: run(iir), number=1, repeat=number))
+
+
+def main(n_fib=16, n_loop=5000):
+    for name, src, calls in (
+        (f"fib({n_fib})", FIB % n_fib, fib_calls(n_fib)),
+        (f"helper loop x{n_loop}", HELPER_LOOP % n_loop, n_loop),
+    ):
+        for backend, run in BACKENDS.items():
+            t = bench(src, run)
+            print(
+                f"{name:>20} {backend:>12}: {t * 1000:8.1f} ms  "
+                f"{t / calls * 1e6:6.1f} us/call"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
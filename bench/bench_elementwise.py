@@ -0,0 +1,38 @@
+import sys
+
+from bench.bench_calls import BACKENDS, bench
+
+
+LOOP = """
+fn main() int {
+    var a = [0:%d]
+    var b = [0:%d]
+    var i = 0
+    while i < %d {
+        b[i] = a[i] * 3 + a[i]
+        i = i + 1
+    }
+    return b[%d]
+}
+"""
+
+ELEMENTWISE = """
+fn main() int {
+    var a = [0:%d]
+    var b = a * 3 + a
+    return b[%d]
+}
+"""
+
+
+def main(n=20000):
+    print(f"b = a * 3 + a over {n} elements:")
+    for backend, run in BACKENDS.items():
+        loop = bench(LOOP % (n, n, n, n - 1), run)
+        each = bench(ELEMENTWISE % (n, n - 1), run)
+        print(f"  {backend:>12}: loop {loop * 1000:8.1f} ms  element-wise {each * 1000:6.1f} ms"
+              f"  x{loop / each:.0f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,26 @@
+import sys
+import timeit
+
+from src.python import lexer
+from .programs import data_pipeline
+
+
+def bench(func, src, number):
+    return min(timeit.repeat(lambda: func(src), number=number, repeat=3)) / number
+
+
+def main(n_funcs=2000):
+    src = data_pipeline(n_funcs)
+    n_tokens = len(lexer.tokenise(src))
+    assert lexer.tokenise(src) == lexer.tokenise_reference(src)
+    print(f"{len(src.splitlines())} lines, {len(src)} chars, {n_tokens} tokens")
+    for name, func in (
+        ("tokenise_reference", lexer.tokenise_reference),
+        ("tokenise", lexer.tokenise),
+    ):
+        t = bench(func, src, 1)
+        print(f"{name:>20}: {t * 1000:8.1f} ms  {len(src) / t / 1e6:6.2f} Mchar/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
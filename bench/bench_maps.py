@@ -0,0 +1,52 @@
+import sys
+
+from bench.bench_calls import BACKENDS, bench
+
+
+# the keys are spread out, so that they are not the slots they hash to
+INSERTS = """
+fn main() int {
+    var m map[int, int] = map[]
+    var i = 0
+    while i < %d {
+        m.insert(i * 3, i)
+        i = i + 1
+    }
+    return m.len()
+}
+"""
+
+# the same inserts, then a lookup of each key and of a missing one
+LOOKUPS = """
+fn main() int {
+    var m map[int, int] = map[]
+    var i = 0
+    while i < %d {
+        m.insert(i * 3, i)
+        i = i + 1
+    }
+    var found = 0
+    i = 0
+    while i < %d {
+        if m.contains(i * 3 + 1) {found = found - 1;}
+        found = found + m.get(i * 3)
+        i = i + 1
+    }
+    return found
+}
+"""
+
+
+def main(n=10_000_000):
+    # the tree-walking interpreters take most of an hour for the default 10M,
+    # pass a smaller n to compare them quickly
+    print(f"{n} map inserts and lookups:")
+    for backend, run in BACKENDS.items():
+        inserts = bench(INSERTS % n, run, number=1)
+        lookups = bench(LOOKUPS % (n, n), run, number=1) - inserts
+        print(f"  {backend:>12}: inserts {n / inserts / 1e6:6.2f} M/s"
+              f"  lookups {2 * n / lookups / 1e6:6.2f} M/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,29 @@
+import sys
+import timeit
+
+from src.python.lexer import tokenise
+from src.python.parser import Parser
+from .programs import data_pipeline, long_expression
+
+
+def bench(tokens, number):
+    def parse():
+        return Parser(tokens).parse_program()
+    return min(timeit.repeat(parse, number=number, repeat=3)) / number
+
+
+def main(n_funcs=2000, n_terms=20000):
+    for name, src in (
+        ("data_pipeline", data_pipeline(n_funcs)),
+        ("long_expression", long_expression(n_terms)),
+    ):
+        tokens = tokenise(src)
+        t = bench(tokens, 1)
+        print(
+            f"{name:>16}: {len(tokens):8} tokens {t * 1000:8.1f} ms  "
+            f"{len(tokens) / t / 1e6:6.2f} Mtok/s"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,39 @@
+import sys
+
+from bench.bench_calls import BACKENDS, bench
+
+
+LOOP = """
+fn main() int {
+    var a = [0:%d]
+    var i = 0
+    var s = 0
+    var lo = a[0]
+    while i < %d {
+        s = s + a[i]
+        if a[i] < lo {lo = a[i];}
+        i = i + 1
+    }
+    return s + lo
+}
+"""
+
+BUILTIN = """
+fn main() int {
+    var a = [0:%d]
+    return sum(a) + min(a)
+}
+"""
+
+
+def main(n=20000):
+    print(f"sum and min of {n} elements:")
+    for backend, run in BACKENDS.items():
+        loop = bench(LOOP % (n, n), run)
+        reduce = bench(BUILTIN % n, run)
+        print(f"  {backend:>12}: loop {loop * 1000:8.1f} ms  builtins {reduce * 1000:6.2f} ms"
+              f"  x{loop / reduce:.0f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
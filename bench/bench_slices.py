@@ -0,0 +1,49 @@
+import sys
+
+from bench.bench_calls import BACKENDS, bench
+
+
+COPY = """
+fn main() int {
+    var a = 2 * [0:%d]
+    var s = 0
+    var start = 0
+    while start < %d {
+        var chunk = 0 * [0:%d]
+        var j = 0
+        while j < %d {
+            chunk[j] = a[start + j]
+            j = j + 1
+        }
+        s = s + sum(chunk)
+        start = start + %d
+    }
+    return s
+}
+"""
+
+SLICE = """
+fn main() int {
+    var a = 2 * [0:%d]
+    var s = 0
+    var start = 0
+    while start < %d {
+        s = s + sum(a[start:start + %d])
+        start = start + %d
+    }
+    return s
+}
+"""
+
+
+def main(n=20000, size=1000):
+    print(f"sum of {n} elements in chunks of {size}:")
+    for backend, run in BACKENDS.items():
+        copy = bench(COPY % (n, n, size, size, size), run)
+        view = bench(SLICE % (n, n, size, size), run)
+        print(f"  {backend:>12}: copies {copy * 1000:8.1f} ms  slices {view * 1000:6.2f} ms"
+              f"  x{copy / view:.0f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+MODES = [
+    ("tokenise", ["--tokenise"]),
+    ("parse", ["--parse"]),
+    ("make-ir", ["--make-ir"]),
+    ("typecheck", ["--typecheck"]),
+    ("interpret", ["-i"]),
+    ("compile", ["-c"]),
+]
+
+SCRIPT = "fn main() int {\n    var a = 1 + 2\n    return a * 3\n}\n"
+
+
+def run(args, number):
+    # wall-clock time of whole CLI processes, the best of `number` runs
+    times = []
+    for _ in range(number):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-m", "src.python", *args], capture_output=True,
+        )
+        times.append(time.perf_counter() - start)
+    return min(times), proc.returncode
+
+
+def main(number=10):
+    with tempfile.NamedTemporaryFile("w", suffix=".sta", delete=False) as f:
+        f.write(SCRIPT)
+    try:
+        t, _ = run(["--help"], number)
+        print(f"{'--help':>10}: {t * 1000:6.1f} ms")
+        for name, args in MODES:
+            t, code = run([*args, f.name], number)
+            status = "" if code == 0 else f"  (exit status {code})"
+            print(f"{name:>10}: {t * 1000:6.1f} ms{status}")
+    finally:
+        os.unlink(f.name)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
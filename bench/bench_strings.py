@@ -0,0 +1,31 @@
+import sys
+
+from bench.bench_calls import BACKENDS, bench
+
+
+BUILD = """
+fn main() int {
+    var s = ""
+    var i = 0
+    while i < %d {
+        s = s + "field,"
+        i = i + 1
+    }
+    return i
+}
+"""
+
+
+def main(n=20000):
+    # the time grows with the number of appends, not its square, so four
+    # times the appends takes about four times as long
+    print(f"appending {n} and {4 * n} times:")
+    for backend, run in BACKENDS.items():
+        small = bench(BUILD % n, run)
+        large = bench(BUILD % (4 * n), run)
+        print(f"  {backend:>12}: {small * 1000:8.1f} ms {large * 1000:8.1f} ms"
+              f"  x{large / small:.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,33 @@
+import sys
+import timeit
+import tracemalloc
+
+from src.python import lexer
+from .programs import data_pipeline
+
+
+def measure(func, src):
+    tracemalloc.start()
+    tokens = func(src)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tokens, size
+
+
+def main(n_funcs=2000):
+    src = data_pipeline(n_funcs)
+    for name, func in (
+        ("tokenise", lexer.tokenise),
+        ("tokenise_compact", lexer.tokenise_compact),
+    ):
+        tokens, size = measure(func, src)
+        n = len(tokens)
+        t_lex = min(timeit.repeat(lambda: func(src), number=1, repeat=3))
+        print(
+            f"{name:>16}: {n} tokens  {size / 1e6:7.2f} MB  {size / n:6.1f} B/token  "
+            f"lex {t_lex * 1000:6.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,54 @@
+import sys
+
+from bench.bench_calls import BACKENDS, bench
+
+
+# keeping the positive elements, counted first to size an array for them
+PREALLOCATED = """
+fn main() int {
+    var a = [0:%d] - %d
+    var n = 0
+    var i = 0
+    while i < %d {
+        if a[i] > 0 {n = n + 1;}
+        i = i + 1
+    }
+    var kept = 0 * [0:n]
+    n = 0
+    i = 0
+    while i < %d {
+        if a[i] > 0 {
+            kept[n] = a[i]
+            n = n + 1
+        }
+        i = i + 1
+    }
+    return count(kept)
+}
+"""
+
+PUSHED = """
+fn main() int {
+    var a = [0:%d] - %d
+    var kept vec[int] = vec[]
+    var i = 0
+    while i < %d {
+        if a[i] > 0 {kept.push(a[i]);}
+        i = i + 1
+    }
+    return kept.len()
+}
+"""
+
+
+def main(n=20000):
+    print(f"keeping the positive half of {n} elements:")
+    for backend, run in BACKENDS.items():
+        two_pass = bench(PREALLOCATED % (n, n // 2, n, n), run)
+        pushed = bench(PUSHED % (n, n // 2, n), run)
+        print(f"  {backend:>12}: preallocated {two_pass * 1000:8.1f} ms"
+              f"  pushed {pushed * 1000:8.1f} ms  x{two_pass / pushed:.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
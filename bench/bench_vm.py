@@ -0,0 +1,49 @@
+import sys
+
+from bench.bench_calls import BACKENDS, FIB, HELPER_LOOP, bench
+
+
+ARITHMETIC = """
+fn main() int {
+    var i = 0
+    var s = 0
+    while i < %d {
+        if i * 3 > s - i {s = s + i * 2;} else {s = s - 1;}
+        i = i + 1
+    }
+    return s
+}
+"""
+
+FIELDS = """
+struct point {x int; y int;}
+fn main() int {
+    var i = 0
+    var s = 0
+    while i < %d {
+        var p = point(i, 2)
+        s = s + p.x * p.y
+        i = i + 1
+    }
+    return s
+"""
+
+
+def main(n=5000):
+    # the backends on the same translated programs, slowest first
+    programs = {
+        "fib": FIB % 15,
+        "helper calls": HELPER_LOOP % n,
+        "arithmetic": ARITHMETIC % n,
+        "struct fields": FIELDS % n,
+    }
+    for name, src in programs.items():
+        times = {backend: bench(src, run) for backend, run in BACKENDS.items()}
+        base = times["interpreter"]
+        print(f"{name}:")
+        for backend, t in times.items():
+            print(f"  {backend:>12}: {t * 1000:8.1f} ms  x{base / t:5.1f}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,38 @@
+# synthetic Starling sources used by the benchmarks
+
+
+def data_pipeline(n_funcs=1000):
+    # a program shaped like our generated data-pipeline sources
+    funcs = []
+    for i in range(n_funcs):
+        funcs.append(
+            f"struct row{i} {{\n"
+            f"    id int;\n"
+            f"    value float;\n"
+            f"    label str;\n"
+            f"}}\n"
+            f"\n"
+            f"fn process{i}(x int, y float) float {{\n"
+            f"    var total float = 0.0\n"
+            f"    var count = 0\n"
+            f"    var name = \"stage {i}\"\n"
+            f"    var ratio = 3//4\n"
+            f"    while count < x {{\n"
+            f"        if count == {i} {{\n"
+            f"            total = total + y * 2.5\n"
+            f"        }} else {{\n"
+            f"            total = total - (y / 1.5)\n"
+            f"        }}\n"
+            f"        count = count + 1\n"
+            f"    }}\n"
+            f"    return total\n"
+            f"}}\n"
+            f"\n"
+        )
+    return "".join(funcs)
+
+
+def long_expression(n_terms=10000):
+    # one generated arithmetic expression, mixing precedences and brackets
+    terms = [f"(x{i % 10} * {i} - y / 2.5)" for i in range(n_terms)]
+    return "var result = " + " + ".join(terms) + "\n"
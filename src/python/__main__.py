@@ -2,6 +2,7 @@ import argparse
 import logging
 
 from . import cmd
+from .trace import TraceWriter
 
 
 parser = argparse.ArgumentParser(
@@ -13,6 +14,11 @@ t_mode_g = parser.add_argument_group("translation mode")
 t_mode = t_mode_g.add_mutually_exclusive_group(required=True)
 t_mode.add_argument("-i", "--interpret", action="store_true")
 t_mode.add_argument("-c", "--compile", action="store_true")
+t_mode.add_argument("--vm", action="store_true", help="run on the register bytecode VM")
+t_mode.add_argument("--python", action="store_true", help="run as transpiled Python")
+t_mode.add_argument(
+    "--transpile", action="store_true", help="print the Python the program transpiles to",
+)
 t_mode.add_argument("--tokenise", action="store_true")
 t_mode.add_argument("--parse", action="store_true")
 t_mode.add_argument("--make-ir", action="store_true")
@@ -22,8 +28,33 @@ cf_g = parser.add_argument_group("control flow diagram")
 cf_g.add_argument("--cf-show", action="store_true", help="display a control flow diagram")
 cf_g.add_argument("--cf-path", help="save a cf-diagram at the given path")
 
+parser.add_argument(
+    "--backend", choices=("interpreter", "closure", "vm", "python"), default="interpreter",
+    help="how --interpret runs the program (default: %(default)s)",
+)
+
+parser.add_argument(
+    "--unboxed", action="store_true",
+    help="have the interpreter keep values of basic types as raw Python values",
+)
+
 parser.add_argument("-v", "--verbosity", action="count")
 
+parser.add_argument(
+    "--compact-tokens", action="store_true",
+    help="keep tokens in a compact array-backed buffer",
+)
+
+parser.add_argument(
+    "--trace", action="store_true",
+    help="write an event for each node handled by each phase to stderr",
+)
+
+parser.add_argument(
+    "--cache-dir",
+    help="reuse type checked programs stored in this directory, keyed by their source",
+)
+
 parser.add_argument("--test", action="store_true", help="causes the IRPrinter to enter test mode")
 
 parser.add_argument("filename", help="the file to translate")
@@ -36,14 +67,24 @@ verbosity = args.pop("verbosity") or 0
 logging_level = logging_levels[verbosity]
 logging.basicConfig(format="%(levelname)s: %(message)s")
 logging.getLogger().setLevel(logging_level)
+if args.pop("trace"):
+    args["tracer"] = TraceWriter()
 
-with open(filename) as f:
-    src = f.read()
-if args.get("interpret"):
-    res = cmd.exec_src(src, **args)
-    print(f"program exited with value {res}")
-elif args.get("compile"):
-    res = cmd.compile_and_run_src(src, **args)
-    print(f"program exited with value {res}")
-else:
-    print(cmd.translate(src, **args))
+# the source is tokenised straight from the file as it is parsed
+with open(filename) as src:
+    if args.pop("vm"):
+        args["interpret"] = True
+        args["backend"] = "vm"
+    if args.get("interpret"):
+        res = cmd.exec_src(src, **args)
+        print(f"program exited with value {res}")
+    elif args.pop("python"):
+        res = cmd.transpile_and_run_src(src, **args)
+        print(f"program exited with value {res}")
+    elif args.pop("transpile"):
+        print(cmd.transpile_src(src, **args))
+    elif args.get("compile"):
+        res = cmd.compile_and_run_src(src, **args)
+        print(f"program exited with value {res}")
+    else:
+        print(cmd.translate(src, **args))
@@ -1,209 +1,218 @@
 from dataclasses import dataclass, field
 
 from .lexer import Token
-from . import type_defs as types
 
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     pos: tuple[int, int] = field(kw_only=True, default=None)
 
 
-@dataclass
+@dataclass(slots=True)
 class Declr(Node):
-    # used by the type checker
-    checked_type: types.Type = field(init=False, default=None)
+    pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Stmt(Node):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Expr(Node):
-    # used by the type checker
-    typ: types.Type = field(kw_only=True, default=None)
+    pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Type(Node):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class Program(Node):
     declrs: list[Declr]
 
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expr):
     value: Token
 
 
-@dataclass
+@dataclass(slots=True)
 class Identifier(Expr):
     value: str
 
 
-@dataclass
+@dataclass(slots=True)
 class RangeExpr(Expr):
     start: Expr
     end: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class SequenceExpr(Expr):
     elements: list[Expr]
 
 
-@dataclass
+@dataclass(slots=True)
 class ArrayExpr(SequenceExpr):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class VectorExpr(SequenceExpr):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
+class MapExpr(Expr):
+    keys: list[Expr]
+    values: list[Expr]
+
+
+@dataclass(slots=True)
 class GroupExpr(Expr):
     value: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class CallExpr(Expr):
     target: Expr
     args: list[Expr]
 
 
-@dataclass
+@dataclass(slots=True)
 class IndexExpr(Expr):
     target: Expr
     index: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class SelectorExpr(Expr):
     target: Expr
     name: Identifier
 
 
-@dataclass
+@dataclass(slots=True)
 class UnaryExpr(Expr):
     op: Token
     rhs: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class BinaryExpr(Expr):
     op: Token
     lhs: Expr
     rhs: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class TypeName(Type):
     value: Identifier
 
 
-@dataclass
+@dataclass(slots=True)
 class ArrayType(Type):
     elem_type: Type
     length: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class VectorType(Type):
     elem_type: Type
 
 
-@dataclass
+@dataclass(slots=True)
+class MapType(Type):
+    key_type: Type
+    value_type: Type
+
+
+@dataclass(slots=True)
 class Block(Stmt):
     stmt_list: list[Stmt]
 
 
-@dataclass
+@dataclass(slots=True)
 class DeclrStmt(Stmt):
     declr: Declr
 
 
-@dataclass
+@dataclass(slots=True)
 class ExprStmt(Stmt):
     expr: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class IfStmt(Stmt):
     condition: Expr
     if_block: Block
     else_block: Block
 
 
-@dataclass
+@dataclass(slots=True)
 class WhileStmt(Stmt):
     condition: Expr
     block: Block
 
 
-@dataclass
+@dataclass(slots=True)
 class ReturnStmt(Stmt):
     value: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class AssignmentStmt(Stmt):
     target: Expr
     value: Expr
 
 
-@dataclass
+@dataclass(slots=True)
 class FieldDeclr(Declr):
     name: Identifier
     typ: Type
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionSignature(Type):
     name: Identifier
     return_type: Type | None
     params: list[FieldDeclr]
 
 
-@dataclass
+@dataclass(slots=True)
 class FunctionDeclr(Declr):
     signature: FunctionSignature
     block: Block
 
 
-@dataclass
+@dataclass(slots=True)
 class StructDeclr(Declr):
     name: Identifier
     fields: list[FieldDeclr]
 
 
-@dataclass
+@dataclass(slots=True)
 class InterfaceDeclr(Declr):
     name: Identifier
     methods: list[FunctionSignature]
 
 
-@dataclass
+@dataclass(slots=True)
 class ImplDeclr(Declr):
     target: Identifier
     interface: Identifier | None
     methods: list[FunctionDeclr]
 
 
-@dataclass
+@dataclass(slots=True)
 class VariableDeclr(Declr):
     name: Identifier
     typ: Type | None
     value: Expr | None
 
 
-@dataclass
+@dataclass(slots=True)
 class ConstDeclr(Declr):
     name: Identifier
     typ: Type | None
@@ -52,5 +52,157 @@ names = {
         builtin=True
     ),
 }
+
+# reductions of a sequence to a scalar, by name: the name of the type they
+# return, or None if they return the type of the elements
+reductions = {
+    "sum": None,
+    "min": None,
+    "max": None,
+    "mean": "float",
+    "count": "int",
+    # the population variance, from Welford's one-pass algorithm
+    "variance": "float",
+}
+for name in reductions:
+    # the type checker gives each call the type it returns, as the
+    # parameter takes sequences of any element type
+    sequence_type = ir.SequenceType(
+        name="sequence",
+        elem_type=None,
+        hint=type_defs.SequenceType(None),
+        checked=type_defs.SequenceType(None),
+    )
+    names[name] = ir.FunctionRef(
+        name,
+        typ=ir.FunctionSigRef(
+            name + "@builtin",
+            type_defs.FunctionType(None, [sequence_type.checked]),
+            {"values": sequence_type},
+            None,
+        ),
+        params=[ir.Ref("values", typ=sequence_type)],
+        builtin=True
+    )
+
+# joins a sequence of strings, with a separator between each
+string_ref = scope.lookup("str")
+strings_type = ir.SequenceType(
+    name="sequence[str]",
+    elem_type=string_ref,
+    hint=type_defs.SequenceType(string_type),
+    checked=type_defs.SequenceType(string_type),
+)
+names["join"] = ir.FunctionRef(
+    "join",
+    typ=ir.FunctionSigRef(
+        "join@builtin",
+        type_defs.FunctionType(string_type, [strings_type.checked, string_type]),
+        {"values": strings_type, "separator": string_ref},
+        string_ref,
+    ),
+    params=[ir.Ref("values", typ=strings_type), ir.Ref("separator", typ=string_ref)],
+    builtin=True
+)
+
+# a view of the elements of a sequence from `start` up to `end`, which
+# `a[start:end]` is lowered to
+sequence_type = ir.SequenceType(
+    name="sequence",
+    elem_type=None,
+    hint=type_defs.SequenceType(None),
+    checked=type_defs.SequenceType(None),
+)
+names["slice@builtin"] = ir.FunctionRef(
+    "slice@builtin",
+    typ=ir.FunctionSigRef(
+        "slice@builtin",
+        type_defs.FunctionType(None, [sequence_type.checked, types["int"], types["int"]]),
+        {"values": sequence_type, "start": int_type, "end": int_type},
+        None,
+    ),
+    params=[
+        ir.Ref("values", typ=sequence_type),
+        ir.Ref("start", typ=int_type),
+        ir.Ref("end", typ=int_type),
+    ],
+    builtin=True
+)
+
+# the string with the char at `index` replaced, which `s[index] = char` is
+# lowered to, as strings are packed and immutable
+char_ref = scope.lookup("char")
+names["set_char@builtin"] = ir.FunctionRef(
+    "set_char@builtin",
+    typ=ir.FunctionSigRef(
+        "set_char@builtin",
+        type_defs.FunctionType(string_type, [string_type, types["int"], types["char"]]),
+        {"string": string_ref, "index": int_type, "char": char_ref},
+        string_ref,
+    ),
+    params=[
+        ir.Ref("string", typ=string_ref),
+        ir.Ref("index", typ=int_type),
+        ir.Ref("char", typ=char_ref),
+    ],
+    builtin=True
+)
+
+# the methods of every vector, by name: the names of the types of the
+# arguments after the vector and of the type returned, where "elem" is the
+# type of the elements and None is nothing
+vector_methods = {
+    "push": (["elem"], None),
+    "pop": ([], "elem"),
+    "len": ([], "int"),
+    "reserve": (["int"], None),
+    "clear": ([], None),
+}
+vector_type = ir.VectorType(
+    "vec",
+    type_defs.VectorType(None),
+    None,
+    checked=type_defs.VectorType(None),
+)
+
+# the methods of every map, as for vectors, where "key" and "value" are the
+# types of its keys and values, and "vec[key]" and "vec[value]" vectors of
+# them
+map_methods = {
+    "insert": (["key", "value"], None),
+    "get": (["key"], "value"),
+    "contains": (["key"], "bool"),
+    "remove": (["key"], None),
+    "len": ([], "int"),
+    "keys": ([], "vec[key]"),
+    "values": ([], "vec[value]"),
+}
+map_type = ir.MapType(
+    "map",
+    type_defs.MapType(None, None),
+    None,
+    None,
+    checked=type_defs.MapType(None, None),
+)
+
+builtin_methods = ((vector_type, vector_methods, "@vec"), (map_type, map_methods, "@map"))
+for typ, methods, suffix in builtin_methods:
+    for name, (args, returned) in methods.items():
+        # the type checker gives each call the signature for the types of
+        # the elements of its vector or map
+        params = [ir.Ref("self", typ=typ)] + [ir.Ref(f"arg{i}") for i in range(len(args))]
+        typ.methods[name] = ir.MethodRef(
+            name,
+            typ,
+            typ=ir.FunctionSigRef(
+                name + suffix,
+                type_defs.FunctionType(None, [typ.checked] + [None] * len(args)),
+                {param.name: param.typ for param in params},
+                None,
+            ),
+            params=params,
+            builtin=True
+        )
+
 for name, value in names.items():
     scope.declare(name, value)
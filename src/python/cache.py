@@ -0,0 +1,159 @@
+from hashlib import sha256
+import io
+import logging
+import marshal
+import os
+from pathlib import Path
+import pickle
+import sys
+import tempfile
+import zlib
+
+from . import builtin
+
+
+# the default bound on the total size of a cache directory, in bytes
+DEFAULT_MAX_SIZE = 64 << 20
+
+ENTRY_SUFFIX = ".ir"
+# entries holding the code objects of transpiled programs
+CODE_SUFFIX = ".pyc"
+
+
+def compiler_version():
+    # a fingerprint of the translator's own sources, so editing any phase
+    # invalidates everything it cached
+    digest = sha256(f"{sys.version_info[:2]} {pickle.HIGHEST_PROTOCOL}".encode())
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def builtin_objects():
+    # the shared builtin objects are stored by name, so a loaded program
+    # refers to the same ones as a freshly checked program would
+    objects = {}
+    for name, typ in builtin.types.items():
+        objects[f"type:{name}"] = typ
+    for name, ref in builtin.scope.name_map.items():
+        objects[f"ref:{name}"] = ref
+    return objects
+
+
+class IRPickler(pickle.Pickler):
+    def __init__(self, file, ids):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.ids = ids
+
+    def persistent_id(self, obj):
+        return self.ids.get(id(obj))
+
+
+class IRUnpickler(pickle.Unpickler):
+    def __init__(self, file, objects):
+        super().__init__(file)
+        self.objects = objects
+
+    def persistent_load(self, pid):
+        return self.objects[pid]
+
+
+class IRCache:
+    # a directory of type checked `ir.Program`s, keyed by the source text
+    # entries are pickled, so the directory must only be writable by users
+    # that are trusted to run code
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.version = compiler_version()
+        self.objects = builtin_objects()
+        self.ids = {id(obj): name for name, obj in self.objects.items()}
+
+    def key(self, src):
+        digest = sha256(self.version.encode())
+        digest.update(src.encode("UTF-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def entry(self, key, suffix=ENTRY_SUFFIX):
+        return self.path / (key + suffix)
+
+    def load(self, key):
+        # returns the cached program, or None on a miss
+        return self.read(self.entry(key), self.decode_program)
+
+    def store(self, key, program):
+        try:
+            stream = io.BytesIO()
+            IRPickler(stream, self.ids).dump(program)
+        except (pickle.PicklingError, RecursionError) as e:
+            logging.warning("not caching program: %s", e)
+            return
+        self.write(self.entry(key), zlib.compress(stream.getvalue()))
+
+    def load_code(self, key):
+        # returns the cached code object, or None on a miss
+        # the key is that of the transpiled source
+        return self.read(self.entry(key, CODE_SUFFIX), marshal.loads)
+
+    def store_code(self, key, code):
+        self.write(self.entry(key, CODE_SUFFIX), marshal.dumps(code))
+
+    def decode_program(self, data):
+        return IRUnpickler(io.BytesIO(zlib.decompress(data)), self.objects).load()
+
+    def read(self, entry, decode):
+        try:
+            data = entry.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            value = decode(data)
+        except Exception as e:
+            # a damaged entry is a miss, and is replaced by the next store
+            logging.warning("discarding cache entry %s: %s", entry.name, e)
+            return None
+        # the modification time orders entries for eviction
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def write(self, entry, data):
+        # written to a temporary file then renamed into place, so other
+        # processes only ever see whole entries
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, entry)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        # removes the least recently used entries until the total size of
+        # the cache is within `max_size`
+        entries = []
+        total = 0
+        for entry in self.path.iterdir():
+            if entry.suffix not in (ENTRY_SUFFIX, CODE_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            try:
+                entry.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
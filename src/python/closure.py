@@ -0,0 +1,347 @@
+import operator
+
+from .interpreter import (
+    StaObject, StaVariable, StaStruct, StaFunction, StaBuiltinFunction, call_builtin,
+    BINARY_OPS, box, unbox, new_sequence, new_map, get_element, set_element, elementwise,
+    concat, flatten, restore,
+)
+from .resolve import resolve_slots, resolve_ropes, is_append
+from . import ir_nodes as ir
+from . import type_defs as types
+
+
+UNARY_OPS = {
+    "-": operator.neg,
+    "!": operator.not_,
+}
+
+
+def fall_through(frame):
+    # the terminator of a block that does not end in one
+    return None, None
+
+
+class ClosureCompiler:
+    # an execution mode that walks the checked IR once, turning each node into
+    # a Python closure specialised for it: constants are boxed, operators
+    # chosen and refs resolved ahead of time, so running the program does no
+    # dispatch on the IR
+    # every closure is given the activation frame of the running function
+    # expressions return a value, instructions return nothing, and blocks
+    # return the block to run next and, when there is none, the returned value
+    def __init__(self, entry_name="main"):
+        # variables without a slot in a frame, by id(ref)
+        self.refs = {}
+        # id(FunctionRef) -> StaFunction, whose block is its compiled body
+        self.functions = {}
+        # id(Block) -> a cell holding the compiled block, so branches can
+        # refer to blocks that are not yet compiled
+        self.blocks = {}
+        self.pending = []
+        # functions whose bodies are still to be compiled
+        self.bodies = []
+        self.entry_name = entry_name
+        self.entry = None
+
+    def compile(self, program):
+        # returns the closure running the program's top level declarations
+        resolve_slots(program)
+        resolve_ropes(program)
+        run = self.make_body(program.block)
+        while self.bodies:
+            func, ref = self.bodies.pop()
+            func.block = self.make_body(ref.block)
+        return run
+
+    def call(self, func, args=()):
+        if isinstance(func, StaBuiltinFunction):
+            return call_builtin(func, args)
+        frame = [None] * func.frame_size
+        saved = [self.refs.get(id(ref)) for ref in func.captured]
+        for param, arg in zip(func.params, args):
+            if param.slot is None:
+                self.refs[id(param)] = StaVariable(param.name, arg)
+            else:
+                frame[param.slot] = arg
+        try:
+            return func.block(frame)
+        finally:
+            restore(self.refs, func.captured, saved)
+
+    def make_body(self, block):
+        # compiles `block` and every block reachable from it, into a closure
+        # running them in a loop, so loops in the program run at a constant
+        # stack depth
+        entry = self.make_cell(block)
+        while self.pending:
+            block = self.pending.pop()
+            self.blocks[id(block)][0] = self.make_block(block)
+
+        def run(frame):
+            block, value = entry[0](frame)
+            while block is not None:
+                block, value = block[0](frame)
+            return value
+        return run
+
+    def make_cell(self, block):
+        if (cell := self.blocks.get(id(block))) is None:
+            cell = self.blocks[id(block)] = [None]
+            self.pending.append(block)
+        return cell
+
+    def make_block(self, block):
+        instrs = []
+        terminator = fall_through
+        for instr in block.instrs:
+            match instr:
+                case ir.Branch(target):
+                    terminator = self.make_branch(target)
+                    break
+                case ir.CBranch(condition, t_block, f_block):
+                    terminator = self.make_cbranch(condition, t_block, f_block)
+                    break
+                case ir.Return(value):
+                    terminator = self.make_return(value)
+                    break
+                case _:
+                    if (instr := self.make_instr(instr)) is not None:
+                        instrs.append(instr)
+        if not instrs:
+            return terminator
+        instrs = tuple(instrs)
+
+        def run(frame):
+            for instr in instrs:
+                instr(frame)
+            return terminator(frame)
+        return run
+
+    def make_branch(self, target):
+        target = self.make_cell(target)
+
+        def branch(frame):
+            return target, None
+        return branch
+
+    def make_cbranch(self, condition, t_block, f_block):
+        condition = self.make_expr(condition)
+        t_block = self.make_cell(t_block)
+        f_block = self.make_cell(f_block)
+
+        def cbranch(frame):
+            return (t_block if condition(frame).value else f_block), None
+        return cbranch
+
+    def make_return(self, value):
+        value = self.make_expr(value)
+
+        def ret(frame):
+            return None, value(frame)
+        return ret
+
+    def make_instr(self, node):
+        # returns None for instructions with nothing to do when run
+        match node:
+            case ir.Declare(ref):
+                return self.make_declare(ref)
+            case ir.DeclareMethods(_, block):
+                return self.make_body(block)
+            case ir.Assign(ref, value):
+                return self.make_assign(ref, value)
+            case ir.Load() | ir.Call() | ir.Binary() | ir.Unary():
+                return self.make_expr(node)
+            case _:
+                assert False, f"Unexpected instruction {type(node)}"
+
+    def make_declare(self, ref):
+        refs = self.refs
+        key = id(ref)
+        match ref:
+            case ir.FunctionRef():
+                self.make_function(ref)
+            case ir.Type():
+                pass
+            case ir.ConstRef(name=name, value=value, slot=None):
+                value = self.make_expr(value)
+
+                def declare(frame):
+                    refs[key] = StaVariable(name, value(frame))
+                return declare
+            case ir.ConstRef(value=value, slot=slot):
+                value = self.make_expr(value)
+
+                def declare(frame):
+                    frame[slot] = value(frame)
+                return declare
+            case ir.Ref(name=name, slot=None):
+                def declare(frame):
+                    refs[key] = StaVariable(name)
+                return declare
+
+    def make_function(self, ref):
+        if (func := self.functions.get(id(ref))) is not None:
+            return func
+        if ref.builtin:
+            func = StaBuiltinFunction(ref.typ, ref.params, ref.block)
+        else:
+            func = StaFunction(ref.typ, ref.params, None, ref.frame_size, tuple(ref.captured))
+        if func.sig.name == self.entry_name:
+            self.entry = func
+        self.functions[id(ref)] = func
+        if not ref.builtin:
+            # calls only look its body up when run, so it can be compiled
+            # after the functions calling it
+            self.bodies.append((func, ref))
+        return func
+
+    def make_assign(self, ref, value):
+        if ref.rope and is_append(ref, value):
+            typ = ref.typ.checked
+            string = self.make_load(ref, flat=False)
+            tail = self.make_expr(value.rhs)
+
+            def value(frame):
+                return StaObject(typ, concat(string(frame).value, tail(frame).value))
+        else:
+            value = self.make_expr(value)
+        if ref.slot is not None:
+            slot = ref.slot
+
+            def assign(frame):
+                frame[slot] = value(frame)
+        elif isinstance(ref, ir.IndexRef):
+            sequence, index = self.make_element(ref)
+
+            def assign(frame):
+                val = unbox(value(frame))
+                set_element(sequence(frame), index(frame).value, val)
+        else:
+            variable = self.make_ref(ref)
+
+            def assign(frame):
+                val = value(frame)
+                variable(frame).value = val
+        return assign
+
+    def make_ref(self, node):
+        # a closure returning the variable `node` refers to
+        match node:
+            case ir.FunctionRef():
+                func = self.make_function(node)
+                return lambda frame: func
+            case ir.FieldRef(method=method) if isinstance(node.typ, ir.FunctionSigRef):
+                func = self.make_function(method)
+                return lambda frame: func
+            case ir.FieldRef(parent=parent, name=name):
+                parent = self.make_load(parent)
+                return lambda frame: parent(frame).value[name]
+            case ir.Ref():
+                refs = self.refs
+                key = id(node)
+                return lambda frame: refs[key]
+            case _:
+                assert False, f"Unexpected ref {type(node)}"
+
+    def make_element(self, ref):
+        # closures returning the sequence and index of an element
+        if isinstance(ref.parent, ir.Ref):
+            sequence = self.make_load(ref.parent)
+        else:
+            sequence = self.make_expr(ref.parent)
+        return sequence, self.make_expr(ref.index)
+
+    def make_load(self, ref, flat=True):
+        if ref.rope and flat:
+            typ = ref.typ.checked
+            string = self.make_load(ref, flat=False)
+            return lambda frame: StaObject(typ, flatten(string(frame).value))
+        if ref.slot is not None:
+            slot = ref.slot
+            return lambda frame: frame[slot]
+        if isinstance(ref, ir.IndexRef):
+            sequence, index = self.make_element(ref)
+            typ = ref.typ.checked
+            return lambda frame: box(typ, get_element(sequence(frame), index(frame).value))
+        variable = self.make_ref(ref)
+        return lambda frame: variable(frame).value
+
+    def make_expr(self, node):
+        match node:
+            case ir.Constant(value):
+                obj = StaObject(node.typ.checked, value)
+                return lambda frame: obj
+            case ir.Load(ref):
+                return self.make_load(ref)
+            case ir.Call(target, args):
+                return self.make_call(target, args)
+            case ir.Binary():
+                return self.make_binary(node)
+            case ir.Unary(op, rhs):
+                typ = node.typ.checked
+                op = UNARY_OPS[op]
+                rhs = self.make_expr(rhs)
+                return lambda frame: StaObject(typ, op(rhs(frame).value))
+            case ir.Sequence(elements):
+                return self.make_sequence(node.typ.checked, elements)
+            case ir.Map(keys, values):
+                typ = node.typ.checked
+                keys = tuple(self.make_expr(key) for key in keys)
+                values = tuple(self.make_expr(value) for value in values)
+                return lambda frame: new_map(
+                    typ,
+                    [unbox(key(frame)) for key in keys],
+                    [unbox(value(frame)) for value in values],
+                )
+            case ir.StructLiteral(fields):
+                typ = node.typ.checked
+                fields = tuple((name, self.make_expr(value)) for name, value in fields.items())
+                return lambda frame: StaStruct(
+                    typ, {name: StaVariable(name, value(frame)) for name, value in fields}
+                )
+            case ir.Ref():
+                return self.make_ref(node)
+            case _:
+                assert False, f"Unexpected expression {type(node)}"
+
+    def make_sequence(self, typ, elements):
+        elements = tuple(self.make_expr(element) for element in elements)
+        return lambda frame: new_sequence(typ, [unbox(element(frame)) for element in elements])
+
+    def make_call(self, target, args):
+        args = tuple(self.make_expr(arg) for arg in args)
+        match target:
+            case ir.FunctionRef():
+                func = self.make_function(target)
+            case ir.FieldRef(method=method) if method is not None:
+                func = self.make_function(method)
+            case _:
+                func = None
+        if func is None or isinstance(func, StaBuiltinFunction):
+            function = self.make_ref(target) if func is None else (lambda frame: func)
+            call = self.call
+            return lambda frame: call(function(frame), [arg(frame) for arg in args])
+
+        if func.captured or any(param.slot is None for param in func.params):
+            call = self.call
+            return lambda frame: call(func, [arg(frame) for arg in args])
+        # the parameters take the first slots of the frame, in order
+        padding = [None] * (func.frame_size - len(args))
+
+        def call_slotted(frame):
+            return func.block([arg(frame) for arg in args] + padding)
+        return call_slotted
+
+    def make_binary(self, node):
+        typ = node.typ.checked
+        op = BINARY_OPS[node.op]
+        lhs = self.make_expr(node.lhs)
+        if isinstance(typ, types.SequenceType):
+            rhs = self.make_expr(node.rhs)
+            return lambda frame: elementwise(op, typ, unbox(lhs(frame)), unbox(rhs(frame)))
+        # the common `i + 1` and `i < n` shapes skip a call for the constant
+        if isinstance(node.rhs, ir.Constant):
+            rhs = node.rhs.value
+            return lambda frame: StaObject(typ, op(lhs(frame).value, rhs))
+        rhs = self.make_expr(node.rhs)
+        return lambda frame: StaObject(typ, op(lhs(frame).value, rhs(frame).value))
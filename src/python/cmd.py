@@ -1,27 +1,44 @@
 import logging
 
-from .lexer import tokenise
-from .parser import Parser
-from .ir import IRNoder
-from .ir_nodes import IRPrinter, counter
-from .type_checker import TypeChecker
-from .interpreter import Interpreter, StaFunctionReturn
-from .compiler import Compiler, execute_module
-from .control_flows import ControlFlows, create_flows
+from .lexer import tokenise, tokenise_iter, tokenise_compact
+
+# every other phase and backend is imported where it is first needed, so
+# each mode only pays for loading the parts of the pipeline it runs
+
+
+# flags that ask for something other than the checked program
+INTERMEDIATE_FLAGS = ("tokenise", "parse", "make_ir", "typecheck", "cf_show", "cf_path")
 
 
 def translate(src, **flags):
+    # `src` is either the source text or a file object/mmap to stream from
+    if flags.get("cache_dir") is not None and not any(
+        flags.get(flag) for flag in INTERMEDIATE_FLAGS
+    ):
+        return translate_cached(src, **flags)
     error_handler = flags.get("error_handler")
-    tokens = tokenise(src, error_handler)
+    tracer = flags.get("tracer")
+    if flags.get("compact_tokens"):
+        # offsets index into the whole source, so it has to be read first
+        if not isinstance(src, str):
+            src = src.read()
+        tokens = tokenise_compact(src, error_handler)
+    elif isinstance(src, str):
+        tokens = tokenise(src, error_handler)
+    else:
+        tokens = tokenise_iter(src, error_handler)
     if flags.get("tokenise"):
-        return tokens
+        return list(tokens)
 
-    parser = Parser(tokens, error_handler)
+    from .parser import Parser
+    parser = Parser(tokens, error_handler, tracer)
     ast = parser.parse_program()
     if flags.get("parse"):
         return ast
 
-    noder = IRNoder(error_handler)
+    from .ir import IRNoder
+    from .ir_nodes import IRPrinter
+    noder = IRNoder(error_handler, tracer)
     block = noder.block
     iir = noder.make(ast)
     if flags.get("cf_show") or (flags.get("cf_path") is not None):
@@ -32,7 +49,8 @@ def translate(src, **flags):
         iir_string = printer.to_string(iir)
         return iir_string
 
-    tc = TypeChecker(error_handler)
+    from .type_checker import TypeChecker
+    tc = TypeChecker(error_handler, tracer)
     tc.check(iir)
     if flags.get("typecheck"):
         iir_string = printer.to_string(iir)
@@ -41,33 +59,101 @@ def translate(src, **flags):
     return iir
 
 
+def translate_cached(src, cache_dir, **flags):
+    # look the checked program up by the source text, translating and
+    # storing it on a miss
+    from .cache import IRCache, DEFAULT_MAX_SIZE
+    if not isinstance(src, str):
+        src = src.read()
+    cache = IRCache(cache_dir, flags.get("cache_size", DEFAULT_MAX_SIZE))
+    key = cache.key(src)
+    if (iir := cache.load(key)) is not None:
+        return iir
+
+    # programs with errors are not stored, so the errors are seen again
+    errors = []
+    error_handler = flags.get("error_handler")
+    if error_handler is not None:
+        def error_handler(msg, report=error_handler):
+            errors.append(msg)
+            report(msg)
+    flags["error_handler"] = error_handler
+    iir = translate(src, **flags)
+    if not errors:
+        cache.store(key, iir)
+    return iir
+
+
 def exec_src(src, **flags):
+    # `backend` is "interpreter", which walks the IR as it runs, "closure",
+    # which first compiles the IR into Python closures, "vm", which lowers it
+    # to register bytecode, or "python", which transpiles it to Python source
     iir = translate(src, **flags)
-    interpreter = Interpreter(entry_name=flags.get("entry_name", "main"))
-    interpreter.eval_node(iir)
+    entry_name = flags.get("entry_name", "main")
+    backend = flags.get("backend") or "interpreter"
+    if backend == "closure":
+        from .closure import ClosureCompiler
+        executor = ClosureCompiler(entry_name)
+        executor.compile(iir)(None)
+    elif backend == "vm":
+        from .vm import VM
+        executor = VM(entry_name)
+        executor.invoke(executor.load(iir), [])
+    elif backend == "python":
+        from .transpiler import Transpiler
+        executor = Transpiler(entry_name)
+        executor.load(iir, code_cache(flags))
+    elif backend == "interpreter":
+        from .interpreter import Interpreter
+        executor = Interpreter(
+            entry_name=entry_name, tracer=flags.get("tracer"), unboxed=flags.get("unboxed"),
+        )
+        executor.eval_node(iir)
+    else:
+        raise ValueError(f"unknown backend {backend!r}")
     # define entry point
-    if (fn := interpreter.entry):
-        try:
-            interpreter.eval_node(fn.block)
-        except StaFunctionReturn as res:
-            return res.value
+    if (fn := executor.entry):
+        return executor.call(fn)
+
+
+def transpile_src(src, **flags):
+    # the source of the Python module the program transpiles to
+    from .transpiler import Transpiler
+    iir = translate(src, **flags)
+    return Transpiler(flags.get("entry_name", "main")).transpile(iir)
+
+
+def transpile_and_run_src(src, **flags):
+    return exec_src(src, **flags | {"backend": "python"})
+
+
+def code_cache(flags):
+    # the cache for the code objects of transpiled programs, if any
+    if flags.get("cache_dir") is None:
+        return None
+    from .cache import IRCache, DEFAULT_MAX_SIZE
+    return IRCache(flags["cache_dir"], flags.get("cache_size", DEFAULT_MAX_SIZE))
 
 
 def compile_src(src, **flags):
+    from .compiler import Compiler
     iir = translate(src, **flags)
-    compiler = Compiler()
+    compiler = Compiler(tracer=flags.get("tracer"))
     compiler.build(iir)
     logging.debug(compiler.module)
     return compiler.module
 
 
 def compile_and_run_src(src, **flags):
+    from .compiler import execute_module
     mod = compile_src(src, **flags)
     res = execute_module(mod, entry=flags.get("entry_name", "main"))
     return res
 
 
 def process_cf(block, path, show, test):
+    from .control_flows import ControlFlows, create_flows
+    from .ir_nodes import counter
     if test:
         flows = create_flows(block, counter())
     else:
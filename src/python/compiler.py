@@ -1,53 +1,97 @@
-from llvmcpy import LLVMCPy
-
+from .trace import trace_nodes
 from . import ir_nodes as ir
+from . import type_defs as types
 from . import builtin
 
 
-llvm = LLVMCPy()
+# LLVM is loaded by `init_llvm` the first time something is compiled,
+# as it takes longer than everything else at startup
+llvm = None
+type_map = {}
 
 
-type_map = {
-    builtin.types["int"]: llvm.int32_type(),
-    builtin.types["float"]: llvm.double_type(),
-    builtin.types["bool"]: llvm.int1_type(),
-    builtin.types["char"]: llvm.int8_type(),
-}
+def init_llvm():
+    global llvm
+    if llvm is not None:
+        return
+    from llvmcpy import LLVMCPy
+    llvm = LLVMCPy()
+    type_map.update({
+        builtin.types["int"]: llvm.int32_type(),
+        builtin.types["float"]: llvm.double_type(),
+        builtin.types["bool"]: llvm.int1_type(),
+        builtin.types["char"]: llvm.int8_type(),
+    })
 
 
 class Compiler:
-    def __init__(self):
+    def __init__(self, tracer=None):
+        init_llvm()
         self.refs = {}
         self.module = llvm.module_create_with_name("main")
         self.builder = llvm.create_builder()
         self.i = 0
+        self.tracer = tracer
+        if tracer is not None:
+            self.build = trace_nodes(tracer, "compile", self.build)
 
         self.init_builtins()
 
     def init_builtins(self):
         # string type
-        # assume c-style \00 terminated for now
+        # a pointer to the packed bytes, then their number, laid out like
+        # the other sequences so that they share the code reading them
         string_type = self.module.context.struct_create_named("@String")
-        # TODO: include dynamic memory allocation
         string_field_types = [
-            self.module.context.pointer_type(0)
+            self.module.context.pointer_type(0),
+            type_map[builtin.types["int"]],
         ]
         string_type.struct_set_body(string_field_types, 0)
         type_map[builtin.types["str"]] = string_type
 
         # array type
-        # largely mirrors the string type for now
-        # TODO: this is bad, find a better way
+        # a pointer to the elements, then their number, so a slice is the
+        # same struct pointing into the elements of another
+        # TODO: include dynamic memory allocation
+        sequence_field_types = [
+            self.module.context.pointer_type(0),
+            type_map[builtin.types["int"]],
+        ]
         array_type = self.module.context.struct_create_named("@Array")
-        array_type.struct_set_body(string_field_types, 0)
+        array_type.struct_set_body(sequence_field_types, 0)
         type_map["arr"] = array_type
 
         # vector type
-        # TODO: see above
+        # an array with the number of elements its storage has room for,
+        # which is 0 if the storage is not its own, as for a literal or a
+        # slice, so the first push copies it to the heap
+        # the struct is on the heap too, and a vector is the pointer to it,
+        # so that names and arguments for one vector share it as they do in
+        # the interpreter
         vector_type = self.module.context.struct_create_named("@Vector")
-        vector_type.struct_set_body(string_field_types, 0)
+        vector_type.struct_set_body(sequence_field_types + [type_map[builtin.types["int"]]], 0)
         type_map["vec"] = vector_type
 
+        # map type
+        # an open addressing hash table with linear probing: pointers to the
+        # keys, the values and a flag per slot, then the number of entries,
+        # of slots that are not empty, and of slots, which is a power of 2
+        # like a vector's, the struct is on the heap and a map is the pointer
+        # to it
+        pointer_type = self.module.context.pointer_type(0)
+        int_type = type_map[builtin.types["int"]]
+        map_type = self.module.context.struct_create_named("@Map")
+        map_type.struct_set_body([pointer_type] * 3 + [int_type] * 3, 0)
+        type_map["map"] = map_type
+
+        # out of bounds indices stop the program
+        trap_type = llvm.void_type().function([], 0)
+        self.trap = (trap_type, self.module.add_function("llvm.trap", trap_type))
+
+        # string keys of maps are compared with the C library's memcmp
+        memcmp_type = int_type.function([pointer_type, pointer_type, llvm.int64_type()], 0)
+        self.memcmp = (memcmp_type, self.module.add_function("memcmp", memcmp_type))
+
     def name(self):
         name = "test" + str(self.i)
         self.i += 1
@@ -81,7 +125,9 @@ class Compiler:
                 typ.struct_set_body(field_types, 0)
                 return typ
             case ir.VectorType():
-                return type_map["vec"]
+                return self.module.context.pointer_type(0)
+            case ir.MapType():
+                return self.module.context.pointer_type(0)
             case ir.SequenceType():
                 if node.checked == builtin.types["str"]:
                     return type_map[node.checked]
@@ -122,20 +168,12 @@ class Compiler:
                     return self.builder.build_struct_ge2(parent_type, parent, idx, "")
                 self.refs[id(node)] = obj
             case ir.IndexRef():
-                parent = self.build(node.parent)
-                if isinstance(node.parent, ir.Ref):
-                    # this expects a struct with the sequence ptr inside
-                    # which is the case if the parent is a Ref
-                    parent_type = self.build(node.parent.typ)
-                    inner_ptr = self.builder.build_struct_ge2(
-                        parent_type, parent, 0, ""
-                    )
-                    ptr = self.builder.build_load2(inner_ptr.type_of(), inner_ptr, "")
-                else:
-                    # this is the case if the parent is a Sequence literal
-                    ptr = parent
+                ptr, length = self.build_sequence(node.parent)
                 elem_type = self.build(node.parent.typ.elem_type)
                 idx = self.build(node.index)
+                self.build_bounds_check(
+                    self.builder.build_i_cmp(llvm.IntULT, idx, length, "")
+                )
                 return self.builder.build_in_bounds_ge2(
                     elem_type, ptr, [idx], ""
                 )
@@ -163,6 +201,12 @@ class Compiler:
             case ir.DeclareMethods(_, block):
                 for instr in block.instrs:
                     self.build(instr)
+            case ir.Assign(ref, ir.Sequence(elements) as value):
+                # a literal is the ptr to its elements, which the variable
+                # holds with their number
+                length = type_map[builtin.types["int"]].const_int(len(elements), 0)
+                sequence = self.build_sequence_struct(ref.typ, self.build(value), length)
+                self.builder.build_store(sequence, self.build(ref))
             case ir.Assign(ref, value):
                 var = self.build(ref)
                 val = self.build(value)
@@ -170,6 +214,18 @@ class Compiler:
             case ir.Load(ref):
                 var = self.build(ref)
                 return self.builder.build_load2(self.build(ref.typ), var, "")
+            case ir.Call(ir.FunctionRef(builtin=True, name=name)) if name in builtin.reductions:
+                return self.build_reduction(node)
+            case ir.Call(ir.FunctionRef(builtin=True, name="slice@builtin")):
+                return self.build_slice(node)
+            case ir.Call(ir.FunctionRef(builtin=True, name="range_constructor@builtin")):
+                return self.build_range(node)
+            case ir.Call(ir.FunctionRef(builtin=True, name="set_char@builtin")):
+                return self.build_set_char(node)
+            case ir.Call(ir.FieldRef(method=ir.MethodRef(builtin=True))):
+                if isinstance(node.target.parent.typ, ir.MapType):
+                    return self.build_map_method(node)
+                return self.build_vector_method(node)
             case ir.Call(ref, args):
                 func = self.build(ref)
                 args = [self.build(a) for a in args]
@@ -210,6 +266,8 @@ class Compiler:
                 # perhaps there should be a global func/block
                 for instr in block.instrs:
                     self.build(instr)
+            case ir.Constant(value) if node.typ.checked == builtin.types["str"]:
+                return self.build_string(value)
             case ir.Constant(value):
                 typ = self.build(node.typ)
                 match typ.get_kind():
@@ -220,17 +278,7 @@ class Compiler:
                     case _:
                         raise NotImplementedError
             case ir.Sequence(value):
-                if node.typ == builtin.scope.lookup("str"):
-                    typ = self.build(node.typ)
-                    literal = "".join(c.value for c in value)
-                    const_cstr = llvm.const_string(literal, len(value), 0)
-                    cstr_ptr = self.module.add_global(const_cstr.type_of(), "")
-                    cstr_ptr.set_initializer(const_cstr)
-                    const_str = typ.const_named_struct([cstr_ptr])
-                    str_ptr = self.module.add_global(typ, "")
-                    str_ptr.set_initializer(const_str)
-                    return const_str
-                elif isinstance(node.typ, ir.SequenceType):
+                if isinstance(node.typ, ir.SequenceType):
                     typ = self.build(node.typ)
                     elem_type = self.build(node.typ.elem_type)
                     # Convert the length of the sequence into an LLVM int
@@ -243,6 +291,22 @@ class Compiler:
                     return ptr
                 else:
                     assert False, f"Unreachable: {node}"
+            case ir.Map(keys, values):
+                # a literal is built on the heap, with room for twice its
+                # entries so that it is at most half full
+                table = self.builder.build_malloc(type_map["map"], "")
+                key_type = self.build(node.typ.key_type)
+                value_type = self.build(node.typ.value_type)
+                capacity = 8
+                while capacity < 2 * (len(keys) + 1):
+                    capacity *= 2
+                capacity = type_map[builtin.types["int"]].const_int(capacity, 0)
+                self.build_map_init(table, key_type, value_type, capacity)
+                for key, value in zip(keys, values):
+                    self.build_map_insert(
+                        table, key_type, value_type, self.build(key), self.build(value)
+                    )
+                return table
             case ir.StructLiteral(fields):
                 typ = self.build(node.typ)
                 fields = [self.build(f) for f in fields.values()]
@@ -250,10 +314,628 @@ class Compiler:
             case _:
                 assert False
 
+    def build_string(self, value):
+        # a global holding the UTF-8 bytes, and the struct of a pointer to
+        # them and their length
+        data = value.encode()
+        const_bytes = llvm.const_string(value, len(data), 1)
+        bytes_ptr = self.module.add_global(const_bytes.type_of(), "")
+        bytes_ptr.set_initializer(const_bytes)
+        length = type_map[builtin.types["int"]].const_int(len(data), 0)
+        return type_map[builtin.types["str"]].const_named_struct([bytes_ptr, length])
+
     def build_binary(self, node):
-        left = self.build(node.lhs)
-        right = self.build(node.rhs)
-        match node.op:
+        if isinstance(node.typ.checked, types.SequenceType):
+            return self.build_elementwise(node)
+        return self.build_op(node.op, self.build(node.lhs), self.build(node.rhs))
+
+    def build_elementwise(self, node):
+        # a counted loop applying the operator to each element, with no calls
+        # or stores other than to the fresh result, so LLVM's loop vectoriser
+        # can run it several elements at a time
+        # returns the struct of the result, like a slice
+        operands = [self.build_operand(n) for n in (node.lhs, node.rhs)]
+        lengths = [length for _, _, length in operands if length is not None]
+        length = lengths[0]
+        if len(lengths) == 2:
+            # as in the interpreter, both sequences have the same length
+            self.build_bounds_check(self.builder.build_i_cmp(llvm.IntEQ, *lengths, ""))
+        elem_type = self.build(node.typ.elem_type)
+        result = self.builder.build_array_alloca(elem_type, length, "")
+
+        def body(idx, _):
+            values = [element(idx) for element, _, _ in operands]
+            ptr = self.builder.build_in_bounds_ge2(elem_type, result, [idx], "")
+            self.builder.build_store(self.build_op(node.op, *values), ptr)
+            return []
+        self.build_loop(length, [], body)
+        return self.build_sequence_struct(node.typ, result, length)
+
+    def build_sequence_struct(self, typ, ptr, length):
+        # the struct of a sequence of `typ` with `length` elements at `ptr`,
+        # which as a vector's storage it does not own
+        if isinstance(typ.checked, types.VectorType):
+            capacity = type_map[builtin.types["int"]].const_int(0, 0)
+            return self.build_vector_header(ptr, length, capacity)
+        sequence = self.build(typ).get_undef()
+        sequence = self.builder.build_insert_value(sequence, ptr, 0, "")
+        return self.builder.build_insert_value(sequence, length, 1, "")
+
+    def build_vector_header(self, ptr, length, capacity):
+        # a vector, as the pointer to a new struct on the heap
+        header = self.builder.build_malloc(type_map["vec"], "")
+        for idx, field in enumerate((ptr, length, capacity)):
+            self.builder.build_store(
+                field, self.builder.build_struct_ge2(type_map["vec"], header, idx, "")
+            )
+        return header
+
+    def build_header(self, ref):
+        # the pointer to the struct of the vector or map in a variable
+        return self.builder.build_load2(self.module.context.pointer_type(0), self.build(ref), "")
+
+    def build_reduction(self, node):
+        # the builtin reductions as loops keeping the running value in a
+        # register, rather than calls into a runtime
+        element, elem_type, length = self.build_operand(node.args[0])
+        int_type = type_map[builtin.types["int"]]
+        float_type = type_map[builtin.types["float"]]
+        if node.target.name == "count":
+            return length
+        if node.target.name != "sum":
+            # as in the interpreter, only the sum of no elements is defined
+            self.build_bounds_check(
+                self.builder.build_i_cmp(llvm.IntSGT, length, int_type.const_int(0, 0), "")
+            )
+
+        def as_float(value):
+            if value.type_of() == float_type:
+                return value
+            return self.builder.build_si_to_fp(value, float_type, "")
+
+        match node.target.name:
+            case "sum" | "mean":
+                if elem_type == float_type:
+                    zero = float_type.const_real(0.0)
+                else:
+                    zero = elem_type.const_int(0, 0)
+                total, = self.build_loop(
+                    length, [zero], lambda idx, acc: [self.build_add(acc[0], element(idx))]
+                )
+                if node.target.name == "sum":
+                    return total
+                return self.build_div(as_float(total), as_float(length))
+            case "min" | "max":
+                compare = self.build_less_than if node.target.name == "min" \
+                    else self.build_greater_than
+
+                def body(idx, acc):
+                    value = element(idx)
+                    return [self.builder.build_select(compare(value, acc[0]), value, acc[0], "")]
+                extremum, = self.build_loop(length, [element(int_type.const_int(0, 0))], body)
+                return extremum
+            case "variance":
+                # Welford's algorithm, as in the interpreter
+                def body(idx, acc):
+                    mean, m2 = acc
+                    value = as_float(element(idx))
+                    n = self.builder.build_add(idx, int_type.const_int(1, 0), "")
+                    delta = self.build_sub(value, mean)
+                    mean = self.build_add(mean, self.build_div(delta, as_float(n)))
+                    m2 = self.build_add(m2, self.build_mul(delta, self.build_sub(value, mean)))
+                    return [mean, m2]
+                zero = float_type.const_real(0.0)
+                _, m2 = self.build_loop(length, [zero, zero], body)
+                return self.build_div(m2, as_float(length))
+            case _:
+                assert False, f"Unknown reduction {node.target.name}"
+
+    def build_slice(self, node):
+        # a view is the pointer to its first element and its length, sharing
+        # the elements of the sequence it is taken of
+        values, start, end = node.args
+        ptr, length = self.build_sequence(values)
+        elem_type = self.build(values.typ.elem_type)
+        start = self.build(start)
+        end = self.build(end)
+        self.build_bounds_check(self.builder.build_and(
+            self.builder.build_i_cmp(llvm.IntULE, start, end, ""),
+            self.builder.build_i_cmp(llvm.IntULE, end, length, ""),
+            ""
+        ))
+        ptr = self.builder.build_in_bounds_ge2(elem_type, ptr, [start], "")
+        return self.build_sequence_struct(node.typ, ptr, self.builder.build_sub(end, start, ""))
+
+    def build_vector_method(self, node):
+        # the builtin methods of a vector, on the struct it points to
+        vector = self.build_header(node.target.parent)
+        typ = type_map["vec"]
+        int_type = type_map[builtin.types["int"]]
+        elem_type = self.build(node.target.parent.typ.elem_type)
+        length_ptr = self.builder.build_struct_ge2(typ, vector, 1, "")
+        length = self.builder.build_load2(int_type, length_ptr, "")
+        match node.target.name:
+            case "push":
+                value = self.build(node.args[1])
+                one = int_type.const_int(1, 0)
+                self.build_reserve(vector, elem_type, self.builder.build_add(length, one, ""))
+                ptr = self.build_vector_elements(vector)
+                ptr = self.builder.build_in_bounds_ge2(elem_type, ptr, [length], "")
+                self.builder.build_store(value, ptr)
+                self.builder.build_store(self.builder.build_add(length, one, ""), length_ptr)
+            case "pop":
+                zero = int_type.const_int(0, 0)
+                self.build_bounds_check(self.builder.build_i_cmp(llvm.IntUGT, length, zero, ""))
+                length = self.builder.build_sub(length, int_type.const_int(1, 0), "")
+                self.builder.build_store(length, length_ptr)
+                return self.build_element(self.build_vector_elements(vector), elem_type, length)
+            case "len":
+                return length
+            case "reserve":
+                self.build_reserve(vector, elem_type, self.build(node.args[1]))
+            case "clear":
+                # keeps the storage for the elements pushed next
+                self.builder.build_store(int_type.const_int(0, 0), length_ptr)
+            case _:
+                assert False, f"Unknown vector method {node.target.name}"
+
+    def build_vector_elements(self, vector):
+        ptr = self.builder.build_struct_ge2(type_map["vec"], vector, 0, "")
+        return self.builder.build_load2(self.module.context.pointer_type(0), ptr, "")
+
+    def build_reserve(self, vector, elem_type, needed):
+        # moves the elements of the vector to storage with room for `needed`,
+        # if it has less, of at least twice its capacity so that pushes take
+        # amortised O(1) time
+        typ = type_map["vec"]
+        int_type = type_map[builtin.types["int"]]
+        capacity_ptr = self.builder.build_struct_ge2(typ, vector, 2, "")
+        capacity = self.builder.build_load2(int_type, capacity_ptr, "")
+        parent = self.builder.insert_block.get_parent()
+        grow = self.module.context.append_basic_block(parent, "")
+        free = self.module.context.append_basic_block(parent, "")
+        store = self.module.context.append_basic_block(parent, "")
+        done = self.module.context.append_basic_block(parent, "")
+        full = self.builder.build_i_cmp(llvm.IntSLT, capacity, needed, "")
+        self.builder.build_cond_br(full, grow, done)
+
+        self.builder.position_builder_at_end(grow)
+        doubled = self.builder.build_add(capacity, capacity, "")
+        capacity = self.builder.build_select(
+            self.builder.build_i_cmp(llvm.IntSLT, doubled, needed, ""), needed, doubled, ""
+        )
+        elements = self.builder.build_array_malloc(elem_type, capacity, "")
+        old = self.build_vector_elements(vector)
+        length_ptr = self.builder.build_struct_ge2(typ, vector, 1, "")
+        length = self.builder.build_load2(int_type, length_ptr, "")
+        size = self.builder.build_trunc(elem_type.size_of(), int_type, "")
+        self.builder.build_mem_cpy(elements, 1, old, 1, self.builder.build_mul(length, size, ""))
+        # storage the vector does not own is left to its owner
+        owned = self.builder.build_i_cmp(
+            llvm.IntSGT, self.builder.build_load2(int_type, capacity_ptr, ""),
+            int_type.const_int(0, 0), ""
+        )
+        self.builder.build_cond_br(owned, free, store)
+
+        self.builder.position_builder_at_end(free)
+        self.builder.build_free(old)
+        self.builder.build_br(store)
+
+        self.builder.position_builder_at_end(store)
+        self.builder.build_store(elements, self.builder.build_struct_ge2(typ, vector, 0, ""))
+        self.builder.build_store(capacity, capacity_ptr)
+        self.builder.build_br(done)
+        self.builder.position_builder_at_end(done)
+
+    def build_set_char(self, node):
+        # a copy of the bytes of the string with the one at the index
+        # replaced, as string constants are read-only
+        string, index, char = node.args
+        ptr, length = self.build_sequence(string)
+        index = self.build(index)
+        self.build_bounds_check(self.builder.build_i_cmp(llvm.IntULT, index, length, ""))
+        char_type = type_map[builtin.types["char"]]
+        copy = self.builder.build_array_malloc(char_type, length, "")
+        self.builder.build_mem_cpy(copy, 1, ptr, 1, length)
+        ptr = self.builder.build_in_bounds_ge2(char_type, copy, [index], "")
+        self.builder.build_store(self.build(char), ptr)
+        return self.build_sequence_struct(string.typ, copy, length)
+
+    def build_map_method(self, node):
+        # the builtin methods of a map, on the struct it points to
+        table = self.build_header(node.target.parent)
+        map_type = node.target.parent.typ
+        key_type = self.build(map_type.key_type)
+        value_type = self.build(map_type.value_type)
+        int_type = type_map[builtin.types["int"]]
+        length_ptr = self.builder.build_struct_ge2(type_map["map"], table, 3, "")
+        length = self.builder.build_load2(int_type, length_ptr, "")
+        match node.target.name:
+            case "insert":
+                key, value = (self.build(arg) for arg in node.args[1:])
+                self.build_map_insert(table, key_type, value_type, key, value)
+            case "get":
+                slot, found = self.build_map_find(table, key_type, self.build(node.args[1]))
+                self.build_bounds_check(found)
+                return self.build_element(self.build_map_field(table, 1), value_type, slot)
+            case "contains":
+                return self.build_map_find(table, key_type, self.build(node.args[1]))[1]
+            case "remove":
+                # leaves a tombstone, so that probes for the keys after it
+                # go on past it
+                slot, found = self.build_map_find(table, key_type, self.build(node.args[1]))
+                flag_type = type_map[builtin.types["char"]]
+                flag_ptr = self.builder.build_in_bounds_ge2(
+                    flag_type, self.build_map_field(table, 2), [slot], ""
+                )
+                flag = self.builder.build_load2(flag_type, flag_ptr, "")
+                tombstone = flag_type.const_int(2, 0)
+                flag = self.builder.build_select(found, tombstone, flag, "")
+                self.builder.build_store(flag, flag_ptr)
+                removed = self.builder.build_z_ext(found, int_type, "")
+                self.builder.build_store(self.builder.build_sub(length, removed, ""), length_ptr)
+            case "len":
+                return length
+            case "keys":
+                return self.build_map_entries(table, key_type, 0)
+            case "values":
+                return self.build_map_entries(table, value_type, 1)
+            case _:
+                assert False, f"Unknown map method {node.target.name}"
+
+    def build_map_field(self, table, idx):
+        typ = type_map["map"]
+        field_type = typ.struct_get_type_at_index(idx)
+        ptr = self.builder.build_struct_ge2(typ, table, idx, "")
+        return self.builder.build_load2(field_type, ptr, "")
+
+    def build_map_init(self, table, key_type, value_type, capacity):
+        # empty storage for `capacity` entries
+        typ = type_map["map"]
+        int_type = type_map[builtin.types["int"]]
+        flag_type = type_map[builtin.types["char"]]
+        if key_type not in (type_map[builtin.types["str"]], type_map[builtin.types["float"]]) \
+                and key_type.get_kind() != llvm.IntegerTypeKind:
+            # the other basic types are not hashed and compared so far
+            raise NotImplementedError
+        keys = self.builder.build_array_malloc(key_type, capacity, "")
+        values = self.builder.build_array_malloc(value_type, capacity, "")
+        flags = self.builder.build_array_malloc(flag_type, capacity, "")
+        self.builder.build_mem_set(flags, flag_type.const_int(0, 0), capacity, 1)
+        fields = [keys, values, flags, int_type.const_int(0, 0), int_type.const_int(0, 0), capacity]
+        for idx, field in enumerate(fields):
+            self.builder.build_store(field, self.builder.build_struct_ge2(typ, table, idx, ""))
+
+    def build_map_probe(self, keys, flags, capacity, key_type, key):
+        # the slot holding `key`, or else the empty slot it would go in, and
+        # its flag, which is 0 for an empty slot, 1 for an entry and 2 for a
+        # removed one; there is always an empty slot, the map being at most
+        # half full
+        int_type = type_map[builtin.types["int"]]
+        flag_type = type_map[builtin.types["char"]]
+        mask = self.builder.build_sub(capacity, int_type.const_int(1, 0), "")
+        # Fibonacci hashing, which spreads consecutive keys over the slots
+        hashed = self.build_map_hash(key_type, key)
+        hashed = self.builder.build_mul(hashed, int_type.const_int(0x9E3779B1, 0), "")
+        shifted = self.builder.build_l_shr(hashed, int_type.const_int(16, 0), "")
+        start = self.builder.build_and(self.builder.build_xor(hashed, shifted, ""), mask, "")
+
+        entry = self.builder.insert_block
+        parent = entry.get_parent()
+        loop = self.module.context.append_basic_block(parent, "")
+        check = self.module.context.append_basic_block(parent, "")
+        step = self.module.context.append_basic_block(parent, "")
+        done = self.module.context.append_basic_block(parent, "")
+        self.builder.build_br(loop)
+
+        self.builder.position_builder_at_end(loop)
+        slot = self.builder.build_phi(int_type, "")
+        flag = self.build_element(flags, flag_type, slot)
+        empty = self.builder.build_i_cmp(llvm.IntEQ, flag, flag_type.const_int(0, 0), "")
+        self.builder.build_cond_br(empty, done, check)
+
+        self.builder.position_builder_at_end(check)
+        found = self.builder.build_and(
+            self.builder.build_i_cmp(llvm.IntEQ, flag, flag_type.const_int(1, 0), ""),
+            self.build_map_key_equal(key_type, self.build_element(keys, key_type, slot), key),
+            ""
+        )
+        self.builder.build_cond_br(found, done, step)
+
+        self.builder.position_builder_at_end(step)
+        next_slot = self.builder.build_and(
+            self.builder.build_add(slot, int_type.const_int(1, 0), ""), mask, ""
+        )
+        self.builder.build_br(loop)
+        slot.add_incoming([start, next_slot], [entry, step], 2)
+
+        self.builder.position_builder_at_end(done)
+        return slot, flag
+
+    def build_map_hash(self, key_type, key):
+        # the key as an int, equal for equal keys
+        int_type = type_map[builtin.types["int"]]
+        if key_type == type_map[builtin.types["str"]]:
+            # FNV-1a over the bytes
+            ptr, length = (self.builder.build_extract_value(key, idx, "") for idx in (0, 1))
+            char_type = type_map[builtin.types["char"]]
+
+            def body(idx, acc):
+                byte = self.build_element(ptr, char_type, idx)
+                byte = self.builder.build_z_ext(byte, int_type, "")
+                hashed = self.builder.build_xor(acc[0], byte, "")
+                return [self.builder.build_mul(hashed, int_type.const_int(16777619, 0), "")]
+            hashed, = self.build_loop(length, [int_type.const_int(2166136261, 0)], body)
+            return hashed
+        if key_type == type_map[builtin.types["float"]]:
+            # the bits of the float, adding 0.0 to make -0.0 the same as 0.0
+            zero = key_type.const_real(0.0)
+            bits = self.builder.build_bit_cast(
+                self.builder.build_f_add(key, zero, ""), llvm.int64_type(), ""
+            )
+            high = self.builder.build_l_shr(bits, llvm.int64_type().const_int(32, 0), "")
+            return self.builder.build_trunc(self.builder.build_xor(bits, high, ""), int_type, "")
+        if key.type_of() == int_type:
+            return key
+        return self.builder.build_z_ext(key, int_type, "")
+
+    def build_map_key_equal(self, key_type, left, right):
+        if key_type == type_map[builtin.types["str"]]:
+            # the bytes are compared only if the lengths are equal
+            lengths = [self.builder.build_extract_value(key, 1, "") for key in (left, right)]
+            same = self.builder.build_i_cmp(llvm.IntEQ, *lengths, "")
+            count = self.builder.build_select(
+                same, lengths[0], type_map[builtin.types["int"]].const_int(0, 0), ""
+            )
+            ptrs = [self.builder.build_extract_value(key, 0, "") for key in (left, right)]
+            count = self.builder.build_z_ext(count, llvm.int64_type(), "")
+            order = self.builder.build_call2(*self.memcmp, [*ptrs, count], "")
+            zero = order.type_of().const_int(0, 0)
+            return self.builder.build_and(
+                same, self.builder.build_i_cmp(llvm.IntEQ, order, zero, ""), ""
+            )
+        if key_type == type_map[builtin.types["float"]]:
+            return self.builder.build_f_cmp(llvm.RealOEQ, left, right, "")
+        return self.builder.build_i_cmp(llvm.IntEQ, left, right, "")
+
+    def build_map_find(self, table, key_type, key):
+        # the slot of `key` and whether it is in the map
+        slot, flag = self.build_map_probe(
+            self.build_map_field(table, 0), self.build_map_field(table, 2),
+            self.build_map_field(table, 5), key_type, key
+        )
+        flag_type = type_map[builtin.types["char"]]
+        return slot, self.builder.build_i_cmp(llvm.IntEQ, flag, flag_type.const_int(1, 0), "")
+
+    def build_map_insert(self, table, key_type, value_type, key, value):
+        self.build_map_grow(table, key_type, value_type)
+        typ = type_map["map"]
+        int_type = type_map[builtin.types["int"]]
+        flag_type = type_map[builtin.types["char"]]
+        keys = self.build_map_field(table, 0)
+        values = self.build_map_field(table, 1)
+        flags = self.build_map_field(table, 2)
+        slot, flag = self.build_map_probe(
+            keys, flags, self.build_map_field(table, 5), key_type, key
+        )
+        for ptr, elem_type, elem in ((keys, key_type, key), (values, value_type, value),
+                                     (flags, flag_type, flag_type.const_int(1, 0))):
+            ptr = self.builder.build_in_bounds_ge2(elem_type, ptr, [slot], "")
+            self.builder.build_store(elem, ptr)
+        # a new key takes an empty slot
+        added = self.builder.build_i_cmp(llvm.IntNE, flag, flag_type.const_int(1, 0), "")
+        added = self.builder.build_z_ext(added, int_type, "")
+        for idx in (3, 4):
+            ptr = self.builder.build_struct_ge2(typ, table, idx, "")
+            count = self.builder.build_load2(int_type, ptr, "")
+            self.builder.build_store(self.builder.build_add(count, added, ""), ptr)
+
+    def build_map_grow(self, table, key_type, value_type):
+        # moves the entries to new storage if one more would make the map
+        # over half full, clearing the tombstones
+        typ = type_map["map"]
+        int_type = type_map[builtin.types["int"]]
+        flag_type = type_map[builtin.types["char"]]
+        used = self.build_map_field(table, 4)
+        capacity = self.build_map_field(table, 5)
+        parent = self.builder.insert_block.get_parent()
+        grow = self.module.context.append_basic_block(parent, "")
+        done = self.module.context.append_basic_block(parent, "")
+        needed = self.builder.build_add(used, int_type.const_int(1, 0), "")
+        needed = self.builder.build_add(needed, needed, "")
+        full = self.builder.build_i_cmp(llvm.IntSGT, needed, capacity, "")
+        self.builder.build_cond_br(full, grow, done)
+
+        self.builder.position_builder_at_end(grow)
+        old_keys = self.build_map_field(table, 0)
+        old_values = self.build_map_field(table, 1)
+        old_flags = self.build_map_field(table, 2)
+        length = self.build_map_field(table, 3)
+        # doubles, unless removed entries are most of the ones it holds
+        crowded = self.builder.build_add(length, int_type.const_int(1, 0), "")
+        crowded = self.builder.build_mul(crowded, int_type.const_int(4, 0), "")
+        crowded = self.builder.build_i_cmp(llvm.IntSGT, crowded, capacity, "")
+        new_capacity = self.builder.build_select(
+            crowded, self.builder.build_add(capacity, capacity, ""), capacity, ""
+        )
+        self.build_map_init(table, key_type, value_type, new_capacity)
+        keys = self.build_map_field(table, 0)
+        values = self.build_map_field(table, 1)
+        flags = self.build_map_field(table, 2)
+
+        def rehash(idx, accs):
+            move = self.module.context.append_basic_block(parent, "")
+            moved = self.module.context.append_basic_block(parent, "")
+            flag = self.build_element(old_flags, flag_type, idx)
+            entry = self.builder.build_i_cmp(llvm.IntEQ, flag, flag_type.const_int(1, 0), "")
+            self.builder.build_cond_br(entry, move, moved)
+            self.builder.position_builder_at_end(move)
+            key = self.build_element(old_keys, key_type, idx)
+            value = self.build_element(old_values, value_type, idx)
+            slot, _ = self.build_map_probe(keys, flags, new_capacity, key_type, key)
+            for ptr, elem_type, elem in ((keys, key_type, key), (values, value_type, value),
+                                         (flags, flag_type, flag_type.const_int(1, 0))):
+                ptr = self.builder.build_in_bounds_ge2(elem_type, ptr, [slot], "")
+                self.builder.build_store(elem, ptr)
+            self.builder.build_br(moved)
+            self.builder.position_builder_at_end(moved)
+            return []
+
+        self.build_loop(capacity, [], rehash)
+        for old in (old_keys, old_values, old_flags):
+            self.builder.build_free(old)
+        for idx in (3, 4):
+            self.builder.build_store(length, self.builder.build_struct_ge2(typ, table, idx, ""))
+        self.builder.build_br(done)
+        self.builder.position_builder_at_end(done)
+
+    def build_map_entries(self, table, elem_type, field):
+        # a vector of the keys or values, in the order of their slots
+        int_type = type_map[builtin.types["int"]]
+        flag_type = type_map[builtin.types["char"]]
+        length = self.build_map_field(table, 3)
+        # one spare element lets every slot be copied without a branch, each
+        # entry overwriting the slots before it that are not entries
+        capacity = self.builder.build_add(length, int_type.const_int(1, 0), "")
+        elements = self.builder.build_array_malloc(elem_type, capacity, "")
+        source = self.build_map_field(table, field)
+        flags = self.build_map_field(table, 2)
+
+        def copy(idx, accs):
+            count, = accs
+            ptr = self.builder.build_in_bounds_ge2(elem_type, elements, [count], "")
+            self.builder.build_store(self.build_element(source, elem_type, idx), ptr)
+            flag = self.build_element(flags, flag_type, idx)
+            entry = self.builder.build_i_cmp(llvm.IntEQ, flag, flag_type.const_int(1, 0), "")
+            entry = self.builder.build_z_ext(entry, int_type, "")
+            return [self.builder.build_add(count, entry, "")]
+
+        self.build_loop(self.build_map_field(table, 5), [int_type.const_int(0, 0)], copy)
+        return self.build_vector_header(elements, length, capacity)
+
+    def build_bounds_check(self, in_bounds):
+        # continues in a new block if `in_bounds`, and traps otherwise
+        parent = self.builder.insert_block.get_parent()
+        ok = self.module.context.append_basic_block(parent, "")
+        out_of_bounds = self.module.context.append_basic_block(parent, "")
+        self.builder.build_cond_br(in_bounds, ok, out_of_bounds)
+        self.builder.position_builder_at_end(out_of_bounds)
+        self.builder.build_call2(*self.trap, [], "")
+        self.builder.build_unreachable()
+        self.builder.position_builder_at_end(ok)
+
+    def build_loop(self, length, inits, body):
+        # a loop over the indices below `length`, with `body` building each
+        # iteration given the index and the values it returned for the last
+        # one, starting from `inits`; returns its values for the last index,
+        # or `inits` if there is none
+        int_type = type_map[builtin.types["int"]]
+        if isinstance(length, int):
+            length = int_type.const_int(length, 0)
+        entry = self.builder.insert_block
+        parent = entry.get_parent()
+        loop = self.module.context.append_basic_block(parent, "")
+        done = self.module.context.append_basic_block(parent, "")
+        # the condition is checked after each iteration, so also before the
+        # first, which LLVM folds away for a constant length
+        empty = self.builder.build_i_cmp(llvm.IntSLE, length, int_type.const_int(0, 0), "")
+        self.builder.build_cond_br(empty, done, loop)
+        self.builder.position_builder_at_end(loop)
+        idx = self.builder.build_phi(int_type, "")
+        accs = [self.builder.build_phi(init.type_of(), "") for init in inits]
+        nexts = body(idx, accs)
+        # the body may have branched, so the iteration ends in its last block
+        latch = self.builder.insert_block
+        next_idx = self.builder.build_add(idx, int_type.const_int(1, 0), "")
+        idx.add_incoming([int_type.const_int(0, 0), next_idx], [entry, latch], 2)
+        for acc, init, value in zip(accs, inits, nexts):
+            acc.add_incoming([init, value], [entry, latch], 2)
+        more = self.builder.build_i_cmp(llvm.IntSLT, next_idx, length, "")
+        self.builder.build_cond_br(more, loop, done)
+        self.builder.position_builder_at_end(done)
+        results = []
+        for init, value in zip(inits, nexts):
+            result = self.builder.build_phi(init.type_of(), "")
+            result.add_incoming([init, value], [entry, latch], 2)
+            results.append(result)
+        return results
+
+    def build_element(self, ptr, elem_type, idx):
+        ptr = self.builder.build_in_bounds_ge2(elem_type, ptr, [idx], "")
+        return self.builder.build_load2(elem_type, ptr, "")
+
+    def build_operand(self, node):
+        # a function building the element of a sequence operand at an index,
+        # their type and their number, or one building a scalar operand
+        # and None for both
+        if not isinstance(node.typ.checked, types.SequenceType):
+            value = self.build(node)
+            return (lambda idx: value), None, None
+        elem_type = self.build(node.typ.elem_type)
+        if self.is_range(node):
+            # a range read once is never built, each element being computed
+            start, length = self.build_range_bounds(node)
+            return (lambda idx: self.builder.build_add(start, idx, "")), elem_type, length
+        ptr, length = self.build_sequence(node)
+        return (lambda idx: self.build_element(ptr, elem_type, idx)), elem_type, length
+
+    def is_range(self, node):
+        return isinstance(node, ir.Call) and node.target.name == "range_constructor@builtin"
+
+    def build_range_bounds(self, node):
+        # the first element of a range and the number of them, which like
+        # the interpreter it traps on unless positive
+        start, end = (self.build(arg) for arg in node.args)
+        self.build_bounds_check(self.builder.build_i_cmp(llvm.IntSLT, start, end, ""))
+        return start, self.builder.build_sub(end, start, "")
+
+    def build_range(self, node):
+        # a range to be kept, or written to, as the array of its elements,
+        # filled by a loop LLVM can vectorise
+        start, length = self.build_range_bounds(node)
+        int_type = type_map[builtin.types["int"]]
+        elements = self.builder.build_array_malloc(int_type, length, "")
+
+        def body(idx, _):
+            ptr = self.builder.build_in_bounds_ge2(int_type, elements, [idx], "")
+            self.builder.build_store(self.builder.build_add(start, idx, ""), ptr)
+            return []
+        self.build_loop(length, [], body)
+        return self.build_sequence_struct(node.typ, elements, length)
+
+    def build_sequence(self, node):
+        # the pointer to the elements of a sequence and their number, which
+        # every sequence struct holds as its first two fields
+        int_type = type_map[builtin.types["int"]]
+        if isinstance(node, ir.Load):
+            node = node.ref
+        if isinstance(node, ir.Sequence):
+            # a literal is the ptr itself
+            return self.build(node), int_type.const_int(len(node.elements), 0)
+        if isinstance(node.typ.checked, types.VectorType):
+            # a vector is the pointer to its struct
+            header = self.build_header(node) if isinstance(node, ir.Ref) else self.build(node)
+            return self.build_sequence_fields(type_map["vec"], header)
+        if isinstance(node, ir.Ref):
+            # a variable, or an element, holds the struct
+            return self.build_sequence_fields(self.build(node.typ), self.build(node))
+        # a call, a slice, an element-wise result or a string constant is the
+        # struct
+        value = self.build(node)
+        return tuple(self.builder.build_extract_value(value, idx, "") for idx in (0, 1))
+
+    def build_sequence_fields(self, typ, ptr):
+        # the first two fields of the sequence struct of `typ` at `ptr`
+        field_types = (self.module.context.pointer_type(0), type_map[builtin.types["int"]])
+        return tuple(
+            self.builder.build_load2(
+                field_type, self.builder.build_struct_ge2(typ, ptr, idx, ""), ""
+            )
+            for idx, field_type in enumerate(field_types)
+        )
+
+    def build_op(self, op, left, right):
+        match op:
             case '+':
                 return self.build_add(left, right)
             case '-':
@@ -275,7 +957,7 @@ class Compiler:
             case '>=':
                 return self.build_greater_than_equal(left, right)
             case _:
-                assert False, f"Unimplemented operator: {node.op}"
+                assert False, f"Unimplemented operator: {op}"
 
     def build_add(self, left, right):
         # Type coercion not implemented, so only left.typ needs checking
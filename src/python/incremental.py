@@ -0,0 +1,140 @@
+from bisect import bisect_left, bisect_right
+
+from .lexer import (
+    TokenBuffer, tokenise_compact, lex_into,
+    TOKEN_TYPES, SEMICOLON_INSERT, LOOKAHEAD,
+)
+from .parser import Parser
+from . import ast_nodes as ast
+
+
+class IncrementalParser:
+    # keeps the tokens and AST of a source up to date as it is edited
+    # only the tokens around an edit are re-lexed, and only the top-level
+    # declarations whose tokens changed are re-parsed; every other
+    # `ast.Declr` is reused as is (so the positions in its tokens go stale)
+    def __init__(self, src, error_handler=None):
+        self.error_handler = error_handler
+        self.tokens = tokenise_compact(src, error_handler)
+        # token range [start, end) of each top-level declaration
+        declrs, self.spans, _ = self.parse_declrs(0, {})
+        self.program = ast.Program(declrs)
+        # how much work the last edit took
+        self.relexed = len(self.tokens)
+        self.reparsed = len(declrs)
+
+    @property
+    def src(self):
+        return self.tokens.src
+
+    def parse_declrs(self, cur, reuse):
+        # parse declarations from token `cur` until the tokens run out or
+        # a declaration would start at one of the boundaries in `reuse`
+        # also returns the token the parser stopped at
+        parser = Parser(self.tokens, self.error_handler)
+        parser.cur = cur
+        declrs = []
+        spans = []
+        while parser.peek() is not None and parser.cur not in reuse:
+            start = parser.cur
+            declrs.append(parser.parse_declaration())
+            spans.append((start, parser.cur))
+        return declrs, spans, parser.cur
+
+    def relex(self, offset, deleted, inserted):
+        # returns the new token buffer and the ranges of old and new tokens
+        # that differ, [first, old_end) and [first, new_end)
+        # everything outside them is the same token, shifted along
+        old = self.tokens
+        src = old.src[:offset] + inserted + old.src[offset + deleted:]
+        delta = len(inserted) - deleted
+        edit_end = offset + len(inserted)
+        types, starts, lengths = old.types, old.starts, old.lengths
+
+        # the first token that could see the edit, either in its own text
+        # or in the chars the lexer looked at past its end
+        first = bisect_right(starts, offset)
+        while first and starts[first - 1] + lengths[first - 1] + LOOKAHEAD > offset:
+            first -= 1
+        if first:
+            restart = starts[first - 1] + lengths[first - 1]
+            insert = TOKEN_TYPES[types[first - 1]] in SEMICOLON_INSERT
+        else:
+            restart = 0
+            insert = False
+
+        buf = TokenBuffer(src)
+        buf.types = types[:first]
+        buf.starts = starts[:first]
+        buf.lengths = lengths[:first]
+        n_lines = bisect_left(old.newlines, restart)
+        buf.newlines = old.newlines[:n_lines]
+        buf.shifts = old.shifts[:n_lines]
+
+        synced = None
+
+        def sync(code, start, length):
+            # past the edit, a token identical to an old one means the rest
+            # of the old tokens are still valid
+            nonlocal synced
+            if start < edit_end:
+                return False
+            i = bisect_left(starts, start - delta)
+            if (
+                i < len(starts) and starts[i] == start - delta
+                and types[i] == code and lengths[i] == length
+            ):
+                synced = i
+                return True
+            return False
+
+        stop = lex_into(buf, restart, insert, self.error_handler, sync)
+        if synced is None:
+            old_end = len(old)
+            new_end = len(buf)
+        else:
+            # the synced token itself is unchanged
+            old_end = synced
+            new_end = len(buf) - 1
+            buf.types.extend(types[synced + 1:])
+            buf.starts.extend(map(delta.__add__, starts[synced + 1:]))
+            buf.lengths.extend(lengths[synced + 1:])
+            n_lines = bisect_left(old.newlines, stop - delta)
+            buf.newlines.extend(map(delta.__add__, old.newlines[n_lines:]))
+            buf.shifts.extend(old.shifts[n_lines:])
+
+        # re-lexed tokens that end before the edit came out the same
+        while (
+            first < min(old_end, new_end) and starts[first] + lengths[first] <= offset
+            and buf.types[first] == types[first] and buf.starts[first] == starts[first]
+            and buf.lengths[first] == lengths[first]
+        ):
+            first += 1
+        return buf, first, old_end, new_end
+
+    def edit(self, offset, deleted, inserted):
+        # replace `deleted` chars at `offset` with the text `inserted`
+        buf, first, old_end, new_end = self.relex(offset, deleted, inserted)
+        self.tokens = buf
+        self.relexed = new_end - first
+        shift = new_end - old_end
+
+        spans = self.spans
+        declrs = self.program.declrs
+        # declarations that end before the first changed token are kept
+        keep_before = bisect_right(spans, first, key=lambda span: span[1])
+        # as are those starting after the last, once their spans are shifted
+        keep_after = bisect_left(spans, old_end, key=lambda span: span[0])
+        reuse = {spans[i][0] + shift: i for i in range(keep_after, len(spans))}
+
+        cur = spans[keep_before - 1][1] if keep_before else 0
+        new_declrs, new_spans, stop = self.parse_declrs(cur, reuse)
+        self.reparsed = len(new_declrs)
+
+        tail = reuse.get(stop, len(spans))
+        self.spans = (
+            spans[:keep_before] + new_spans
+            + [(start + shift, end + shift) for start, end in spans[tail:]]
+        )
+        self.program = ast.Program(declrs[:keep_before] + new_declrs + declrs[tail:])
+        return self.program
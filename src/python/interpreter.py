@@ -1,9 +1,14 @@
+from array import array
 from dataclasses import dataclass
+from itertools import islice, repeat
 import logging
+import operator
 
 from .lexer import tokenise
 from .parser import Parser, parse
 from .type_checker import TypeChecker
+from .trace import trace_nodes
+from .resolve import resolve_slots, resolve_ropes, layout, is_append
 from . import ir_nodes as ir
 from . import type_defs as types
 from . import builtin
@@ -25,6 +30,11 @@ class StaVector(StaObject):
     value: list[StaObject]
 
 
+@dataclass
+class StaMap(StaObject):
+    value: dict
+
+
 @dataclass
 class StaVariable:
     name: str
@@ -42,6 +52,8 @@ class StaFunction:
     sig: ir.FunctionSigRef
     params: list[ir.Ref]
     block: ir.Block
+    frame_size: int = 0
+    captured: tuple = ()
 
 
 @dataclass
@@ -67,12 +79,6 @@ class StaInternalException(StaException):
     pass
 
 
-class StaFunctionReturn(StaInternalException):
-    def __init__(self, value):
-        self.value = value
-        super().__init__()
-
-
 class StaTypeError(StaException):
     pass
 
@@ -89,11 +95,267 @@ def sta_print(string):
     print(string.value)
 
 
+def is_boxed(typ):
+    # whether values of `typ` are Sta objects when unboxed values are raw
+    return not isinstance(typ, types.BasicType)
+
+
+def box(typ, value):
+    return StaObject(typ, value) if typ is not None and not is_boxed(typ) else value
+
+
+def unbox(obj):
+    return obj.value if type(obj) is StaObject else obj
+
+
+BINARY_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+    "==": operator.eq,
+    "!=": operator.ne,
+    ">": operator.gt,
+    "<": operator.lt,
+    ">=": operator.ge,
+    "<=": operator.le,
+}
+
+
+# Sequences keep their elements unboxed: those of these basic types in an
+# `array` of the typecode, and any others in a list, with the elements of
+# basic types raw and the rest Sta objects
+# ranges keep a Python `range` until they are written to, so they are
+# indexed, measured and iterated without being built
+# ints are unbounded, so an int buffer holding one beyond 64 bits becomes a
+# list, by `to_list`
+BUFFER_TYPECODES = {
+    types.BasicTypeKind.INT: "q",
+    types.BasicTypeKind.FLOAT: "d",
+    types.BasicTypeKind.BOOL: "B",
+    types.BasicTypeKind.CHAR: "L",
+}
+# the conversions of elements written to, and read from, buffers that do not
+# hold the Python type of their elements
+ENCODERS = {"B": int, "L": ord}
+DECODERS = {"B": bool, "L": chr}
+
+
+def new_sequence(typ, values):
+    # a sequence of the `types.SequenceType` holding `values`
+    cls = StaVector if isinstance(typ, types.VectorType) else StaArray
+    typecode = BUFFER_TYPECODES.get(getattr(typ.elem_type, "kind", None))
+    if typecode is None:
+        return cls(typ, list(values))
+    if (encode := ENCODERS.get(typecode)) is not None:
+        values = map(encode, values)
+    elif typecode == "q" and type(values) not in (list, range, array):
+        # kept to build a list from if an element overflows
+        values = list(values)
+    try:
+        return cls(typ, array(typecode, values))
+    except OverflowError:
+        return cls(typ, list(values))
+
+
+def to_list(sequence):
+    # the elements of `sequence`, moved from its buffer into a list
+    values = sequence.value = list(sequence.value)
+    return values
+
+
+class View:
+    # the elements of `base`, a sequence, from `offset` for `length`, which
+    # share its storage, so writes through either are seen by both
+    __slots__ = ("base", "offset", "length")
+
+    def __init__(self, base, offset, length):
+        self.base = base
+        self.offset = offset
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        values = self.base.value
+        if type(values) is list:
+            return islice(values, self.offset, self.offset + self.length)
+        return iter(self.window())
+
+    def window(self):
+        # the viewed elements of the base's buffer, as a sized sequence of
+        # them that is not a copy
+        values = self.base.value
+        end = self.offset + self.length
+        if type(values) is array:
+            return memoryview(values)[self.offset:end]
+        if type(values) is range:
+            return values[self.offset:end]
+        return self
+
+
+def slice_sequence(sequence, start, end):
+    # a view of the elements of `sequence` from `start` up to `end`, or a
+    # copy of them for a string, which is immutable
+    length = len(sequence.value)
+    assert 0 <= start <= end <= length, f"Slice {start}:{end} out of bounds for {length}"
+    if type(sequence.value) is str:
+        return StaObject(sequence.typ, sequence.value[start:end])
+    view = View(sequence, start, end - start)
+    if type(sequence.value) is View:
+        # a view of a view is of the same base, so indexing it is one step
+        view.base = sequence.value.base
+        view.offset += sequence.value.offset
+    if isinstance(sequence.typ, types.VectorType):
+        return StaVector(sequence.typ, view)
+    return StaArray(types.ArrayType(sequence.typ.elem_type, end - start), view)
+
+
+def new_map(typ, keys, values):
+    # a map of the `types.MapType` from each of `keys` to the value at the
+    # same index, which like the elements of sequences are unboxed
+    return StaMap(typ, dict(zip(keys, values)))
+
+
+def restore(refs, captured, saved):
+    # puts back the variables `saved` from `refs` before a call, on its return
+    for ref, var in zip(captured, saved):
+        if var is None:
+            refs.pop(id(ref), None)
+        else:
+            refs[id(ref)] = var
+
+
+def own_buffer(vector):
+    # the buffer of a vector about to change length, which a view of
+    # another first copies into one of its own
+    values = vector.value
+    if type(values) is View:
+        base = values.base.value
+        window = values.window()
+        values = vector.value = array(base.typecode, window) if type(base) is array \
+            else list(window)
+    return values
+
+
+def get_element(sequence, index):
+    # strings are indexed as they are, as a Python `str`
+    elements = sequence if type(sequence) is str else sequence.value
+    assert index >= 0 and index < len(elements), f"Index {index} out of bounds"
+    if type(elements) is View:
+        return get_element(elements.base, elements.offset + index)
+    value = elements[index]
+    if type(elements) is array and (decode := DECODERS.get(elements.typecode)):
+        return decode(value)
+    return value
+
+
+def set_element(sequence, index, value):
+    elements = sequence.value
+    assert index >= 0 and index < len(elements), f"Index {index} out of bounds"
+    if type(elements) is View:
+        set_element(elements.base, elements.offset + index, value)
+        return
+    if type(elements) is range:
+        try:
+            elements = sequence.value = array("q", elements)
+        except OverflowError:
+            elements = to_list(sequence)
+    if type(elements) is array and (encode := ENCODERS.get(elements.typecode)):
+        value = encode(value)
+    try:
+        elements[index] = value
+    except OverflowError:
+        to_list(sequence)[index] = value
+
+
+def elements(sequence):
+    # the elements of a sequence, decoded from its buffer
+    values = buffer = sequence.value
+    if type(values) is View:
+        values = values.window()
+        buffer = values.obj if type(values) is memoryview else values
+    if type(buffer) is array and (decode := DECODERS.get(buffer.typecode)):
+        return map(decode, values)
+    return values
+
+
+def elementwise(op, typ, lhs, rhs):
+    # a sequence of `typ` holding `op` applied to the elements of `lhs` and
+    # `rhs` at each index, where either may instead be an unboxed scalar
+    # paired with every element, built in one pass over the buffers
+    if not isinstance(lhs, (StaArray, StaVector)):
+        values = map(op, repeat(lhs), elements(rhs))
+    elif not isinstance(rhs, (StaArray, StaVector)):
+        values = map(op, elements(lhs), repeat(rhs))
+    else:
+        assert len(lhs.value) == len(rhs.value), \
+            f"Mismatched lengths {len(lhs.value)} and {len(rhs.value)}"
+        values = map(op, elements(lhs), elements(rhs))
+    return new_sequence(typ, values)
+
+
+class Rope:
+    # a string built by appending, as its parts, which are only joined when
+    # it is read; ropes sharing `parts` are each a prefix of it, so only the
+    # longest is extended in place
+    __slots__ = ("parts", "length", "flat")
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.length = len(parts)
+        self.flat = None
+
+
+def concat(string, tail):
+    # `string + tail` for a variable `resolve_ropes` marked
+    if type(string) is not Rope:
+        return Rope([string, tail])
+    parts = string.parts
+    if string.length < len(parts):
+        parts = parts[:string.length]
+    parts.append(tail)
+    return Rope(parts)
+
+
+def flatten(string):
+    # the `str` a rope holds, which is kept for the next read
+    if type(string) is not Rope:
+        return string
+    if string.flat is None:
+        string.flat = "".join(string.parts[:string.length])
+        # later appends extend the joined string, not the parts
+        string.parts = [string.flat]
+        string.length = 1
+    return string.flat
+
+
+def returned_type(block):
+    # the type of the values a function's body returns, or None if it does not
+    # return one
+    for block in layout(block):
+        for instr in block.instrs:
+            if isinstance(instr, ir.Return) and instr.value is not None:
+                return instr.value.typ.checked
+    return None
+
+
 class Interpreter:
-    def __init__(self, entry_name="main"):
+    # with `unboxed`, values of basic types are raw Python values rather than
+    # `StaObject`s, and are only boxed when they are returned to the caller
+    # of `call`
+    def __init__(self, entry_name="main", tracer=None, unboxed=False):
+        # variables without a slot in a frame, by id(ref)
         self.refs = {}
+        # the activation frame of the running function
+        self.frame = None
         self.entry_name = entry_name
         self.entry = None
+        self.unboxed = unboxed
+        self.tracer = tracer
+        if tracer is not None:
+            self.eval_node = trace_nodes(tracer, "interpret", self.eval_node)
 
     def eval_node(self, node, **kwargs):
         match node:
@@ -120,28 +382,22 @@ class Interpreter:
                     if node.builtin:
                         obj = StaBuiltinFunction(node.typ, node.params, node.block)
                     else:
-                        obj = StaFunction(node.typ, node.params, node.block)
+                        obj = StaFunction(
+                            node.typ, node.params, node.block, node.frame_size,
+                            tuple(node.captured)
+                        )
                     if obj.sig.name == self.entry_name:
                         self.entry = obj
                 case ir.FieldRef():
                     if isinstance(node.typ, ir.FunctionSigRef):
                         obj = self.eval_node(node.method)
+                        self.refs[id(node)] = obj
                     else:
-                        struct = self.eval_node(node.parent).value
+                        # the struct can differ between calls
+                        struct = self.load(node.parent)
                         obj = struct.value[node.name]
-                    self.refs[id(node)] = obj
                 case ir.IndexRef():
-                    sequence = self.eval_node(node.parent)
-                    if isinstance(sequence, StaVariable):
-                        logging.debug(sequence.value)
-                        sequence = sequence.value
-                    # TODO: no good way to get string repr of raw sequence (i.e. [x:y][z])
-                    seq_name = node.parent.name if isinstance(node.parent, ir.Ref) else None
-                    index = self.eval_node(node.index).value
-                    assert index >= 0 and index < len(sequence.value), \
-                        f"Index {index} out of bounds for {seq_name}"
-                    obj = sequence.value[index]
-                    logging.debug(obj)
+                    assert False, "elements are only read by `load` and written by `store`"
                 case ir.ConstRef():
                     value = self.eval_node(node.value)
                     obj = StaVariable(node.name, value)
@@ -154,41 +410,29 @@ class Interpreter:
     def eval_instr(self, node):
         match node:
             case ir.Declare(ref):
-                var = self.eval_node(ref)
-                self.refs[id(ref)] = var
+                if ref.slot is None:
+                    if not isinstance(ref, (ir.FunctionRef, ir.Type)):
+                        # each run of a declaration makes a new variable
+                        self.refs.pop(id(ref), None)
+                    self.refs[id(ref)] = self.eval_node(ref)
+                elif isinstance(ref, ir.ConstRef):
+                    self.frame[ref.slot] = self.eval_node(ref.value)
             case ir.DeclareMethods(_, block):
                 self.eval_node(block)
+            case ir.Assign(ref, value) if ref.rope and is_append(ref, value):
+                string = concat(unbox(self.load(ref, flat=False)), unbox(self.eval_node(value.rhs)))
+                self.store(ref, string if self.unboxed else StaObject(ref.typ.checked, string))
             case ir.Assign(ref, value):
-                var = self.eval_node(ref)
-                val = self.eval_node(value)
-                var.value = val
+                self.store(ref, self.eval_node(value))
             case ir.Load(ref):
-                var = self.eval_node(ref)
-                return var.value
+                return self.load(ref)
             case ir.Call(ref, args):
                 func = self.eval_node(ref)
-                for param_ref, arg in zip(func.params, args):
-                    param = self.eval_node(param_ref)
-                    self.refs[id(param_ref)] = param
-                    param.value = self.eval_node(arg)
-                try:
-                    if isinstance(func, StaBuiltinFunction):
-                        self.call_builtin(func)
-                    else:
-                        self.eval_node(func.block)
-                except StaFunctionReturn as res:
-                    return res.value
-            case ir.Return(value):
-                val = self.eval_node(value)
-                raise StaFunctionReturn(val)
-            case ir.Branch(block):
-                self.eval_node(block)
-            case ir.CBranch(condition, t_block, f_block):
-                cond = self.eval_node(condition)
-                if cond.value:
-                    self.eval_node(t_block)
-                else:
-                    self.eval_node(f_block)
+                if self.unboxed and isinstance(func, StaBuiltinFunction):
+                    return unbox(call_builtin(func, [
+                        box(arg.typ.checked, self.eval_node(arg)) for arg in args
+                    ]))
+                return self.invoke(func, [self.eval_node(arg) for arg in args])
             case ir.Binary():
                 return self.eval_binary(node)
             case ir.Unary():
@@ -198,19 +442,25 @@ class Interpreter:
 
     def eval_object(self, node):
         match node:
-            case ir.Block(instrs):
-                for instr in instrs:
-                    self.eval_node(instr)
+            case ir.Block():
+                self.eval_block(node)
             case ir.Program(block):
+                resolve_slots(node)
+                resolve_ropes(node)
                 self.eval_node(block)
             case ir.Constant(value):
-                return StaObject(self.eval_node(node.typ), value)
+                if self.unboxed:
+                    return value
+                return StaObject(node.typ.checked, value)
             case ir.Sequence(elements):
-                elems = [StaVariable("", self.eval_node(element)) for element in elements]
-                if isinstance(node.typ.checked, types.VectorType):
-                    return StaVector(node.typ.checked, elems)
-                else:
-                    return StaArray(node.typ.checked, elems)
+                values = [self.eval_node(element) for element in elements]
+                if not self.unboxed:
+                    values = [unbox(value) for value in values]
+                return new_sequence(node.typ.checked, values)
+            case ir.Map(keys, values):
+                keys = [unbox(self.eval_node(key)) for key in keys]
+                values = [unbox(self.eval_node(value)) for value in values]
+                return new_map(node.typ.checked, keys, values)
             case ir.StructLiteral(fields):
                 vars = {}
                 for name, value in fields.items():
@@ -219,10 +469,103 @@ class Interpreter:
             case _:
                 assert False
 
+    def load(self, ref, flat=True):
+        # the value of a variable, with a rope joined unless not `flat`
+        if ref.slot is not None:
+            value = self.frame[ref.slot]
+        elif isinstance(ref, ir.IndexRef):
+            value = get_element(*self.element(ref))
+            return value if self.unboxed else box(ref.typ.checked, value)
+        else:
+            value = self.eval_node(ref).value
+        if ref.rope and flat:
+            if self.unboxed:
+                return flatten(value)
+            return StaObject(ref.typ.checked, flatten(value.value))
+        return value
+
+    def store(self, ref, value):
+        if ref.slot is not None:
+            self.frame[ref.slot] = value
+        elif isinstance(ref, ir.IndexRef):
+            set_element(*self.element(ref), value if self.unboxed else unbox(value))
+        else:
+            self.eval_node(ref).value = value
+
+    def element(self, ref):
+        # the sequence and index of the element `ref` refers to
+        if isinstance(ref.parent, ir.Ref):
+            sequence = self.load(ref.parent)
+        else:
+            sequence = self.eval_node(ref.parent)
+        return sequence, self.scalar(self.eval_node(ref.index))
+
+    def scalar(self, obj):
+        # the Python value of a basic value
+        return obj if self.unboxed else obj.value
+
+    def call(self, func, args=()):
+        # calls `func` from outside the program, with and returning Sta objects
+        if not self.unboxed or isinstance(func, StaBuiltinFunction):
+            return self.invoke(func, args)
+        args = [arg.value if type(arg) is StaObject else arg for arg in args]
+        value = self.invoke(func, args)
+        typ = returned_type(func.block)
+        if isinstance(typ, types.BasicType):
+            return StaObject(typ, value)
+        return value
+
+    def invoke(self, func, args):
+        # runs `func` in a new activation frame and returns what it returned
+        if isinstance(func, StaBuiltinFunction):
+            return call_builtin(func, args)
+        frame = [None] * func.frame_size
+        # the caller's variables that nested functions use, which this call
+        # replaces with its own
+        saved = [self.refs.get(id(ref)) for ref in func.captured]
+        for param, arg in zip(func.params, args):
+            if param.slot is None:
+                self.refs[id(param)] = StaVariable(param.name, arg)
+            else:
+                frame[param.slot] = arg
+        caller = self.frame
+        self.frame = frame
+        try:
+            return self.eval_block(func.block)
+        finally:
+            self.frame = caller
+            if saved:
+                restore(self.refs, func.captured, saved)
+
+    def eval_block(self, block):
+        # runs `block` and the blocks it branches to
+        # a branch only switches the block this loop is running, so loops in
+        # the program run at a constant stack depth
+        # returns the value of the `return` that ends it, or None if it falls
+        # off the end, so a return unwinds no further than `call`
+        while True:
+            for instr in block.instrs:
+                match instr:
+                    case ir.Branch(target):
+                        block = target
+                        break
+                    case ir.CBranch(condition, t_block, f_block):
+                        block = t_block if self.scalar(self.eval_node(condition)) else f_block
+                        break
+                    case ir.Return(value):
+                        return self.eval_node(value)
+                    case _:
+                        self.eval_node(instr)
+            else:
+                return
+
     def eval_binary(self, node):
-        logging.debug(self.eval_node(node.lhs))
-        lhs = self.eval_node(node.lhs).value
-        rhs = self.eval_node(node.rhs).value
+        if isinstance(node.typ.checked, types.SequenceType):
+            lhs = unbox(self.eval_node(node.lhs))
+            rhs = unbox(self.eval_node(node.rhs))
+            return elementwise(BINARY_OPS[node.op], node.typ.checked, lhs, rhs)
+        lhs = self.scalar(self.eval_node(node.lhs))
+        rhs = self.scalar(self.eval_node(node.rhs))
         match node.op:
             case '+':
                 value = lhs + rhs
@@ -246,10 +589,12 @@ class Interpreter:
                 value = lhs <= rhs
             case _:
                 assert False
-        return StaObject(self.eval_node(node.typ), value)
+        if self.unboxed:
+            return value
+        return StaObject(node.typ.checked, value)
 
     def eval_unary(self, node):
-        rhs = self.eval_node(node.rhs).value
+        rhs = self.scalar(self.eval_node(node.rhs))
         match node.op:
             case '-':
                 value = -rhs
@@ -257,20 +602,129 @@ class Interpreter:
                 value = not rhs
             case _:
                 assert False
-        return StaObject(self.eval_node(node.typ), value)
-
-    def call_builtin(self, func):
-        match func.sig.name:
-            case "range_constructor@builtin":
-                start = self.refs[id(func.params[0])].value.value
-                end = self.refs[id(func.params[1])].value.value
-                assert start < end, f"Range end {end} must be greater than start {start}"
-                elements = [StaObject(builtin.scope.lookup("int"), i) for i in range(start, end)]
-                raise StaFunctionReturn(
-                    StaArray(types.ArrayType(builtin.scope.lookup("int"), end-start), elements)
-                )
-            case _:
-                assert False, f"Unknown builtin function {func.sig.name}"
+        if self.unboxed:
+            return value
+        return StaObject(node.typ.checked, value)
+
+
+def total(values):
+    if type(values) is range:
+        # the sum of an arithmetic series
+        return len(values) * (values[0] + values[-1]) // 2 if values else 0
+    return sum(values)
+
+
+def mean(values):
+    assert len(values) > 0, "Mean of an empty sequence"
+    return total(values) / len(values)
+
+
+def variance(values):
+    # Welford's algorithm, which unlike the sum of squares does not lose
+    # precision when the mean is large compared to the spread
+    assert len(values) > 0, "Variance of an empty sequence"
+    avg = 0.0
+    m2 = 0.0
+    for n, x in enumerate(values, 1):
+        delta = x - avg
+        avg += delta / n
+        m2 += delta * (x - avg)
+    return m2 / len(values)
+
+
+def extremum(reduce):
+    def run(values):
+        assert len(values) > 0, f"{reduce.__name__} of an empty sequence"
+        if type(values) is range:
+            return reduce(values[0], values[-1])
+        return reduce(values)
+    return run
+
+
+# the builtin reductions, run directly on the buffer of a sequence
+REDUCTIONS = {
+    "sum@builtin": total,
+    "min@builtin": extremum(min),
+    "max@builtin": extremum(max),
+    "mean@builtin": mean,
+    "count@builtin": len,
+    "variance@builtin": variance,
+}
+
+
+def call_builtin(func, args):
+    match func.sig.name:
+        case "range_constructor@builtin":
+            start = args[0].value
+            end = args[1].value
+            assert start < end, f"Range end {end} must be greater than start {start}"
+            return StaArray(types.ArrayType(builtin.types["int"], end - start), range(start, end))
+        case "set_char@builtin":
+            string, index, char = (unbox(arg) for arg in args)
+            assert 0 <= index < len(string), f"Index {index} out of bounds"
+            return StaObject(builtin.types["str"], string[:index] + char + string[index + 1:])
+        case "join@builtin":
+            values, separator = args
+            return StaObject(builtin.types["str"], separator.value.join(values.value))
+        case "slice@builtin":
+            sequence, start, end = args
+            return slice_sequence(sequence, start.value, end.value)
+        case "push@vec":
+            vector, value = args
+            values = own_buffer(vector)
+            value = unbox(value)
+            if type(values) is array and (encode := ENCODERS.get(values.typecode)):
+                value = encode(value)
+            # Python's buffers grow geometrically, so appends are amortised O(1)
+            try:
+                values.append(value)
+            except OverflowError:
+                to_list(vector).append(value)
+        case "pop@vec":
+            values = own_buffer(args[0])
+            assert len(values) > 0, "Pop from an empty vector"
+            value = values.pop()
+            if type(values) is array and (decode := DECODERS.get(values.typecode)):
+                value = decode(value)
+            return box(args[0].typ.elem_type, value)
+        case "insert@map":
+            entries, key, value = args
+            entries.value[unbox(key)] = unbox(value)
+        case "get@map":
+            entries, key = args
+            key = unbox(key)
+            assert key in entries.value, f"Key {key!r} not in map"
+            return box(entries.typ.value_type, entries.value[key])
+        case "contains@map":
+            return StaObject(builtin.types["bool"], unbox(args[1]) in args[0].value)
+        case "remove@map":
+            args[0].value.pop(unbox(args[1]), None)
+        case "len@map":
+            return StaObject(builtin.types["int"], len(args[0].value))
+        case "keys@map":
+            typ = args[0].typ.key_type
+            return new_sequence(types.VectorType(typ), args[0].value.keys())
+        case "values@map":
+            typ = args[0].typ.value_type
+            return new_sequence(types.VectorType(typ), args[0].value.values())
+        case "len@vec":
+            return StaObject(builtin.types["int"], len(args[0].value))
+        case "reserve@vec":
+            # Python's buffers cannot be allocated ahead of their elements, so
+            # this only checks the capacity asked for
+            assert args[1].value >= 0, f"Cannot reserve {args[1].value} elements"
+        case "clear@vec":
+            del own_buffer(args[0])[:]
+        case name if (reduction := REDUCTIONS.get(name)) is not None:
+            sequence = args[0]
+            typ = builtin.reductions[name.removesuffix("@builtin")]
+            typ = sequence.typ.elem_type if typ is None else builtin.types[typ]
+            values = sequence.value
+            if type(values) is View:
+                values = values.window()
+            return StaObject(typ, reduction(values))
+        case _:
+            assert False, f"Unknown builtin function {func.sig.name}"
 
 
 def repl(interpreter=None):
@@ -300,10 +754,7 @@ def main(src_file=None):
         interpreter.eval_node(ast)
         # define entry point
         if (f := interpreter.scope.lookup("main")):
-            try:
-                interpreter.eval_node(f.block)
-            except StaFunctionReturn as res:
-                print(f"program returned with value {res.value}")
+            print(f"program returned with value {interpreter.call(f)}")
     repl(interpreter)
 
 
@@ -4,6 +4,7 @@ import logging
 
 from .lexer import TokenType as T
 from .scope import Scope
+from .trace import trace_nodes
 from . import ast_nodes as ast
 from . import type_defs as types
 from . import builtin
@@ -11,7 +12,7 @@ from . import ir_nodes as ir
 
 
 class IRNoder:
-    def __init__(self, error_handler=None):
+    def __init__(self, error_handler=None, tracer=None):
         self.scope = Scope(builtin.scope)
         self.exprs = []
         self.block = ir.Block([])
@@ -19,6 +20,12 @@ class IRNoder:
         self.blocks = {}
         self.error_handler = error_handler
         self.global_block = None
+        self.tracer = tracer
+        if tracer is not None:
+            self.make_expr = trace_nodes(tracer, "ir", self.make_expr)
+            self.make_type = trace_nodes(tracer, "ir", self.make_type)
+            self.make_stmt = trace_nodes(tracer, "ir", self.make_stmt)
+            self.make_declr = trace_nodes(tracer, "ir", self.make_declr)
 
     def error(self, msg):
         # add position info
@@ -92,6 +99,8 @@ class IRNoder:
                 )
             case ast.SequenceExpr(elements):
                 return self.make_sequence_expr(node, elements)
+            case ast.MapExpr(keys, values):
+                return ir.Map([self.make(k) for k in keys], [self.make(v) for v in values])
             case ast.GroupExpr(expr):
                 return self.make_expr(expr, load)
             case ast.CallExpr(target, args):
@@ -132,6 +141,15 @@ class IRNoder:
                     types.VectorType(elem_type),
                     elem_type
                 )
+            case ast.MapType(key_type, value_type):
+                key_type = self.make_type(key_type)
+                value_type = self.make_type(value_type)
+                return ir.MapType(
+                    f"map[{key_type.hint}, {value_type.hint}]",
+                    types.MapType(key_type, value_type),
+                    key_type,
+                    value_type
+                )
             case ast.FunctionSignature(name, return_type, params):
                 return self.make_function_signature(name, return_type, params)
             case _:
@@ -189,13 +207,8 @@ class IRNoder:
                 val = ir.Constant(Fraction(tok.lexeme.replace("//", "/")))
                 val.typ = self.scope.lookup("frac")
             case T.STRING:
-                string = []
-                for char in tok.lexeme[1:-1]:
-                    val = ir.Constant(char)
-                    val.typ = self.scope.lookup("char")
-                    string.append(val)
-                val = ir.Sequence(string)
-                val.is_const = True
+                # strings are packed into one constant, not one per char
+                val = ir.Constant(tok.lexeme[1:-1])
                 val.typ = self.scope.lookup("str")
             case T.CHAR:
                 val = ir.Constant(str(tok.lexeme[1:-1]))
@@ -227,7 +240,8 @@ class IRNoder:
     def make_call_expr(self, target, args):
         target = self.make_expr(target, load=False)
         args = [self.make(a) for a in args]
-        if isinstance(target, ir.FunctionRef):
+        if isinstance(target, ir.FunctionRef) and not target.builtin:
+            # builtins are shared by every program, so keep no arguments
             for param, arg in zip(target.params, args):
                 values = target.param_values.get(param.name, [])
                 values.append(arg)
@@ -246,6 +260,12 @@ class IRNoder:
         return ir.Call(target, args)
 
     def make_index_expr(self, target, index, load=True):
+        if isinstance(index, ast.RangeExpr):
+            # a slice is a view of the elements, rather than a single element
+            return self.make_call_expr(
+                ast.Identifier("slice@builtin"),
+                [target, index.start, index.end]
+            )
         target = self.make_expr(target, load=False)
         index = self.make_expr(index)
         # TODO: no good way to get a name for every possible target or index type
@@ -345,6 +365,9 @@ class IRNoder:
 
     def make_assignment_stmt(self, target, value):
         target = self.make_expr(target, load=False)
+        if not isinstance(target, ir.Ref):
+            self.error("Cannot assign to a slice, only to its elements")
+            return
         assert not target.is_const, "Cannot assign to const"
         value = self.make_expr(value)
         target.values.append(value)
@@ -38,6 +38,13 @@ class Vector(Sequence):
     pass
 
 
+@dataclass
+class Map(Object):
+    is_expr = True
+    keys: list[Object]
+    values: list[Object]
+
+
 @dataclass
 class StructLiteral(Object):
     is_expr = True
@@ -52,6 +59,11 @@ class Ref(Object):
     name: str
     values: list = field(default_factory=list, kw_only=True)
     members: dict = field(default_factory=dict, kw_only=True)
+    # the index in its function's activation frame, set by `resolve_slots`
+    slot: int = field(default=None, kw_only=True)
+    # whether the string variable is built by appending in a loop, set by
+    # `resolve_ropes`
+    rope: bool = field(default=False, kw_only=True)
 
 
 @dataclass
@@ -111,6 +123,12 @@ class VectorType(SequenceType):
     pass
 
 
+@dataclass
+class MapType(Type):
+    key_type: Type
+    value_type: Type
+
+
 @dataclass
 class FunctionSigRef(Type):
     params: dict[str, Type]
@@ -125,6 +143,11 @@ class FunctionRef(Ref):
     return_values: list[Object] = field(default_factory=list, init=False)
     param_values: dict[str, list[Object]] = field(default_factory=dict, init=False)
     builtin: bool = field(default=False, kw_only=True)
+    # the number of slots in an activation frame
+    frame_size: int = field(default=0, kw_only=True)
+    # the variables it declares that a nested function uses, which each call
+    # makes anew and its return restores to the caller's
+    captured: list[Ref] = field(default_factory=list, kw_only=True)
 
 
 @dataclass
@@ -295,6 +318,8 @@ class IRPrinter:
                     f"CBRANCH {self._to_string(condition)} "
                     f"{t_block_name} {f_block_name}{t_block}{f_block}"
                 )
+            case Constant(value) if isinstance(ir.typ, SequenceType):
+                string += f'"{value}"'
             case Constant(value):
                 string += str(value)
             case Sequence(elements):
@@ -305,6 +330,12 @@ class IRPrinter:
                 string += "["
                 string += ",".join(self._to_string(i, show_types=False) for i in elements)
                 string += "]"
+            case Map(keys, values):
+                entries = ",".join(
+                    f"{self._to_string(k, show_types=False)}:{self._to_string(v, show_types=False)}"
+                    for k, v in zip(keys, values)
+                )
+                string += f"map[{entries}]"
             case IndexRef():
                 string = (
                     f"{self._to_string(ir.parent, show_types=False)}"
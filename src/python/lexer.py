@@ -1,7 +1,11 @@
+from array import array
+from bisect import bisect_left
 from collections import namedtuple
+import codecs
 from dataclasses import dataclass
 from enum import Enum
 import logging
+import re
 
 
 TokenType = Enum("TokenType", [
@@ -14,7 +18,7 @@ TokenType = Enum("TokenType", [
     "LEFT_CURLY", "RIGHT_CURLY", "LEFT_SQUARE", "RIGHT_SQUARE",
     "IF", "ELSE", "WHILE", "RETURN",
     "VAR", "CONST", "FUNC", "STRUCT", "INTERFACE", "IMPL",
-    "ARR", "VEC",
+    "ARR", "VEC", "MAP",
 ])
 Token = namedtuple("Token", ["typ", "lexeme", "pos"])
 
@@ -46,6 +50,7 @@ KEYWORDS = {
     "impl": T.IMPL,
     "arr": T.ARR,
     "vec": T.VEC,
+    "map": T.MAP,
 }
 
 DIGRAPHS = {
@@ -82,6 +87,52 @@ SEMICOLON_INSERT = [
     T.RETURN,
 ]
 
+PUNCTUATION = DIGRAPHS | MONOGRAPHS
+
+# lexeme -> (token type, whether a newline after it inserts a semicolon)
+# enum members are slow to access and to hash, so `tokenise` uses these instead
+WORD_TABLE = {
+    word: (typ, typ in SEMICOLON_INSERT) for word, typ in KEYWORDS.items()
+}
+PUNCTUATION_TABLE = {
+    punct: (typ, typ in SEMICOLON_INSERT) for punct, typ in PUNCTUATION.items()
+}
+IDENTIFIER_ENTRY = (T.IDENTIFIER, True)
+
+
+def ascii_class(pred):
+    # build a regex character class from the ascii chars matching `pred`
+    return "".join(re.escape(chr(c)) for c in range(128) if pred(chr(c)))
+
+
+# Every alternative mirrors a branch of `tokenise_reference`.
+# The classes are restricted to ascii so that they agree with the str
+# predicates used there; anything else falls through to `OTHER` and is
+# handled by `scan_fallback`. `\w` and `\s` already agree with
+# `str.isalnum() or c == '_'` and `str.isspace()` for all of unicode.
+# Whitespace before a token is skipped as part of the same match.
+ALPHA = ascii_class(str.isalpha)
+DIGIT = ascii_class(str.isnumeric)
+TOKEN_PATTERN = re.compile(r"[^\S\n]*(?:" + "|".join([
+    rf"(?P<NAME>[{ALPHA}_]\w*)",
+    "(?P<PUNCT>" + "|".join(re.escape(p) for p in (*DIGRAPHS, *MONOGRAPHS)) + ")",
+    r"(?P<NEWLINE>\n)",
+    rf"(?P<NUMBER>[{DIGIT}]+(?:(?:\.|//)[{DIGIT}]+)?)",
+    r'(?P<STRING>"[^"]*")',
+    r"(?P<CHAR>'.')",
+    r"(?P<OTHER>.)",
+    r"(?P<END>\Z)",
+]) + ")", re.DOTALL)
+NAME_TAIL_PATTERN = re.compile(r"\w*")
+# the furthest any token decision looks past the end of its match
+# (e.g. `1//2` is only a rational once the digit after `//` is seen)
+LOOKAHEAD = 3
+CHUNK_SIZE = 1 << 16
+(
+    NAME_GROUP, PUNCT_GROUP, NEWLINE_GROUP, NUMBER_GROUP,
+    STRING_GROUP, CHAR_GROUP, OTHER_GROUP, END_GROUP,
+) = range(1, TOKEN_PATTERN.groups + 1)
+
 
 def get(src, index, length=1):
     if index + length <= len(src):
@@ -97,7 +148,9 @@ def error(errh, msg):
         errh(msg)
 
 
-def tokenise(src, error_handler=None):
+def tokenise_reference(src, error_handler=None):
+    # the original character-at-a-time lexer
+    # kept as the reference implementation for `tokenise` and for benchmarks
     cur = 0
     pos = Pos(1, 1)
     tokens = []
@@ -188,6 +241,299 @@ def tokenise(src, error_handler=None):
     return tokens
 
 
+def scan_number(src, cur):
+    # numbers that touch non-ascii numerics, same rules as the reference
+    i = 0
+    typ = T.INTEGER
+    while get(src, cur + i).isnumeric():
+        i += 1
+        if typ == T.INTEGER:
+            if get(src, cur + i) == '.' and get(src, cur + i + 1).isnumeric():
+                typ = T.FLOAT
+                i += 1
+            elif get(src, cur + i, 2) == '//' and get(src, cur + i + 2).isnumeric():
+                typ = T.RATIONAL
+                i += 2
+    return typ, cur + i
+
+
+def scan_fallback(src, cur, error_handler):
+    # everything the master pattern does not handle directly
+    # returns the token type (None for skipped input) and the end offset
+    char = src[cur]
+    if char.isalpha():
+        return T.IDENTIFIER, NAME_TAIL_PATTERN.match(src, cur + 1).end()
+    elif char.isnumeric():
+        return scan_number(src, cur)
+    elif char == '"':
+        error(error_handler, "Syntax error: unterminated string literal")
+        return T.STRING, len(src)
+    elif char == "'":
+        error(error_handler, "Syntax error: invalid char literal")
+        return T.CHAR, min(cur + 3, len(src))
+    error(error_handler, f"Syntax error: unexpected character '{char}'")
+    return None, cur + 1
+
+
+def lex_chunks(chunks, error_handler=None):
+    # yields tokens from an iterable of source text chunks
+    # tokens may span chunk boundaries, so a match that ends within
+    # `LOOKAHEAD` chars of the end of a partial buffer is retried once
+    # more text has arrived
+    match_token = TOKEN_PATTERN.match
+    # skips the python-level namedtuple constructor
+    new_token = tuple.__new__
+    semicolon = T.SEMICOLON
+    chunks = iter(chunks)
+    buf = ""
+    cur = 0
+    line = 1
+    col = 1
+    insert = False
+    final = False
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+        elif not chunk:
+            continue
+        else:
+            buf = buf[cur:] + chunk
+            cur = 0
+        end = len(buf)
+        limit = end if final else end - LOOKAHEAD
+        while cur < end:
+            m = match_token(buf, cur)
+            kind = m.lastindex
+            start, nxt = m.span(kind)
+            if nxt > limit:
+                break
+            if kind == NAME_GROUP:
+                lexeme = buf[start:nxt]
+                typ, insert = WORD_TABLE.get(lexeme, IDENTIFIER_ENTRY)
+            elif kind == PUNCT_GROUP:
+                lexeme = buf[start:nxt]
+                typ, insert = PUNCTUATION_TABLE[lexeme]
+            elif kind == NEWLINE_GROUP:
+                # automatic semicolon insertion
+                if insert:
+                    col += start - cur
+                    yield new_token(Token, (semicolon, ";", Pos(line, col)))
+                    insert = False
+                    # the reference lexer counts the inserted ';' on the new line
+                    col = 2
+                else:
+                    col = 1
+                line += 1
+                cur = nxt
+                continue
+            elif kind == NUMBER_GROUP:
+                if buf[nxt:nxt + LOOKAHEAD].isascii():
+                    lexeme = buf[start:nxt]
+                    if '.' in lexeme:
+                        typ = T.FLOAT
+                    elif '/' in lexeme:
+                        typ = T.RATIONAL
+                    else:
+                        typ = T.INTEGER
+                else:
+                    typ, nxt = scan_number(buf, start)
+                    if nxt > limit:
+                        break
+                    lexeme = buf[start:nxt]
+                insert = True
+            elif kind == STRING_GROUP:
+                lexeme = buf[start:nxt]
+                typ = T.STRING
+                insert = True
+            elif kind == CHAR_GROUP:
+                lexeme = buf[start:nxt]
+                typ = T.CHAR
+                insert = True
+            elif kind == END_GROUP:
+                break
+            else:
+                if not final and buf[start] == '"':
+                    # the closing quote may be in the next chunk
+                    break
+                # errors are reported once the token is accepted, not each
+                # time it is retried
+                errors = []
+                typ, nxt = scan_fallback(buf, start, errors.append)
+                if nxt > limit:
+                    break
+                for msg in errors:
+                    error(error_handler, msg)
+                if typ is None:
+                    col += nxt - cur
+                    cur = nxt
+                    continue
+                lexeme = buf[start:nxt]
+                insert = typ in SEMICOLON_INSERT
+            col += start - cur
+            yield new_token(Token, (typ, lexeme, Pos(line, col)))
+            col += nxt - start
+            cur = nxt
+
+
+def read_chunks(source, chunk_size=CHUNK_SIZE):
+    # text chunks from a str, a text or binary file object or an mmap
+    if isinstance(source, str):
+        yield source
+        return
+    decoder = None
+    while chunk := source.read(chunk_size):
+        if not isinstance(chunk, str):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder("utf-8")()
+            chunk = decoder.decode(chunk)
+        yield chunk
+    if decoder is not None:
+        yield decoder.decode(b"", final=True)
+
+
+def tokenise_iter(source, error_handler=None, chunk_size=CHUNK_SIZE):
+    # lazily tokenise a file object or mmap without reading it all up front
+    return lex_chunks(read_chunks(source, chunk_size), error_handler)
+
+
+def tokenise(src, error_handler=None):
+    return list(lex_chunks((src,), error_handler))
+
+
+# indexed by `TokenType.value`
+TOKEN_TYPES = [None, *TokenType]
+
+
+class TokenBuffer:
+    # struct-of-arrays token store, indexable like the list from `tokenise`
+    # only the type code, start offset and length are kept per token;
+    # lexemes are sliced from `src` and positions are worked out on access
+    # from the offsets of the newlines the lexer counted
+    def __init__(self, src):
+        self.src = src
+        self.types = array("B")
+        self.starts = array("I")
+        self.lengths = array("I")
+        self.newlines = array("I")
+        # 1 where a semicolon was inserted at the newline, which the
+        # reference lexer counts towards the next line's columns
+        self.shifts = bytearray()
+        # the parser checks the same token many times in a row
+        self.cached_index = None
+        self.cached_token = None
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        for i in range(len(self.types)):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.types)))]
+        if index == self.cached_index:
+            return self.cached_token
+        typ = TOKEN_TYPES[self.types[index]]
+        start = self.starts[index]
+        if typ is T.SEMICOLON:
+            # inserted semicolons start at the newline
+            lexeme = ";"
+        else:
+            lexeme = self.src[start:start + self.lengths[index]]
+        token = Token(typ, lexeme, self.pos(start))
+        self.cached_index = index
+        self.cached_token = token
+        return token
+
+    def pos(self, offset):
+        line = bisect_left(self.newlines, offset)
+        if line == 0:
+            return Pos(1, offset + 1)
+        return Pos(line + 1, offset - self.newlines[line - 1] + self.shifts[line - 1])
+
+
+def lex_into(buf, cur=0, insert=False, error_handler=None, sync=None):
+    # appends the tokens of `buf.src[cur:]` to `buf`
+    # `insert` is whether the token before `cur` allows semicolon insertion
+    # if given, `sync` is called with each token's type code, start and
+    # length, and lexing stops as soon as it returns true
+    # returns the end offset of that token, or None if the source ran out
+    src = buf.src
+    add_type = buf.types.append
+    add_start = buf.starts.append
+    add_length = buf.lengths.append
+    add_newline = buf.newlines.append
+    add_shift = buf.shifts.append
+    match_token = TOKEN_PATTERN.match
+    semicolon = T.SEMICOLON.value
+    end = len(src)
+    while cur < end:
+        m = match_token(src, cur)
+        kind = m.lastindex
+        start, nxt = m.span(kind)
+        if kind == NAME_GROUP:
+            typ, insert = WORD_TABLE.get(src[start:nxt], IDENTIFIER_ENTRY)
+        elif kind == PUNCT_GROUP:
+            typ, insert = PUNCTUATION_TABLE[src[start:nxt]]
+        elif kind == NEWLINE_GROUP:
+            add_newline(start)
+            # automatic semicolon insertion
+            if insert:
+                add_type(semicolon)
+                add_start(start)
+                add_length(1)
+                add_shift(1)
+                insert = False
+                if sync is not None and sync(semicolon, start, 1):
+                    return nxt
+            else:
+                add_shift(0)
+            cur = nxt
+            continue
+        elif kind == NUMBER_GROUP:
+            if src[nxt:nxt + LOOKAHEAD].isascii():
+                if src.find('.', start, nxt) != -1:
+                    typ = T.FLOAT
+                elif src.find('/', start, nxt) != -1:
+                    typ = T.RATIONAL
+                else:
+                    typ = T.INTEGER
+            else:
+                typ, nxt = scan_number(src, start)
+            insert = True
+        elif kind == STRING_GROUP:
+            typ = T.STRING
+            insert = True
+        elif kind == CHAR_GROUP:
+            typ = T.CHAR
+            insert = True
+        elif kind == END_GROUP:
+            break
+        else:
+            typ, nxt = scan_fallback(src, start, error_handler)
+            if typ is None:
+                cur = nxt
+                continue
+            insert = typ in SEMICOLON_INSERT
+        code = typ.value
+        add_type(code)
+        add_start(start)
+        add_length(nxt - start)
+        if sync is not None and sync(code, start, nxt - start):
+            return nxt
+        cur = nxt
+    return None
+
+
+def tokenise_compact(src, error_handler=None):
+    # same tokens as `tokenise`, stored in a `TokenBuffer`
+    buf = TokenBuffer(src)
+    lex_into(buf, error_handler=error_handler)
+    return buf
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) == 2:
@@ -195,6 +541,5 @@ if __name__ == "__main__":
     else:
         src_file = "input.txt"
     with open(src_file) as f:
-        src = f.read()
-    tokens = tokenise(src)
-    print(tokens)
+        for token in tokenise_iter(f):
+            print(token)
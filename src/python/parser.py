@@ -1,6 +1,8 @@
+from collections import deque
 import logging
 
 from .lexer import TokenType as T
+from .trace import trace_parsed
 from . import ast_nodes as ast
 
 
@@ -16,14 +18,60 @@ BINARY_OP_PRECEDENCE = {
     T.STAR: 30,
     T.SLASH: 30,
 }
+# unary operators bind tighter than any binary operator
+UNARY_PRECEDENCE = max(BINARY_OP_PRECEDENCE.values()) + 10
+# an open bracket is never reduced by an operator
+BRACKET_PRECEDENCE = -1
+
+
+# how many tokens behind the furthest one read a `TokenWindow` keeps
+# this must cover the largest `lookahead` the parser uses
+LOOKAHEAD_DEPTH = 2
+
+
+class TokenWindow:
+    # indexes a token iterator like a list, pulling tokens on demand
+    # and discarding those the parser can no longer reach
+    def __init__(self, tokens, depth=LOOKAHEAD_DEPTH):
+        self.source = iter(tokens)
+        self.buffer = deque()
+        self.start = 0
+        self.depth = depth
+
+    def __getitem__(self, index):
+        offset = index - self.start
+        assert offset >= 0, f"Token {index} is no longer in the window"
+        buffer = self.buffer
+        while offset >= len(buffer):
+            token = next(self.source, None)
+            if token is None:
+                raise IndexError(index)
+            buffer.append(token)
+        while offset > self.depth:
+            buffer.popleft()
+            self.start += 1
+            offset -= 1
+        return buffer[offset]
+
+
+def token_sequence(tokens):
+    # lists (and other sequences) are indexed directly
+    if hasattr(tokens, "__getitem__"):
+        return tokens
+    return TokenWindow(tokens)
 
 
 class Parser:
-    def __init__(self, tokens, error_handler=None):
+    def __init__(self, tokens, error_handler=None, tracer=None):
         self.cur = 0
-        self.tokens = tokens
+        self.tokens = token_sequence(tokens)
         self.root = None
         self.error_handler = error_handler
+        self.tracer = tracer
+        if tracer is not None:
+            self.parse_declaration = trace_parsed(tracer, self.peek, self.parse_declaration)
+            self.parse_statement = trace_parsed(tracer, self.peek, self.parse_statement)
+            self.parse_expression = trace_parsed(tracer, self.peek, self.parse_expression)
 
     def error(self, msg):
         # add position info
@@ -33,15 +81,18 @@ class Parser:
 
         self.error_handler(msg)
 
+    def peek(self, lookahead=0):
+        try:
+            return self.tokens[self.cur + lookahead]
+        except IndexError:
+            return None
+
     def check(self, *token_types, lookahead=0):
-        cur = self.cur + lookahead
-        if cur >= len(self.tokens):
+        tok = self.peek(lookahead)
+        if tok is None:
             return None
-        logging.debug(f"checking: {token_types}")
-        logging.debug(f"cur tok: {self.tokens[cur]}")
-        if any(self.tokens[cur].typ == t for t in token_types):
-            logging.debug("check passed")
-            return self.tokens[cur]
+        if tok.typ in token_types:
+            return tok
 
     def consume(self, *token_types):
         result = self.check(*token_types)
@@ -64,14 +115,13 @@ class Parser:
     def parse(self, tokens):
         # reinit
         self.cur = 0
-        self.tokens = tokens
+        self.tokens = token_sequence(tokens)
         self.root = self.parse_program()
         return self.root
 
     def parse_program(self):
         declarations = []
-        while self.cur < len(self.tokens):
-            logging.debug(f"declrs: {declarations}")
+        while self.peek() is not None:
             declarations.append(self.parse_declaration())
         return ast.Program(declarations)
 
@@ -186,13 +236,15 @@ class Parser:
             return self.parse_array_type()
         elif self.consume(T.VEC):
             return self.parse_vector_type()
+        elif self.consume(T.MAP):
+            return self.parse_map_type()
         self.error("Failed to parse type")
 
     def parse_array_type(self):
         length = None
         typ = None
         if self.consume(T.LEFT_SQUARE):
-            if self.check(T.IDENTIFIER, T.ARR, T.VEC):
+            if self.check(T.IDENTIFIER, T.ARR, T.VEC, T.MAP):
                 typ = self.parse_type()
                 if self.consume(T.COMMA):
                     length = self.parse_expression()
@@ -208,10 +260,18 @@ class Parser:
             self.expect(T.RIGHT_SQUARE)
         return ast.VectorType(typ)
 
+    def parse_map_type(self):
+        self.expect(T.LEFT_SQUARE)
+        key_type = self.parse_type()
+        self.expect(T.COMMA)
+        value_type = self.parse_type()
+        self.expect(T.RIGHT_SQUARE)
+        return ast.MapType(key_type, value_type)
+
     def parse_block(self):
         statements = []
         self.expect(T.LEFT_CURLY)
-        while not self.consume(T.RIGHT_CURLY) and self.cur < len(self.tokens):
+        while not self.consume(T.RIGHT_CURLY) and self.peek() is not None:
             statements.append(self.parse_statement())
         return ast.Block(statements)
 
@@ -271,136 +331,225 @@ class Parser:
         return ast.AssignmentStmt(target, value)
 
     def parse_expression(self):
-        return self.parse_binary_expr()
-
-    def parse_binary_expr(self, precedence=0):
-        logging.debug(f"current prec: {precedence}")
-        left = self.parse_unary_expr()
-        logging.debug(f"{left}")
+        # iterative precedence climbing: operators still waiting for their
+        # right operand and the open brackets of unfinished operands are
+        # kept on `ops`, so neither the length nor the nesting depth of an
+        # expression is bounded by the recursion limit
+        ops = []
+        operands = []
         while True:
-            node = self.parse_binop_increasing_prec(left, precedence)
-            if node == left:
-                break
-            left = node
-        return left
-
-    def parse_binop_increasing_prec(self, left, precedence):
-        logging.debug(f"binop: {precedence}: {left}")
-        if not (op := self.check(*BINARY_OP_PRECEDENCE.keys())):
-            return left
-        next_precedence = BINARY_OP_PRECEDENCE[op.typ]
-        if next_precedence <= precedence:
-            return left
-        else:
-            # skip the op we already found
-            self.cur += 1
-            right = self.parse_binary_expr(next_precedence)
-            return ast.BinaryExpr(op, left, right)
-
-    def parse_unary_expr(self):
-        op = self.consume(T.MINUS, T.BANG)
-        if op:
-            right = self.parse_unary_expr()
-            return ast.UnaryExpr(op, right)
-        else:
-            return self.parse_primary_expr()
-
-    def parse_primary_expr(self):
-        expr = self.parse_primary()
-        while self.check(T.DOT, T.LEFT_SQUARE, T.LEFT_BRACKET):
-            if self.check(T.DOT):
-                expr = self.parse_selector(expr)
-            elif self.check(T.LEFT_SQUARE):
-                expr = self.parse_index(expr)
-            elif self.check(T.LEFT_BRACKET):
-                expr = self.parse_call_arguments(expr)
+            tok = self.peek()
+            prefix = PREFIX_PARSERS.get(tok.typ) if tok is not None else None
+            if prefix is None:
+                self.error("Failed to parse primary")
+                operand = ast.Literal(None)
+            elif (operand := prefix(self, ops)) is None:
+                # a prefix operator or an open bracket, read what follows it
+                continue
+
+            while True:
+                tok = self.peek()
+                typ = tok.typ if tok is not None else None
+                postfix = POSTFIX_PARSERS.get(typ)
+                if postfix is not None:
+                    operand = postfix(self, ops, operand)
+                    if operand is None:
+                        break
+                    continue
+
+                precedence = BINARY_OP_PRECEDENCE.get(typ)
+                operands.append(operand)
+                if precedence is not None:
+                    self.cur += 1
+                    self.reduce(ops, operands, precedence)
+                    ops.append((precedence, tok, None))
+                    break
+
+                # the end of an expression, either the whole one or the one
+                # inside the innermost open bracket
+                self.reduce(ops, operands, 0)
+                if not ops:
+                    return operands.pop()
+                _, close, state = ops.pop()
+                operand = close(self, ops, state, operands.pop())
+                if operand is None:
+                    break
+
+    def reduce(self, ops, operands, precedence):
+        # build the nodes of the pending operators that bind at least as
+        # tightly as `precedence`, stopping at an open bracket
+        while ops and ops[-1][0] >= precedence:
+            op_precedence, op, _ = ops.pop()
+            rhs = operands.pop()
+            if op_precedence == UNARY_PRECEDENCE:
+                operands.append(ast.UnaryExpr(op, rhs))
             else:
-                assert False, "Unreachable"
-        return expr
+                operands[-1] = ast.BinaryExpr(op, operands[-1], rhs)
 
-    def parse_selector(self, target):
-        self.expect(T.DOT)
-        name = self.parse_identifier()
-        return ast.SelectorExpr(target, name)
+    # Prefix parsers: called with the token that starts an operand next,
+    # they return the operand or None after pushing onto `ops`
 
-    def parse_index(self, target):
-        self.expect(T.LEFT_SQUARE)
-        value = self.parse_expression()
-        self.expect(T.RIGHT_SQUARE)
-        return ast.IndexExpr(target, value)
+    def parse_unary_op(self, ops):
+        ops.append((UNARY_PRECEDENCE, self.peek(), None))
+        self.cur += 1
 
-    def parse_call_arguments(self, target):
-        self.expect(T.LEFT_BRACKET)
-        args = []
-        while not self.consume(T.RIGHT_BRACKET):
-            args.append(self.parse_expression())
-            self.consume(T.COMMA)
-        return ast.CallExpr(target, args)
+    def parse_literal(self, ops):
+        tok = self.peek()
+        self.cur += 1
+        return ast.Literal(tok)
 
-    def parse_primary(self):
-        if self.consume(T.LEFT_BRACKET):
-            expr = self.parse_expression()
-            self.expect(T.RIGHT_BRACKET)
-            return ast.GroupExpr(expr)
+    def parse_name(self, ops):
+        return self.parse_identifier()
 
-        elif self.consume(T.VEC):
-            self.expect(T.LEFT_SQUARE)
-            elements = self.get_sequence_elements()
-            return ast.VectorExpr(elements)
+    def open_group(self, ops):
+        self.cur += 1
+        ops.append((BRACKET_PRECEDENCE, Parser.close_group, None))
 
-        elif self.consume(T.ARR):
-            self.expect(T.LEFT_SQUARE)
-            elements = self.get_sequence_elements()
-            return ast.ArrayExpr(elements)
+    def open_vector(self, ops):
+        self.cur += 1
+        self.expect(T.LEFT_SQUARE)
+        return self.open_sequence(ops, ast.VectorExpr)
 
-        elif self.consume(T.LEFT_SQUARE):
-            # If the brackets are empty, return early
-            if self.consume(T.RIGHT_SQUARE):
-                return ast.SequenceExpr([])
+    def open_array(self, ops):
+        self.cur += 1
+        self.expect(T.LEFT_SQUARE)
+        return self.open_sequence(ops, ast.ArrayExpr)
 
-            start = self.parse_expression()
+    def open_map(self, ops):
+        self.cur += 1
+        self.expect(T.LEFT_SQUARE)
+        # If the brackets are empty, return early
+        if self.consume(T.RIGHT_SQUARE):
+            return ast.MapExpr([], [])
+        ops.append((BRACKET_PRECEDENCE, Parser.close_map_key, ([], [])))
 
-            # Handle range expr [x:y]
-            if self.consume(T.COLON):
-                end = self.parse_expression()
-                self.expect(T.RIGHT_SQUARE)
-                return ast.RangeExpr(start, end)
+    def open_sequence(self, ops, node):
+        # If the brackets are empty, return early
+        if self.consume(T.RIGHT_SQUARE):
+            return node([])
+        ops.append((BRACKET_PRECEDENCE, Parser.close_sequence, (node, [])))
 
-            # Handle array literal [x,y,z]
-            elements = self.get_sequence_elements(start)
-            return ast.SequenceExpr(elements)
+    def open_square(self, ops):
+        self.cur += 1
+        # If the brackets are empty, return early
+        if self.consume(T.RIGHT_SQUARE):
+            return ast.SequenceExpr([])
+        ops.append((BRACKET_PRECEDENCE, Parser.close_square, None))
 
-        elif self.check(T.IDENTIFIER):
-            return self.parse_identifier()
-        else:
-            value = self.consume(
-                T.INTEGER, T.FLOAT, T.RATIONAL, T.BOOLEAN, T.STRING, T.CHAR,
-            )
-            if not value:
-                self.error("Failed to parse primary")
-            return ast.Literal(value)
+    # Postfix parsers: called with the operand before the token, they
+    # return the extended operand or None after pushing onto `ops`
 
-    def get_sequence_elements(self, first_expr=None):
-        # If the brackets are empty, return an empty list
-        if self.consume(T.RIGHT_SQUARE):
-            return []
-        # Otherwise, use the first_expr if it was given
-        elif first_expr:
-            exprs = [first_expr]
-        else:
-            exprs = [self.parse_expression()]
+    def parse_selector(self, ops, target):
+        self.expect(T.DOT)
+        name = self.parse_identifier()
+        return ast.SelectorExpr(target, name)
 
-        while not self.consume(T.RIGHT_SQUARE):
-            self.expect(T.COMMA)
-            exprs.append(self.parse_expression())
+    def open_index(self, ops, target):
+        self.expect(T.LEFT_SQUARE)
+        ops.append((BRACKET_PRECEDENCE, Parser.close_index, target))
 
-        return exprs
+    def open_call(self, ops, target):
+        self.expect(T.LEFT_BRACKET)
+        if self.consume(T.RIGHT_BRACKET):
+            return ast.CallExpr(target, [])
+        ops.append((BRACKET_PRECEDENCE, Parser.close_call, (target, [])))
+
+    # Closers: called with the state pushed by the opener and the expression
+    # that ended inside the brackets, they return the finished operand or
+    # None after pushing onto `ops` to read another expression
+
+    def close_group(self, ops, state, expr):
+        self.expect(T.RIGHT_BRACKET)
+        return ast.GroupExpr(expr)
+
+    def close_index(self, ops, target, expr):
+        # Handle slice expr a[x:y], reusing the range form for the index
+        if self.consume(T.COLON):
+            ops.append((BRACKET_PRECEDENCE, Parser.close_slice, (target, expr)))
+            return None
+        self.expect(T.RIGHT_SQUARE)
+        return ast.IndexExpr(target, expr)
+
+    def close_slice(self, ops, state, end):
+        target, start = state
+        self.expect(T.RIGHT_SQUARE)
+        return ast.IndexExpr(target, ast.RangeExpr(start, end))
+
+    def close_call(self, ops, state, expr):
+        target, args = state
+        args.append(expr)
+        self.consume(T.COMMA)
+        if self.consume(T.RIGHT_BRACKET):
+            return ast.CallExpr(target, args)
+        if self.peek() is None:
+            self.expect(T.RIGHT_BRACKET)
+            return ast.CallExpr(target, args)
+        ops.append((BRACKET_PRECEDENCE, Parser.close_call, state))
+
+    def close_square(self, ops, state, start):
+        # Handle range expr [x:y]
+        if self.consume(T.COLON):
+            ops.append((BRACKET_PRECEDENCE, Parser.close_range, start))
+            return None
+        # Handle array literal [x,y,z]
+        return self.close_sequence(ops, (ast.SequenceExpr, []), start)
+
+    def close_range(self, ops, start, end):
+        self.expect(T.RIGHT_SQUARE)
+        return ast.RangeExpr(start, end)
+
+    def close_sequence(self, ops, state, expr):
+        node, elements = state
+        elements.append(expr)
+        if self.consume(T.RIGHT_SQUARE) or not self.expect(T.COMMA):
+            return node(elements)
+        ops.append((BRACKET_PRECEDENCE, Parser.close_sequence, state))
+
+    def close_map_key(self, ops, state, key):
+        # Handle map literal map[k: v, ...]
+        state[0].append(key)
+        self.expect(T.COLON)
+        ops.append((BRACKET_PRECEDENCE, Parser.close_map_value, state))
+
+    def close_map_value(self, ops, state, value):
+        keys, values = state
+        values.append(value)
+        if self.consume(T.RIGHT_SQUARE) or not self.expect(T.COMMA):
+            return ast.MapExpr(keys, values)
+        ops.append((BRACKET_PRECEDENCE, Parser.close_map_key, state))
 
     def parse_identifier(self):
         tok = self.expect(T.IDENTIFIER)
         return ast.Identifier(tok.lexeme)
 
 
+# how an operand is parsed, given the token it starts with
+PREFIX_PARSERS = {
+    T.MINUS: Parser.parse_unary_op,
+    T.BANG: Parser.parse_unary_op,
+    T.LEFT_BRACKET: Parser.open_group,
+    T.VEC: Parser.open_vector,
+    T.ARR: Parser.open_array,
+    T.MAP: Parser.open_map,
+    T.LEFT_SQUARE: Parser.open_square,
+    T.IDENTIFIER: Parser.parse_name,
+    T.INTEGER: Parser.parse_literal,
+    T.FLOAT: Parser.parse_literal,
+    T.RATIONAL: Parser.parse_literal,
+    T.BOOLEAN: Parser.parse_literal,
+    T.STRING: Parser.parse_literal,
+    T.CHAR: Parser.parse_literal,
+}
+
+# how an operand is extended, given the token after it
+# binary operators are handled through `BINARY_OP_PRECEDENCE`
+POSTFIX_PARSERS = {
+    T.DOT: Parser.parse_selector,
+    T.LEFT_SQUARE: Parser.open_index,
+    T.LEFT_BRACKET: Parser.open_call,
+}
+
+
 def parse(tokens):
     # helper that hides the class behaviour
     return Parser(tokens).parse_program()
@@ -432,7 +581,7 @@ def repr_ast(ast):
 
 if __name__ == "__main__":
     import sys
-    from .lexer import tokenise
+    from .lexer import tokenise_iter
 
     logging.basicConfig(format="%(levelname)s: %(message)s")
     logging.getLogger().setLevel(logging.DEBUG)
@@ -441,8 +590,5 @@ if __name__ == "__main__":
     else:
         src_file = "input.txt"
     with open(src_file) as f:
-        src = f.read()
-    tokens = tokenise(src)
-    print(tokens)
-    tree = parse(tokens)
+        tree = parse(tokenise_iter(f))
     print(tree)
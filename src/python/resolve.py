@@ -0,0 +1,207 @@
+from . import ir_nodes as ir
+from . import type_defs as types
+
+
+class SlotResolver:
+    # gives every variable local to a function a slot in the function's
+    # activation frame, and each function the size of its frame
+    # globals, and locals that a nested function also uses, get no slot, and
+    # the latter are listed as captured by the function declaring them
+    def __init__(self):
+        # id(ref) -> (ref, the function declaring it or None if global)
+        self.declared = {}
+        # id(ref) -> the ids of the functions using it
+        self.used = {}
+        self.functions = []
+        self.seen = set()
+
+    def resolve(self, program):
+        self.visit_blocks(program.block, None)
+        for func in self.functions:
+            func.captured = []
+            slot = 0
+            for ref in func.params:
+                slot = self.assign(ref, func, slot)
+            func.frame_size = slot
+        for ref, func in self.declared.values():
+            if func is not None and ref.slot is None:
+                func.frame_size = self.assign(ref, func, func.frame_size)
+                if ref.slot is None:
+                    func.captured.append(ref)
+
+    def assign(self, ref, func, slot):
+        if self.used.get(id(ref), set()) <= {id(func)}:
+            ref.slot = slot
+            return slot + 1
+        ref.slot = None
+        return slot
+
+    def visit_function(self, func):
+        if id(func) in self.seen or func.block is None:
+            return
+        self.seen.add(id(func))
+        self.functions.append(func)
+        for ref in func.params:
+            ref.slot = None
+            self.declared[id(ref)] = (ref, func)
+        self.visit_blocks(func.block, func)
+
+    def visit_blocks(self, block, func):
+        # every block reachable from `block` through its branches
+        queue = [block]
+        while queue:
+            block = queue.pop()
+            if id(block) in self.seen:
+                continue
+            self.seen.add(id(block))
+            for instr in block.instrs:
+                match instr:
+                    case ir.Branch(target):
+                        queue.append(target)
+                    case ir.CBranch(condition, t_block, f_block):
+                        self.visit(condition, func)
+                        queue.extend((t_block, f_block))
+                    case _:
+                        self.visit(instr, func)
+
+    def visit(self, node, func):
+        match node:
+            case ir.Declare(ref):
+                match ref:
+                    case ir.FunctionRef():
+                        self.visit_function(ref)
+                    case ir.ConstRef(value=value):
+                        self.declare(ref, func)
+                        self.visit(value, func)
+                    case ir.Type():
+                        pass
+                    case ir.Ref():
+                        self.declare(ref, func)
+            case ir.DeclareMethods(_, block):
+                self.visit_blocks(block, func)
+            case ir.Assign(target, value):
+                self.use(target, func)
+                self.visit(value, func)
+            case ir.Load(ref):
+                self.use(ref, func)
+            case ir.Call(target, args):
+                self.use(target, func)
+                for arg in args:
+                    self.visit(arg, func)
+            case ir.Return(value):
+                self.visit(value, func)
+            case ir.Binary(_, lhs, rhs):
+                self.visit(lhs, func)
+                self.visit(rhs, func)
+            case ir.Unary(_, rhs):
+                self.visit(rhs, func)
+            case ir.Sequence(elements):
+                for element in elements:
+                    self.visit(element, func)
+            case ir.Map(keys, values):
+                for element in keys + values:
+                    self.visit(element, func)
+            case ir.StructLiteral(fields):
+                for value in fields.values():
+                    self.visit(value, func)
+            case ir.Ref():
+                self.use(node, func)
+
+    def declare(self, ref, func):
+        ref.slot = None
+        self.declared[id(ref)] = (ref, func)
+
+    def use(self, ref, func):
+        match ref:
+            case ir.IndexRef(parent=parent, index=index):
+                self.use(parent, func)
+                self.visit(index, func)
+            case ir.FieldRef(parent=parent):
+                self.use(parent, func)
+            case ir.FunctionRef() | ir.Type():
+                pass
+            case ir.Ref():
+                self.used.setdefault(id(ref), set()).add(id(func))
+            case _:
+                # a sequence or call being indexed
+                self.visit(ref, func)
+
+
+def resolve_slots(program):
+    SlotResolver().resolve(program)
+
+
+def successors(block):
+    # the blocks `block` may branch to, the true branch of a conditional first
+    for instr in block.instrs:
+        match instr:
+            case ir.Branch(target):
+                return [target]
+            case ir.CBranch(_, t_block, f_block):
+                return [t_block, f_block]
+            case ir.Return():
+                return []
+    return []
+
+
+def layout(entry):
+    # the blocks reachable from `entry`, ordered so that a block is usually
+    # followed by the block it branches to, and a conditional by its true branch
+    order = []
+    seen = set()
+    stack = [entry]
+    while stack:
+        block = stack.pop()
+        if id(block) in seen:
+            continue
+        seen.add(id(block))
+        order.append(block)
+        stack.extend(reversed(successors(block)))
+    return order
+
+
+def in_loop(block):
+    # whether `block` can branch back to itself
+    seen = set()
+    stack = successors(block)
+    while stack:
+        target = stack.pop()
+        if target is block:
+            return True
+        if id(target) not in seen:
+            seen.add(id(target))
+            stack.extend(successors(target))
+    return False
+
+
+def is_append(ref, value):
+    # whether assigning `value` to `ref` appends to the string it holds
+    return (
+        isinstance(value, ir.Binary) and value.op == "+"
+        and isinstance(value.lhs, ir.Load) and value.lhs.ref is ref
+        and not isinstance(ref, (ir.FieldRef, ir.IndexRef))
+        and getattr(ref.typ.checked, "kind", None) == types.BasicTypeKind.STR
+    )
+
+
+def resolve_ropes(program):
+    # marks the string variables appended to in a loop, which backends hold
+    # as a `Rope` of the appended parts until the variable is read, so
+    # building a string takes linear rather than quadratic time
+    bodies = [program.block]
+    seen = set()
+    while bodies:
+        for block in layout(bodies.pop()):
+            looped = None
+            for instr in block.instrs:
+                match instr:
+                    case ir.Declare(ir.FunctionRef(block=body)) if body is not None:
+                        if id(body) not in seen:
+                            seen.add(id(body))
+                            bodies.append(body)
+                    case ir.DeclareMethods(_, methods):
+                        bodies.append(methods)
+                    case ir.Assign(ref, value) if is_append(ref, value):
+                        if looped is None:
+                            looped = in_loop(block)
+                        ref.rope = ref.rope or looped
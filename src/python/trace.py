@@ -0,0 +1,63 @@
+from collections import Counter, deque, namedtuple
+import sys
+
+
+# Structured tracing for the translation pipeline
+# every phase takes an optional `tracer`: a callable that is given a
+# `TraceEvent` for each node the phase handles
+# the phase's dispatch methods are only wrapped when a tracer is given, so
+# without one tracing costs nothing: no test, no event, no formatting
+
+
+# phase: "parse", "ir", "typecheck", "interpret" or "compile"
+# kind: the name of the node's class
+# pos: the source position, or None where the phase does not know it
+TraceEvent = namedtuple("TraceEvent", ["phase", "kind", "pos"])
+
+
+class TraceRecorder:
+    # keeps the most recent events, or all of them if `maxlen` is None
+    def __init__(self, maxlen=None):
+        self.events = deque(maxlen=maxlen)
+
+    def __call__(self, event):
+        self.events.append(event)
+
+
+class TraceCounter:
+    # counts the events seen for each phase and node kind
+    def __init__(self):
+        self.counts = Counter()
+
+    def __call__(self, event):
+        self.counts[event.phase, event.kind] += 1
+
+
+class TraceWriter:
+    # writes one tab separated line per event
+    def __init__(self, stream=None):
+        self.stream = sys.stderr if stream is None else stream
+
+    def __call__(self, event):
+        phase, kind, pos = event
+        pos = "-" if pos is None else f"{pos.line}:{pos.col}"
+        self.stream.write(f"{phase}\t{kind}\t{pos}\n")
+
+
+def trace_nodes(tracer, phase, method):
+    # wraps a method that is given a node, emitting an event per call
+    def traced(node, *args, **kwargs):
+        tracer(TraceEvent(phase, type(node).__name__, getattr(node, "pos", None)))
+        return method(node, *args, **kwargs)
+    return traced
+
+
+def trace_parsed(tracer, peek, method):
+    # wraps a parsing method, emitting an event for the node it returns
+    # at the position of the token it started from
+    def traced(*args, **kwargs):
+        tok = peek()
+        node = method(*args, **kwargs)
+        tracer(TraceEvent("parse", type(node).__name__, None if tok is None else tok.pos))
+        return node
+    return traced
@@ -0,0 +1,358 @@
+from dataclasses import dataclass
+import math
+import re
+
+from .interpreter import (
+    StaObject, StaVariable, StaStruct, StaBuiltinFunction, call_builtin,
+    BINARY_OPS, is_boxed, box, unbox, new_sequence, new_map, get_element, set_element,
+    elementwise, concat, flatten,
+)
+from .resolve import resolve_slots, resolve_ropes, layout, is_append
+from . import ir_nodes as ir
+from . import type_defs as types
+
+
+# A backend lowering checked programs to the source of a Python module, which
+# CPython then compiles and runs
+# each function becomes a Python function whose control flow is a `while`
+# loop dispatching on the number of the block to run; locals with a slot are
+# Python locals, and every other variable is a global of the module
+# as in the VM, basic values are unboxed, and boxed only where they are stored
+# into a struct, or leave the module
+
+
+# the names the generated source uses besides its own
+RUNTIME = {
+    "StaObject": StaObject,
+    "StaVariable": StaVariable,
+    "StaStruct": StaStruct,
+    "call_builtin": call_builtin,
+    "new_sequence": new_sequence,
+    "new_map": new_map,
+    "get_element": get_element,
+    "set_element": set_element,
+    "elementwise": elementwise,
+    "concat": concat,
+    "flatten": flatten,
+}
+
+UNARY_OPS = {
+    "-": "-",
+    "!": "not ",
+}
+
+
+def identifier(name):
+    return re.sub(r"\W", "_", name)
+
+
+@dataclass
+class PyFunction:
+    # the name of a function in the generated module
+    name: str
+    ret_type: types.Type = None
+
+
+class Transpiler:
+    def __init__(self, entry_name="main"):
+        # objects the source refers to by name, as k0, k1...
+        self.consts = []
+        self.const_names = {}
+        # id(FunctionRef) -> PyFunction
+        self.functions = {}
+        # id(Ref) -> the global holding a variable without a slot
+        self.variables = {}
+        self.pending = []
+        self.entry_name = entry_name
+        self.entry = None
+        # the namespace of the module once it has run
+        self.module = None
+
+    def transpile(self, program):
+        # returns the source of a module whose `program` function runs the
+        # program's top level declarations
+        resolve_slots(program)
+        resolve_ropes(program)
+        top = PyFunction("program")
+        functions = [FunctionTranspiler(self, top, []).transpile(program.block)]
+        while self.pending:
+            func, ref = self.pending.pop(0)
+            transpiler = FunctionTranspiler(self, func, ref.params, ref.captured)
+            functions.append(transpiler.transpile(ref.block))
+        return "\n\n".join(functions)
+
+    def load(self, program, cache=None):
+        # transpiles, compiles and runs the program's top level declarations
+        # the code object is looked up in, or stored to, the `IRCache` given
+        source = self.transpile(program)
+        code = None
+        if cache is not None:
+            key = cache.key(source)
+            code = cache.load_code(key)
+        if code is None:
+            code = compile(source, "<starling>", "exec")
+            if cache is not None:
+                cache.store_code(key, code)
+        self.module = self.namespace()
+        exec(code, self.module)
+        self.module["program"]()
+
+    def namespace(self):
+        namespace = dict(RUNTIME)
+        # the globals a call saves before it has assigned them
+        for name in self.variables.values():
+            namespace[name] = None
+        for i, obj in enumerate(self.consts):
+            namespace[f"k{i}"] = obj
+        return namespace
+
+    def call(self, func, args=()):
+        # calls a function from outside the module, with Sta objects
+        if isinstance(func, StaBuiltinFunction):
+            return call_builtin(func, args)
+        return box(func.ret_type, self.module[func.name](*[unbox(arg) for arg in args]))
+
+    def const(self, obj):
+        # the name of a constant that has no Python literal
+        if (name := self.const_names.get(id(obj))) is None:
+            name = self.const_names[id(obj)] = f"k{len(self.consts)}"
+            self.consts.append(obj)
+        return name
+
+    def function(self, ref):
+        if (func := self.functions.get(id(ref))) is not None:
+            return func
+        if ref.builtin:
+            func = StaBuiltinFunction(ref.typ, ref.params, ref.block)
+        else:
+            func = PyFunction(f"f{len(self.functions)}_{identifier(ref.name)}")
+            self.pending.append((func, ref))
+            if ref.typ.name == self.entry_name:
+                self.entry = func
+        self.functions[id(ref)] = func
+        return func
+
+    def variable(self, ref):
+        if (name := self.variables.get(id(ref))) is None:
+            name = self.variables[id(ref)] = f"v{len(self.variables)}_{identifier(ref.name)}"
+        return name
+
+
+class FunctionTranspiler:
+    def __init__(self, transpiler, func, params, captured=()):
+        self.transpiler = transpiler
+        self.func = func
+        self.params = params
+        self.captured = captured
+        self.lines = []
+        # the globals the function assigns
+        self.globals = []
+        # id(Block) -> its number
+        self.numbers = {}
+
+    def transpile(self, block):
+        blocks = layout(block)
+        self.numbers = {id(block): i for i, block in enumerate(blocks)}
+        if len(blocks) == 1:
+            self.transpile_block(blocks[0], 1)
+        else:
+            self.emit(1, "block = 0")
+            self.emit(1, "while True:")
+            for i, block in enumerate(blocks):
+                if i == 0:
+                    self.emit(2, "if block == 0:")
+                elif i < len(blocks) - 1:
+                    self.emit(2, f"elif block == {i}:")
+                else:
+                    self.emit(2, "else:")
+                self.transpile_block(block, 3)
+
+        params = []
+        prologue = []
+        for i, param in enumerate(self.params):
+            if param.slot is not None:
+                params.append(self.local(param))
+            else:
+                params.append(f"a{i}")
+                prologue.append(f"    {self.store(param)} = a{i}")
+        head = [f"def {self.func.name}({', '.join(params)}):"]
+        body = prologue + self.lines
+        if self.captured:
+            # the globals nested functions use are the caller's again once
+            # this call returns
+            saved = ", ".join(self.store(ref) for ref in self.captured)
+            body = [
+                f"    saved = {saved},", "    try:", *("    " + line for line in body),
+                "    finally:", f"        {saved}, = saved",
+            ]
+        if self.globals:
+            head.append(f"    global {', '.join(dict.fromkeys(self.globals))}")
+        return "\n".join(head + body) + "\n"
+
+    def emit(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    def transpile_block(self, block, depth):
+        for instr in block.instrs:
+            match instr:
+                case ir.Branch(target):
+                    self.emit(depth, f"block = {self.numbers[id(target)]}")
+                    return
+                case ir.CBranch(condition, t_block, f_block):
+                    self.emit(depth, f"if {self.expr(condition)}:")
+                    self.emit(depth + 1, f"block = {self.numbers[id(t_block)]}")
+                    self.emit(depth, "else:")
+                    self.emit(depth + 1, f"block = {self.numbers[id(f_block)]}")
+                    return
+                case ir.Return(value):
+                    if value is not None and self.func.ret_type is None:
+                        self.func.ret_type = value.typ.checked
+                    self.emit(depth, f"return {self.expr(value)}")
+                    return
+                case _:
+                    self.transpile_instr(instr, depth)
+        self.emit(depth, "return None")
+
+    def transpile_instr(self, node, depth):
+        match node:
+            case ir.Declare(ref):
+                self.transpile_declare(ref, depth)
+            case ir.DeclareMethods(_, block):
+                for instr in block.instrs:
+                    self.transpile_instr(instr, depth)
+            case ir.Assign(ref, value):
+                match ref:
+                    case ir.FieldRef():
+                        self.emit(depth, f"{self.field(ref)}.value = {self.boxed(value)}")
+                    case ir.IndexRef():
+                        sequence, i = self.element(ref)
+                        self.emit(depth, f"set_element({sequence}, {i}, {self.expr(value)})")
+                    case ir.Ref() if self.rope(ref) and is_append(ref, value):
+                        string, tail = self.load(ref, flat=False), self.expr(value.rhs)
+                        self.emit(depth, f"{self.store(ref)} = concat({string}, {tail})")
+                    case ir.Ref():
+                        self.emit(depth, f"{self.store(ref)} = {self.expr(value)}")
+            case ir.Load() | ir.Call() | ir.Binary() | ir.Unary():
+                self.emit(depth, self.expr(node))
+            case _:
+                assert False, f"Unexpected instruction {type(node)}"
+
+    def transpile_declare(self, ref, depth):
+        match ref:
+            case ir.FunctionRef():
+                self.transpiler.function(ref)
+            case ir.Type():
+                pass
+            case ir.ConstRef(value=value):
+                self.emit(depth, f"{self.store(ref)} = {self.expr(value)}")
+            case ir.Ref(slot=None):
+                # a new variable, as each run of a declaration makes one
+                self.emit(depth, f"{self.store(ref)} = None")
+
+    def local(self, ref):
+        return f"{identifier(ref.name)}_{ref.slot}"
+
+    def store(self, ref):
+        # the Python name to assign to the variable `ref`
+        if ref.slot is not None:
+            return self.local(ref)
+        name = self.transpiler.variable(ref)
+        self.globals.append(name)
+        return name
+
+    def field(self, ref):
+        # an expression for the `StaVariable` holding a field
+        return f"{self.load(ref.parent)}.value[{ref.name!r}]"
+
+    def element(self, ref):
+        # expressions for the sequence and index of an element
+        if isinstance(ref.parent, ir.Ref):
+            sequence = self.load(ref.parent)
+        else:
+            sequence = self.expr(ref.parent)
+        return sequence, self.expr(ref.index)
+
+    def rope(self, ref):
+        # CPython already appends in place to a `str` only a local refers to,
+        # so only globals are held as ropes
+        return ref.rope and ref.slot is None
+
+    def load(self, ref, flat=True):
+        if self.rope(ref) and flat:
+            return f"flatten({self.load(ref, flat=False)})"
+        match ref:
+            case ir.FieldRef():
+                value = f"{self.field(ref)}.value"
+                return value if is_boxed(ref.typ.checked) else value + ".value"
+            case ir.IndexRef():
+                return f"get_element({', '.join(self.element(ref))})"
+            case ir.Ref(slot=None):
+                return self.transpiler.variable(ref)
+            case ir.Ref():
+                return self.local(ref)
+
+    def boxed(self, node):
+        value = self.expr(node)
+        if is_boxed(node.typ.checked):
+            return value
+        return f"StaObject({self.transpiler.const(node.typ.checked)}, {value})"
+
+    def expr(self, node):
+        match node:
+            case None:
+                return "None"
+            case ir.Constant(value):
+                return self.literal(value)
+            case ir.Load(ref):
+                return self.load(ref)
+            case ir.Call(target, args):
+                return self.call(node, target, args)
+            case ir.Binary(op, lhs, rhs) if isinstance(node.typ.checked, types.SequenceType):
+                op = self.transpiler.const(BINARY_OPS[op])
+                typ = self.transpiler.const(node.typ.checked)
+                return f"elementwise({op}, {typ}, {self.expr(lhs)}, {self.expr(rhs)})"
+            case ir.Binary(op, lhs, rhs):
+                return f"({self.expr(lhs)} {op} {self.expr(rhs)})"
+            case ir.Unary(op, rhs):
+                return f"({UNARY_OPS[op]}{self.expr(rhs)})"
+            case ir.Sequence(elements):
+                elements = ", ".join(self.expr(element) for element in elements)
+                return f"new_sequence({self.transpiler.const(node.typ.checked)}, [{elements}])"
+            case ir.Map(keys, values):
+                keys = ", ".join(self.expr(key) for key in keys)
+                values = ", ".join(self.expr(value) for value in values)
+                return f"new_map({self.transpiler.const(node.typ.checked)}, [{keys}], [{values}])"
+            case ir.StructLiteral(fields):
+                typ = node.typ.checked
+                fields = ", ".join(
+                    f"{name!r}: StaVariable({name!r}, {self.boxed(value)})"
+                    for name, value in fields.items()
+                )
+                return f"StaStruct({self.transpiler.const(typ)}, {{{fields}}})"
+            case ir.Ref():
+                return self.load(node)
+            case _:
+                assert False, f"Unexpected expression {type(node)}"
+
+    def literal(self, value):
+        if type(value) in (int, bool, str) or (
+            type(value) is float and math.isfinite(value)
+        ):
+            return repr(value)
+        return self.transpiler.const(value)
+
+    def call(self, node, target, args):
+        match target:
+            case ir.FunctionRef():
+                func = self.transpiler.function(target)
+            case ir.FieldRef(method=method) if method is not None:
+                func = self.transpiler.function(method)
+            case _:
+                assert False, f"Unexpected call target {type(target)}"
+        if isinstance(func, StaBuiltinFunction):
+            args = ", ".join(self.boxed(arg) for arg in args)
+            value = f"call_builtin({self.transpiler.const(func)}, [{args}])"
+            if node.typ is None or is_boxed(node.typ.checked):
+                return value
+            return value + ".value"
+        return f"{func.name}({', '.join(self.expr(arg) for arg in args)})"
@@ -1,5 +1,6 @@
 import logging
 
+from .trace import trace_nodes
 from . import ir_nodes as ir
 from . import builtin
 from . import type_defs as types
@@ -20,6 +21,22 @@ binary_op_preds = {
 }
 
 
+def is_elementwise(typ):
+    # whether operators on values of the ir type apply to each element
+    return isinstance(getattr(typ, "checked", None), types.SequenceType)
+
+
+def is_str(typ):
+    return typ == builtin.types["str"]
+
+
+def returns_nothing(node):
+    # whether `node` is a call to a function known not to return a value,
+    # rather than one whose return type is not known yet
+    return isinstance(node, ir.Call) and node.target.progress == progress.COMPLETED \
+        and node.target.typ.return_type is None
+
+
 def is_comparison_op(op):
     return op in (
         '>', '<', '>=', '<=', '==', '!=',
@@ -31,9 +48,12 @@ class DeferChecking(Exception):
 
 
 class TypeChecker:
-    def __init__(self, error_handler=None):
+    def __init__(self, error_handler=None, tracer=None):
         self.error_handler = error_handler
         self.deferred = []
+        self.tracer = tracer
+        if tracer is not None:
+            self.check = trace_nodes(tracer, "typecheck", self.check)
 
     def error(self, msg):
         if self.error_handler is None:
@@ -56,6 +76,12 @@ class TypeChecker:
                 if typ.elem_type is not None:
                     typ.checked.elem_type = typ.elem_type.checked
                 return typ.checked
+            case ir.MapType():
+                if typ.key_type is not None:
+                    typ.checked.key_type = typ.key_type.checked
+                if typ.value_type is not None:
+                    typ.checked.value_type = typ.value_type.checked
+                return typ.checked
             case ir.Type():
                 return typ.checked
             case _:
@@ -66,6 +92,8 @@ class TypeChecker:
             target = new
         if new is None:
             return target
+        assert isinstance(target, ir.MapType) == isinstance(new, ir.MapType), \
+            f"Cannot assign object of type {new.checked} to ref of type {target.checked}"
         match target:
             case ir.FunctionSigRef():
                 typ = self.update_types(target.return_type, new.return_type)
@@ -105,6 +133,18 @@ class TypeChecker:
                     target = new
                 else:
                     target.elem_type = new.elem_type
+            case ir.MapType():
+                # the types of the keys and values are only inferred if unknown
+                pairs = ((target.key_type, new.key_type), (target.value_type, new.value_type))
+                for old, typ in pairs:
+                    assert old is None or typ is None or old.checked == typ.checked, \
+                        f"Cannot assign object of type {new.checked} " \
+                        f"to ref of type {target.checked}"
+                typ = self.update_types(target.key_type, new.key_type)
+                new.key_type = target.key_type = typ
+                typ = self.update_types(target.value_type, new.value_type)
+                new.value_type = target.value_type = typ
+                new.checked = self.get_core_type(new)
             case ir.Type():
                 assert target == new, f"Mismatching types {target} and {new}"
             case _:
@@ -125,7 +165,6 @@ class TypeChecker:
                     self.check(block)
                     already_deferred = []
                     while self.deferred:
-                        logging.debug(self.deferred)
                         node = self.deferred.pop(0)
                         if node in already_deferred:
                             continue
@@ -153,11 +192,11 @@ class TypeChecker:
                 logging.info("raise DeferChecking to propagate")
                 raise DeferChecking("Propagating expr defer")
         else:
-            if node.is_expr and node.typ is None:
+            if node.is_expr and node.typ is None and not returns_nothing(node):
                 node.progress = progress.EMPTY
             if node.progress != progress.COMPLETED:
                 node.progress = progress.EMPTY
-                logging.info(f"raise DeferChecking for incomplete type for {type(node)}")
+                logging.info("raise DeferChecking for incomplete type for %s", type(node))
                 raise DeferChecking(f"Incomplete type checking for {type(node)} node")
 
     def check_type(self, node):
@@ -187,7 +226,7 @@ class TypeChecker:
         for value in node.values:
             self.check(value)
             node.typ = self.update_types(node.typ, value.typ)
-            if isinstance(value.typ, ir.SequenceType):
+            if isinstance(value.typ, (ir.SequenceType, ir.MapType)):
                 value.typ = node.typ
         match node:
             case ir.FunctionRef():
@@ -211,7 +250,14 @@ class TypeChecker:
                 if isinstance(node.parent.typ, ir.StructRef):
                     field = node.parent.typ.fields.get(node.name)
                 method = node.parent.typ.methods.get(node.name)
-                if method:
+                if not method and isinstance(node.parent.typ.checked, types.VectorType):
+                    method = builtin.vector_type.methods.get(node.name)
+                elif not method and isinstance(node.parent.typ.checked, types.MapType):
+                    method = builtin.map_type.methods.get(node.name)
+                if method and method.builtin:
+                    node.method = method
+                    method = self.builtin_method_sig(node)
+                elif method:
                     node.method = method
                     for name, value in zip(method.typ.params, node.param_values):
                         values = method.param_values.get(name, [])
@@ -263,9 +309,18 @@ class TypeChecker:
             case ir.Assign(ref, value):
                 self.check(ref)
                 self.check(value)
+                if isinstance(ref, ir.IndexRef) and types.is_string(ref.parent.typ.checked):
+                    self.check_set_char(node)
             case ir.Load(ref):
                 self.check(ref)
                 node.typ = ref.typ
+            case ir.Call(ir.FunctionRef(builtin=True, name=name)) \
+                    if name in builtin.reductions:
+                self.check_reduction(node)
+            case ir.Call(ir.FunctionRef(builtin=True, name="join")):
+                self.check_join(node)
+            case ir.Call(ir.FunctionRef(builtin=True, name="slice@builtin")):
+                self.check_slice(node)
             case ir.Call(ref, args):
                 self.check(ref)
                 assert len(args) == len(ref.typ.params)
@@ -291,10 +346,105 @@ class TypeChecker:
                 assert False, f"Unexpected instruction {node}"
         node.progress = progress.COMPLETED
 
+    def check_reduction(self, node):
+        # builtins reducing a sequence take any element type, so their calls
+        # are checked here rather than against the signature
+        self.check(node.target)
+        if len(node.args) != 1:
+            self.error(f"{node.target.name} takes one sequence")
+        arg = node.args[0]
+        self.check(arg)
+        if not is_elementwise(arg.typ):
+            self.error(f"{node.target.name} of {arg.typ}, which is not a sequence")
+        elif node.target.name != "count" and not types.is_numeric(arg.typ.checked.elem_type):
+            self.error(f"{node.target.name} of {arg.typ}, whose elements are not numbers")
+        elif (returned := builtin.reductions[node.target.name]) is not None:
+            node.typ = builtin.scope.lookup(returned)
+        else:
+            node.typ = arg.typ.elem_type
+
+    def check_join(self, node):
+        # join takes arrays and vectors alike, so is checked here rather than
+        # against the signature
+        self.check(node.target)
+        if len(node.args) != 2:
+            self.error("join takes a sequence of strings and a separator")
+        values, separator = node.args
+        self.check(values)
+        self.check(separator)
+        if not is_elementwise(values.typ) or not is_str(values.typ.checked.elem_type):
+            self.error(f"join of {values.typ}, which is not a sequence of strings")
+        elif not is_str(separator.typ.checked):
+            self.error(f"join with a separator of {separator.typ}, which is not a string")
+        node.typ = builtin.scope.lookup("str")
+
+    def builtin_method_sig(self, node):
+        # the signature of a builtin method of a vector or map, of the types
+        # of its elements, which are only known at each call
+        typ = node.parent.typ
+        if isinstance(typ.checked, types.MapType):
+            args, returned = builtin.map_methods[node.name]
+            elements = {"key": typ.key_type, "value": typ.value_type}
+        else:
+            args, returned = builtin.vector_methods[node.name]
+            elements = {"elem": typ.elem_type}
+
+        def lookup(name):
+            if name is None:
+                return None
+            if name.startswith("vec["):
+                elem_type = lookup(name.removeprefix("vec[").removesuffix("]"))
+                return ir.VectorType(
+                    f"vec[{elem_type.name}]", types.VectorType(elem_type.checked), elem_type
+                )
+            return elements[name] if name in elements else builtin.scope.lookup(name)
+        params = {"self": typ} | {f"arg{i}": lookup(arg) for i, arg in enumerate(args)}
+        sig = ir.FunctionSigRef(node.method.typ.name, None, params, lookup(returned))
+        self.check_type(sig)
+        return sig
+
+    def check_set_char(self, node):
+        # a packed string is immutable, so writing a char assigns the string
+        # rebuilt with it to the variable holding the string
+        ref = node.target
+        if not isinstance(ref.parent, ir.Ref):
+            self.error(f"Cannot assign to {ref.name}, as the string is not in a variable")
+        args = [ir.Load(ref.parent), ref.index, node.value]
+        call = ir.Call(builtin.names["set_char@builtin"], args)
+        self.check(call)
+        node.target = ref.parent
+        node.value = call
+
+    def check_slice(self, node):
+        # a slice has the type of what it is taken of, but an array's length
+        # is only known when the slice is taken
+        self.check(node.target)
+        values, start, end = node.args
+        for arg in node.args:
+            self.check(arg)
+        if not is_elementwise(values.typ) and not is_str(values.typ.checked):
+            self.error(f"Cannot slice {values.typ}, which is not a sequence")
+        elif start.typ.checked != builtin.types["int"] or end.typ.checked != builtin.types["int"]:
+            self.error(f"Slice of {values.typ} must be between integers")
+        elif isinstance(values.typ.checked, types.ArrayType):
+            elem_type = values.typ.elem_type
+            node.typ = ir.ArrayType(
+                f"arr[{elem_type.name},None]",
+                types.ArrayType(elem_type.checked, None),
+                elem_type,
+                None
+            )
+            self.check_type(node.typ)
+        else:
+            node.typ = values.typ
+
     def check_binary(self, node):
         self.check(node.lhs)
         self.check(node.rhs)
 
+        if is_elementwise(node.lhs.typ) or is_elementwise(node.rhs.typ):
+            self.check_elementwise(node)
+            return
         if node.lhs.typ != node.rhs.typ:
             self.error(f"Mismatched types for {node.lhs} and {node.rhs}")
         if is_comparison_op(node.op):
@@ -309,6 +459,58 @@ class TypeChecker:
         else:
             node.typ = node.lhs.typ
 
+    def check_elementwise(self, node):
+        # an operator applied to each element of a sequence, with the element
+        # of the other sequence at the same index, or with a scalar
+        lhs, rhs = node.lhs.typ, node.rhs.typ
+        seq = lhs if is_elementwise(lhs) else rhs
+        elem_type = seq.elem_type
+        is_vector = isinstance(seq.checked, types.VectorType)
+        # the result is an array if either operand is, of its length if known
+        is_array = False
+        length = None
+        for operand in (lhs, rhs):
+            if not is_elementwise(operand):
+                if operand.checked != elem_type.checked:
+                    self.error(f"Mismatched types for {operand} and elements of {seq}")
+                continue
+            if isinstance(operand.checked, types.VectorType) != is_vector \
+                    or operand.checked.elem_type != elem_type.checked:
+                self.error(f"Mismatched types for {lhs} and {rhs}")
+            if isinstance(operand.checked, types.ArrayType):
+                is_array = True
+                if length is not None and operand.checked.length not in (None, length):
+                    self.error(f"Mismatched lengths for {lhs} and {rhs}")
+                length = length if operand.checked.length is None else operand.checked.length
+
+        if is_comparison_op(node.op):
+            elem_type = builtin.scope.lookup("bool")
+        elif not types.is_numeric(elem_type.checked):
+            self.error(f"Unsupported op '{node.op}' on elements of {seq}")
+        elif node.op == '/':
+            elem_type = builtin.scope.lookup("float")
+
+        if is_vector:
+            node.typ = ir.VectorType(
+                f"vec[{elem_type.name}]",
+                types.VectorType(elem_type.checked),
+                elem_type
+            )
+        elif is_array:
+            node.typ = ir.ArrayType(
+                f"arr[{elem_type.name},{length}]",
+                types.ArrayType(elem_type.checked, length),
+                elem_type,
+                length
+            )
+        else:
+            node.typ = ir.SequenceType(
+                f"sequence[{elem_type.name}]",
+                types.SequenceType(elem_type.checked),
+                elem_type
+            )
+        self.check_type(node.typ)
+
     def check_unary(self, node):
         self.check(node.rhs)
 
@@ -331,10 +533,12 @@ class TypeChecker:
                 for i in range(length):
                     self.check(elements[i])
                     elem_type = self.update_types(elem_type, elements[i].typ)
+                # an empty vector takes the type of its elements from the
+                # variable it is assigned to
                 if isinstance(node, ir.Vector):
                     node.typ = ir.VectorType(
                         str(node.typ),
-                        types.VectorType(elem_type.checked),
+                        types.VectorType(elem_type.checked if elem_type else None),
                         elem_type
                     )
                 elif isinstance(node, ir.Array):
@@ -351,6 +555,30 @@ class TypeChecker:
                         elem_type
                     )
                 self.check_type(node.typ)
+            case ir.Map(keys, values):
+                key_type = None
+                value_type = None
+                for key, value in zip(keys, values):
+                    self.check(key)
+                    self.check(value)
+                    key_type = self.update_types(key_type, key.typ)
+                    value_type = self.update_types(value_type, value.typ)
+                # hashing is only defined for basic types, which are compared
+                # by value
+                if key_type is not None and not types.is_basic(key_type.checked):
+                    self.error(f"Map keys of {key_type}, which is not a basic type")
+                # an empty map takes its types from the variable it is
+                # assigned to
+                node.typ = ir.MapType(
+                    f"map[{key_type and key_type.name}, {value_type and value_type.name}]",
+                    types.MapType(
+                        key_type.checked if key_type else None,
+                        value_type.checked if value_type else None
+                    ),
+                    key_type,
+                    value_type
+                )
+                self.check_type(node.typ)
             case ir.StructLiteral():
                 self.check_type(node.typ)
                 for fname, fval in node.fields.items():
@@ -83,6 +83,16 @@ class VectorType(SequenceType):
         return f"vec[{self.elem_type}]"
 
 
+@dataclass(eq=False, repr=False)
+class MapType(Type):
+    key_type: Type
+    value_type: Type
+
+    @property
+    def string(self):
+        return f"map[{self.key_type}, {self.value_type}]"
+
+
 @dataclass(eq=False, repr=False)
 class FunctionType(Type):
     return_type: Type
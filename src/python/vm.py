@@ -0,0 +1,523 @@
+from array import array
+from dataclasses import dataclass, field
+import operator
+
+from .interpreter import (
+    StaObject, StaVariable, StaStruct, StaBuiltinFunction, call_builtin,
+    BINARY_OPS, is_boxed, box, unbox, new_sequence, new_map, get_element, set_element,
+    elementwise, concat, flatten, restore,
+)
+from .resolve import resolve_slots, resolve_ropes, layout, is_append
+from . import ir_nodes as ir
+from . import type_defs as types
+
+
+# A register bytecode for checked programs
+# each function is lowered to a flat `array` of opcodes and their operands,
+# with a pool of constants; its registers are the slots `resolve_slots` gave
+# its locals, then temporaries, then a copy of the constant pool, so an
+# operand that is a constant needs no load
+# basic values are held in registers unboxed, and boxed into `StaObject`s
+# only where they are stored into a struct, or leave the VM
+
+
+UNARY_OPS = {
+    "-": operator.neg,
+    "!": operator.not_,
+}
+
+# the operators come first, so the dispatch loop handles them all with one
+# comparison, indexing `OPERATORS` by the opcode
+OPERATORS = tuple(BINARY_OPS.values()) + tuple(UNARY_OPS.values())
+N_BINARY = len(BINARY_OPS)
+N_OPERATORS = len(OPERATORS)
+
+# the name and operands of each opcode after the operators
+# r: a register, k: an index into the constant pool, n: a count,
+# t: the position of an instruction
+INSTRUCTIONS = {
+    "move": "rr",
+    "jump": "t",
+    "jumpf": "rt",
+    "ret": "r",
+    "call": "rknr",
+    "callb": "rknr",
+    "declare": "k",
+    "getref": "rk",
+    "setref": "kr",
+    "getfield": "rrk",
+    "setfield": "rkr",
+    "getindex": "rrr",
+    "setindex": "rrr",
+    "newseq": "rknr",
+    "newstruct": "rknr",
+    "newmap": "rknr",
+    "box": "rrk",
+    "unbox": "rr",
+    "each": "rkrr",
+    "concat": "rrr",
+    "flat": "rr",
+}
+OPNAMES = list(BINARY_OPS) + ["neg", "not"] + list(INSTRUCTIONS)
+OPERANDS = ["rrr"] * N_BINARY + ["rr"] * len(UNARY_OPS) + list(INSTRUCTIONS.values())
+(
+    MOVE, JUMP, JUMPF, RET, CALL, CALLB, DECLARE, GETREF, SETREF, GETFIELD,
+    SETFIELD, GETINDEX, SETINDEX, NEWSEQ, NEWSTRUCT, NEWMAP, BOX, UNBOX, EACH,
+    CONCAT, FLAT,
+) = range(N_OPERATORS, N_OPERATORS + len(INSTRUCTIONS))
+
+
+@dataclass(eq=False)
+class Code:
+    name: str
+    params: list[ir.Ref] = field(default_factory=list)
+    ops: array = field(default_factory=lambda: array("l"))
+    consts: list = field(default_factory=list)
+    # the registers of a new frame: locals and temporaries, then the constants
+    template: list = field(default_factory=list)
+    # whether every parameter has a slot and no variable is captured, so
+    # arguments are copied straight into the first registers
+    direct: bool = True
+    # the variables nested functions use, restored on return
+    captured: tuple = ()
+    # the type of the value returned, for boxing it when it leaves the VM
+    ret_type: types.Type = None
+
+
+class Lowering:
+    # lowers a checked program to `Code`, one per function and one for the
+    # top level declarations
+    def __init__(self, entry_name="main"):
+        # id(FunctionRef) -> Code
+        self.functions = {}
+        self.pending = []
+        self.entry_name = entry_name
+        self.entry = None
+
+    def lower(self, program):
+        resolve_slots(program)
+        resolve_ropes(program)
+        top = Code("<program>")
+        FunctionLowering(self, top, 0).lower(program.block)
+        while self.pending:
+            code, ref = self.pending.pop()
+            FunctionLowering(self, code, ref.frame_size).lower(ref.block)
+        return top
+
+    def function(self, ref):
+        if (code := self.functions.get(id(ref))) is not None:
+            return code
+        if ref.builtin:
+            code = StaBuiltinFunction(ref.typ, ref.params, ref.block)
+        else:
+            code = Code(ref.name, ref.params, direct=not ref.captured and all(
+                param.slot == i for i, param in enumerate(ref.params)
+            ), captured=tuple(ref.captured))
+            # lowered once the function being lowered is done
+            self.pending.append((code, ref))
+            if ref.typ.name == self.entry_name:
+                self.entry = code
+        self.functions[id(ref)] = code
+        return code
+
+
+class FunctionLowering:
+    def __init__(self, lowering, code, frame_size):
+        self.lowering = lowering
+        self.code = code
+        self.ops = array("l")
+        self.consts = []
+        # (type, value) of a basic constant -> its index in the pool
+        self.const_index = {}
+        self.temp_base = self.temps = self.n_regs = frame_size
+        # id(Block) -> the position of its first instruction
+        self.starts = {}
+        # (position of a jump target, Block)
+        self.fixups = []
+
+    def lower(self, block):
+        order = layout(block)
+        for block, next_block in zip(order, order[1:] + [None]):
+            self.starts[id(block)] = len(self.ops)
+            self.lower_block(block, next_block)
+        for pos, block in self.fixups:
+            self.ops[pos] = self.starts[id(block)]
+        # constant operands were given as -(index + 1)
+        base = self.n_regs
+        for pos, operand in enumerate(self.ops):
+            if operand < 0:
+                self.ops[pos] = base - operand - 1
+        code = self.code
+        code.ops = self.ops
+        code.consts = self.consts
+        code.template = [None] * base + self.consts
+
+    def emit(self, op, *operands):
+        self.ops.append(op)
+        self.ops.extend(operands)
+
+    def emit_jump(self, block, next_block):
+        if block is not next_block:
+            self.emit(JUMP, 0)
+            self.fixups.append((len(self.ops) - 1, block))
+
+    def const(self, value, key=None):
+        key = (type(value), value) if key is None else key
+        if (k := self.const_index.get(key)) is None:
+            k = self.const_index[key] = len(self.consts)
+            self.consts.append(value)
+        return k
+
+    def const_reg(self, value):
+        return -self.const(value) - 1
+
+    def object(self, value):
+        # a constant that is only an operand of an instruction
+        return self.const(value, ("object", id(value)))
+
+    def temp(self, n=1):
+        reg = self.temps
+        self.temps += n
+        self.n_regs = max(self.n_regs, self.temps)
+        return reg
+
+    def lower_block(self, block, next_block):
+        for instr in block.instrs:
+            # temporaries only live within a statement
+            self.temps = self.temp_base
+            match instr:
+                case ir.Branch(target):
+                    self.emit_jump(target, next_block)
+                    return
+                case ir.CBranch(condition, t_block, f_block):
+                    self.emit(JUMPF, self.expr(condition), 0)
+                    self.fixups.append((len(self.ops) - 1, f_block))
+                    self.emit_jump(t_block, next_block)
+                    return
+                case ir.Return(value):
+                    if value is not None and self.code.ret_type is None:
+                        self.code.ret_type = value.typ.checked
+                    self.emit(RET, self.const_reg(None) if value is None else self.expr(value))
+                    return
+                case _:
+                    self.lower_instr(instr)
+        self.emit(RET, self.const_reg(None))
+
+    def lower_instr(self, node):
+        match node:
+            case ir.Declare(ref):
+                self.lower_declare(ref)
+            case ir.DeclareMethods(_, block):
+                for instr in block.instrs:
+                    self.lower_instr(instr)
+            case ir.Assign(ref, value):
+                self.lower_assign(ref, value)
+            case ir.Load() | ir.Call() | ir.Binary() | ir.Unary():
+                self.expr(node)
+            case _:
+                assert False, f"Unexpected instruction {type(node)}"
+
+    def lower_declare(self, ref):
+        match ref:
+            case ir.FunctionRef():
+                self.lowering.function(ref)
+            case ir.Type():
+                pass
+            case ir.ConstRef(value=value, slot=None):
+                self.emit(DECLARE, self.object((id(ref), ref.name)))
+                self.emit(SETREF, self.object(id(ref)), self.expr(value))
+            case ir.ConstRef(value=value, slot=slot):
+                self.expr(value, slot)
+            case ir.Ref(slot=None):
+                self.emit(DECLARE, self.object((id(ref), ref.name)))
+
+    def lower_assign(self, ref, value):
+        if ref.rope and is_append(ref, value):
+            string = self.load(ref, flat=False)
+            tail = self.expr(value.rhs)
+            if ref.slot is not None:
+                self.emit(CONCAT, ref.slot, string, tail)
+            else:
+                dst = self.temp()
+                self.emit(CONCAT, dst, string, tail)
+                self.emit(SETREF, self.object(id(ref)), dst)
+            return
+        match ref:
+            case ir.Ref(slot=slot) if slot is not None:
+                self.expr(value, slot)
+            case ir.FieldRef(parent=parent, name=name):
+                src = self.boxed(value)
+                self.emit(SETFIELD, self.load(parent), self.object(name), src)
+            case ir.IndexRef(parent=parent, index=index):
+                src = self.expr(value)
+                self.emit(SETINDEX, self.sequence(parent), self.expr(index), src)
+            case ir.Ref():
+                self.emit(SETREF, self.object(id(ref)), self.expr(value))
+
+    def boxed(self, node):
+        # the register holding the value of `node` as a Sta object
+        reg = self.expr(node)
+        if is_boxed(node.typ.checked):
+            return reg
+        dst = self.temp()
+        self.emit(BOX, dst, reg, self.object(node.typ.checked))
+        return dst
+
+    def unboxed(self, dst, typ):
+        if not is_boxed(typ):
+            self.emit(UNBOX, dst, dst)
+
+    def load(self, ref, dst=None, flat=True):
+        # the register holding the value of the variable `ref`, with a rope
+        # joined unless not `flat`
+        if ref.rope and flat:
+            string = self.load(ref, flat=False)
+            dst = self.temp() if dst is None else dst
+            self.emit(FLAT, dst, string)
+            return dst
+        match ref:
+            case ir.Ref(slot=slot) if slot is not None:
+                if dst is None:
+                    return slot
+                self.emit(MOVE, dst, slot)
+                return dst
+        if dst is None:
+            dst = self.temp()
+        match ref:
+            case ir.FieldRef(parent=parent, name=name):
+                self.emit(GETFIELD, dst, self.load(parent), self.object(name))
+                self.unboxed(dst, ref.typ.checked)
+            case ir.IndexRef(parent=parent, index=index):
+                self.emit(GETINDEX, dst, self.sequence(parent), self.expr(index))
+            case ir.Ref():
+                self.emit(GETREF, dst, self.object(id(ref)))
+        return dst
+
+    def sequence(self, parent):
+        if isinstance(parent, ir.Ref):
+            return self.load(parent)
+        return self.expr(parent)
+
+    def expr(self, node, dst=None):
+        # the register holding the value of `node`, which is `dst` if given
+        match node:
+            case ir.Constant(value):
+                reg = self.const_reg(value)
+            case ir.Load(ref):
+                return self.load(ref, dst)
+            case ir.Call(target, args):
+                return self.call(node, target, args, dst)
+            case ir.Binary(op, lhs, rhs):
+                lhs = self.expr(lhs)
+                rhs = self.expr(rhs)
+                dst = self.temp() if dst is None else dst
+                if isinstance(node.typ.checked, types.SequenceType):
+                    # an operator on each element runs as one instruction
+                    info = self.object((BINARY_OPS[op], node.typ.checked))
+                    self.emit(EACH, dst, info, lhs, rhs)
+                else:
+                    self.emit(OPERATORS.index(BINARY_OPS[op]), dst, lhs, rhs)
+                return dst
+            case ir.Unary(op, rhs):
+                rhs = self.expr(rhs)
+                dst = self.temp() if dst is None else dst
+                self.emit(N_BINARY + list(UNARY_OPS).index(op), dst, rhs)
+                return dst
+            case ir.Sequence(elements):
+                return self.build(NEWSEQ, node.typ.checked, elements, dst, self.expr)
+            case ir.Map(keys, values):
+                # the keys, then the values, in consecutive registers
+                return self.build(NEWMAP, node.typ.checked, keys + values, dst, self.expr)
+            case ir.StructLiteral(fields):
+                typ = node.typ.checked
+                return self.build(
+                    NEWSTRUCT, (typ, tuple(fields)), fields.values(), dst, self.boxed,
+                )
+            case _:
+                assert False, f"Unexpected expression {type(node)}"
+        if dst is not None:
+            self.emit(MOVE, dst, reg)
+            return dst
+        return reg
+
+    def build(self, op, info, elements, dst, value):
+        # `value` lowers an element, given the node
+        elements = list(elements)
+        first = self.temp(len(elements))
+        for i, element in enumerate(elements):
+            self.emit(MOVE, first + i, value(element))
+        dst = self.temp() if dst is None else dst
+        self.emit(op, dst, self.object(info), len(elements), first)
+        return dst
+
+    def call(self, node, target, args, dst):
+        match target:
+            case ir.FunctionRef():
+                func = self.lowering.function(target)
+            case ir.FieldRef(method=method) if method is not None:
+                func = self.lowering.function(method)
+            case _:
+                assert False, f"Unexpected call target {type(target)}"
+        first = self.temp(len(args))
+        builtin = isinstance(func, StaBuiltinFunction)
+        for i, arg in enumerate(args):
+            if builtin:
+                self.emit(MOVE, first + i, self.boxed(arg))
+            else:
+                self.expr(arg, first + i)
+        dst = self.temp() if dst is None else dst
+        self.emit(CALLB if builtin else CALL, dst, self.object(func), len(args), first)
+        if builtin and node.typ is not None:
+            self.unboxed(dst, node.typ.checked)
+        return dst
+
+
+class VM:
+    def __init__(self, entry_name="main"):
+        # variables without a slot in a frame, by id(ref), holding unboxed values
+        self.refs = {}
+        self.entry_name = entry_name
+        self.entry = None
+
+    def load(self, program):
+        # returns the code running the program's top level declarations
+        lowering = Lowering(self.entry_name)
+        code = lowering.lower(program)
+        self.entry = lowering.entry
+        return code
+
+    def call(self, code, args=()):
+        # calls a function from outside the VM, with Sta objects
+        if isinstance(code, StaBuiltinFunction):
+            return call_builtin(code, args)
+        return box(code.ret_type, self.invoke(code, [unbox(arg) for arg in args]))
+
+    def invoke(self, code, args):
+        regs = code.template.copy()
+        if code.direct:
+            regs[:len(args)] = args
+            return self.run(code, regs)
+        saved = [self.refs.get(id(ref)) for ref in code.captured]
+        for param, arg in zip(code.params, args):
+            if param.slot is None:
+                self.refs[id(param)] = StaVariable(param.name, arg)
+            else:
+                regs[param.slot] = arg
+        try:
+            return self.run(code, regs)
+        finally:
+            restore(self.refs, code.captured, saved)
+
+    def run(self, code, regs):
+        ops = code.ops
+        consts = code.consts
+        refs = self.refs
+        pc = 0
+        while True:
+            op = ops[pc]
+            if op < N_BINARY:
+                regs[ops[pc + 1]] = OPERATORS[op](regs[ops[pc + 2]], regs[ops[pc + 3]])
+                pc += 4
+            elif op == JUMPF:
+                if regs[ops[pc + 1]]:
+                    pc += 3
+                else:
+                    pc = ops[pc + 2]
+            elif op == JUMP:
+                pc = ops[pc + 1]
+            elif op == MOVE:
+                regs[ops[pc + 1]] = regs[ops[pc + 2]]
+                pc += 3
+            elif op == CALL:
+                callee = consts[ops[pc + 2]]
+                first = ops[pc + 4]
+                args = regs[first:first + ops[pc + 3]]
+                if callee.direct:
+                    frame = callee.template.copy()
+                    frame[:len(args)] = args
+                    regs[ops[pc + 1]] = self.run(callee, frame)
+                else:
+                    regs[ops[pc + 1]] = self.invoke(callee, args)
+                pc += 5
+            elif op == RET:
+                return regs[ops[pc + 1]]
+            elif op == GETFIELD:
+                regs[ops[pc + 1]] = regs[ops[pc + 2]].value[consts[ops[pc + 3]]].value
+                pc += 4
+            elif op == GETINDEX:
+                regs[ops[pc + 1]] = get_element(regs[ops[pc + 2]], regs[ops[pc + 3]])
+                pc += 4
+            elif op == UNBOX:
+                regs[ops[pc + 1]] = regs[ops[pc + 2]].value
+                pc += 3
+            elif op == GETREF:
+                regs[ops[pc + 1]] = refs[consts[ops[pc + 2]]].value
+                pc += 3
+            elif op == SETREF:
+                refs[consts[ops[pc + 1]]].value = regs[ops[pc + 2]]
+                pc += 3
+            elif op == BOX:
+                regs[ops[pc + 1]] = StaObject(consts[ops[pc + 3]], regs[ops[pc + 2]])
+                pc += 4
+            elif op < N_OPERATORS:
+                regs[ops[pc + 1]] = OPERATORS[op](regs[ops[pc + 2]])
+                pc += 3
+            elif op == SETFIELD:
+                regs[ops[pc + 1]].value[consts[ops[pc + 2]]].value = regs[ops[pc + 3]]
+                pc += 4
+            elif op == SETINDEX:
+                set_element(regs[ops[pc + 1]], regs[ops[pc + 2]], regs[ops[pc + 3]])
+                pc += 4
+            elif op == DECLARE:
+                key, name = consts[ops[pc + 1]]
+                refs[key] = StaVariable(name)
+                pc += 2
+            elif op == NEWSEQ:
+                first = ops[pc + 4]
+                elements = regs[first:first + ops[pc + 3]]
+                regs[ops[pc + 1]] = new_sequence(consts[ops[pc + 2]], elements)
+                pc += 5
+            elif op == NEWMAP:
+                first = ops[pc + 4]
+                n = ops[pc + 3] // 2
+                regs[ops[pc + 1]] = new_map(
+                    consts[ops[pc + 2]], regs[first:first + n], regs[first + n:first + 2 * n]
+                )
+                pc += 5
+            elif op == NEWSTRUCT:
+                typ, names = consts[ops[pc + 2]]
+                first = ops[pc + 4]
+                regs[ops[pc + 1]] = StaStruct(typ, {
+                    name: StaVariable(name, regs[first + i]) for i, name in enumerate(names)
+                })
+                pc += 5
+            elif op == CALLB:
+                first = ops[pc + 4]
+                args = regs[first:first + ops[pc + 3]]
+                regs[ops[pc + 1]] = call_builtin(consts[ops[pc + 2]], args)
+                pc += 5
+            elif op == EACH:
+                func, typ = consts[ops[pc + 2]]
+                regs[ops[pc + 1]] = elementwise(func, typ, regs[ops[pc + 3]], regs[ops[pc + 4]])
+                pc += 5
+            elif op == CONCAT:
+                regs[ops[pc + 1]] = concat(regs[ops[pc + 2]], regs[ops[pc + 3]])
+                pc += 4
+            elif op == FLAT:
+                regs[ops[pc + 1]] = flatten(regs[ops[pc + 2]])
+                pc += 3
+            else:
+                assert False, f"Unknown opcode {op}"
+
+
+def disassemble(code):
+    # one line per instruction: its position, name and operands
+    lines = []
+    ops = code.ops
+    pc = 0
+    while pc < len(ops):
+        op = ops[pc]
+        operands = ops[pc + 1:pc + 1 + len(OPERANDS[op])]
+        lines.append(f"{pc:4} {OPNAMES[op]:<9} {' '.join(map(str, operands))}".rstrip())
+        pc += 1 + len(operands)
+    return lines
@@ -0,0 +1,85 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from src.python.cache import IRCache
+from src.python.ir_nodes import IRPrinter
+from src.python.trace import TraceCounter
+from src.python import cmd
+
+
+class TestCache(unittest.TestCase):
+    src = (
+        "struct p {x int; y int;}\n"
+        "fn f(a p) int {\n    return a.x * a.y\n}\n"
+        "fn main() int {\n    var q = p(3, 4)\n    return f(q)\n}\n"
+    )
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def entries(self):
+        return sorted(name for name in os.listdir(self.cache_dir) if name.endswith(".ir"))
+
+    def test_hit(self):
+        expected = IRPrinter(test=True).to_string(cmd.translate(self.src))
+        first = cmd.translate(self.src, cache_dir=self.cache_dir)
+        self.assertEqual(len(self.entries()), 1)
+
+        counter = TraceCounter()
+        second = cmd.translate(self.src, cache_dir=self.cache_dir, tracer=counter)
+        # nothing was parsed or checked
+        self.assertEqual(counter.counts, {})
+        self.assertIsNot(second, first)
+        self.assertEqual(IRPrinter(test=True).to_string(second), expected)
+        self.assertEqual(cmd.exec_src(self.src, cache_dir=self.cache_dir).value, 12)
+
+    def test_keys(self):
+        cache = IRCache(self.cache_dir)
+        self.assertEqual(cache.key(self.src), cache.key(self.src))
+        self.assertNotEqual(cache.key(self.src), cache.key(self.src + " "))
+        cache.version = "other"
+        self.assertNotEqual(cache.key(self.src), IRCache(self.cache_dir).key(self.src))
+
+    def test_damaged_entry(self):
+        cmd.translate(self.src, cache_dir=self.cache_dir)
+        [name] = self.entries()
+        with open(os.path.join(self.cache_dir, name), "wb") as f:
+            f.write(b"not a program")
+        with self.assertLogs(level=logging.WARNING):
+            self.assertEqual(cmd.exec_src(self.src, cache_dir=self.cache_dir).value, 12)
+        self.assertEqual(cmd.exec_src(self.src, cache_dir=self.cache_dir).value, 12)
+
+    def test_errors_not_cached(self):
+        errors = []
+        src = "fn main() int {\n    if 1 { return 1; }\n    return 0\n}\n"
+        cmd.translate(src, cache_dir=self.cache_dir, error_handler=errors.append)
+        self.assertTrue(errors)
+        self.assertEqual(self.entries(), [])
+
+    def test_eviction(self):
+        cache = IRCache(self.cache_dir)
+        sources = [self.src.replace("3, 4", f"{i}, 4") for i in range(4)]
+        for i, src in enumerate(sources):
+            cache.store(cache.key(src), cmd.translate(src))
+            # make the order of the entries certain
+            os.utime(cache.entry(cache.key(src)), (i, i))
+        size = os.path.getsize(cache.entry(cache.key(sources[0])))
+
+        # a hit makes an entry the most recently used
+        self.assertIsNotNone(cache.load(cache.key(sources[0])))
+        cache.max_size = 2 * size + size // 2
+        cache.evict()
+        self.assertEqual(
+            self.entries(),
+            sorted(cache.key(src) + ".ir" for src in (sources[0], sources[3])),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
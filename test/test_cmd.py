@@ -0,0 +1,42 @@
+import subprocess
+import sys
+import unittest
+
+
+class TestCmd(unittest.TestCase):
+    def test_lazy_imports(self):
+        tests = {
+            # Tests given as the flags for `cmd.translate` mapped to the
+            # modules that must not have been imported
+
+            "tokenise=True": (
+                "src.python.parser", "src.python.ir", "src.python.interpreter",
+                "src.python.compiler", "src.python.control_flows",
+                "llvmcpy", "schemdraw",
+            ),
+            "parse=True": (
+                "src.python.ir", "src.python.type_checker",
+                "src.python.compiler", "llvmcpy", "schemdraw",
+            ),
+            "typecheck=True": (
+                "src.python.interpreter", "src.python.compiler",
+                "src.python.control_flows", "llvmcpy", "schemdraw",
+            ),
+        }
+
+        for flags, modules in tests.items():
+            with self.subTest(flags=flags):
+                code = (
+                    "import sys\n"
+                    "from src.python import cmd\n"
+                    f"cmd.translate('fn main() int {{ return 1; }}', {flags})\n"
+                    f"print(*[m for m in {modules!r} if m in sys.modules])\n"
+                )
+                out = subprocess.run(
+                    [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                ).stdout
+                self.assertEqual(out.strip(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
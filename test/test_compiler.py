@@ -39,8 +39,10 @@ class TestCompiler(unittest.TestCase):
             "3 * 2": 6,
             # "3 / 2": 1.5,
             # TODO: add more binary expr checks here for different data types
-            # TODO: range expressions do not work
-            # "[1:4]": None,
+            # a range read once is not built, and one indexed is
+            "sum([1:4])": 6,
+            "count([1:4] * 2)": 3,
+            "[2:5][1]": 3,
             "[1,2,3,4,5,6,7,8,9,10][5]": 6,
             "test_struct.x": 5,
             # "test_struct.y": "test",
@@ -68,3 +70,53 @@ class TestCompiler(unittest.TestCase):
             with self.subTest(test=test):
                 res = cmd.compile_and_run_src(test, entry_name="test")
                 self.assertEqual(res, expected)
+
+    def test_aliasing(self):
+        # names and arguments for a vector or map share it, as in the
+        # interpreter, so a push or insert through one that moves the
+        # elements is seen by the others
+        tests = {
+            """
+            fn grow(v vec[int]) int {v.push(4); v.push(5); return v.len();}
+            fn test() int {
+                var a = vec[1, 2, 3]
+                var b = a
+                b.push(9)
+                grow(a)
+                return a[3] + b.len() * 10
+            }
+            """: 69,
+            """
+            fn put(m map[int, int]) int {m.insert(7, 70); return m.len();}
+            fn test() int {
+                var a = map[1: 10]
+                var b = a
+                b.insert(2, 20)
+                put(a)
+                return a.get(2) + b.get(7) + a.len()
+            }
+            """: 93,
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.compile_and_run_src(test, entry_name="test")
+                self.assertEqual(res, expected)
+
+    def test_map_literals(self):
+        # a literal is built wherever it is used, not only assigned
+        tests = {
+            """
+            fn size(m map[int, int]) int {return m.len();}
+            fn test() int {return size(map[]) + size(map[1: 2, 3: 4]);}
+            """: 2,
+            """
+            fn make() map[str, int] {return map["a": 1];}
+            fn test() int {var m = make(); return m.get("a");}
+            """: 1,
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.compile_and_run_src(test, entry_name="test")
+                self.assertEqual(res, expected)
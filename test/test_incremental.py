@@ -0,0 +1,72 @@
+import unittest
+from src.python.cmd import translate
+from src.python.incremental import IncrementalParser
+from src.python.lexer import tokenise
+
+
+class TestIncremental(unittest.TestCase):
+    src = (
+        "struct point {\n    x int;\n    y int;\n}\n"
+        "\n"
+        "fn first() int {\n    var a = 1\n    return a + 2\n}\n"
+        "\n"
+        "fn second(p point) int {\n    return p.x * p.y\n}\n"
+        "\n"
+        "var total = 10\n"
+    )
+
+    def test_edits(self):
+        tests = [
+            # Tests given as a tuple:
+            #   The edit as (offset, deleted, inserted)
+            #   The indices of the declarations that must be reused
+
+            # extend an identifier
+            ((self.src.index("a + 2"), 1, "ab"), (0, 2, 3)),
+            # change a literal to a float
+            ((self.src.index("2\n}"), 0, "1."), (0, 2, 3)),
+            # join two lines, removing an inserted semicolon
+            ((self.src.index("\n    return a"), 1, ";"), (0, 2, 3)),
+            # append a declaration
+            ((len(self.src), 0, "var extra = \"text\"\n"), (0, 1, 2, 3)),
+            # remove a declaration
+            ((self.src.index("fn second"), self.src.index("var total") -
+              self.src.index("fn second"), ""), (0, 1)),
+            # only whitespace changes
+            ((self.src.index("\nfn first"), 0, "\n\n  "), (0, 1, 2, 3)),
+        ]
+
+        for (offset, deleted, inserted), reused in tests:
+            with self.subTest(edit=(offset, deleted, inserted)):
+                inc = IncrementalParser(self.src)
+                old = inc.program.declrs
+                new_src = self.src[:offset] + inserted + self.src[offset + deleted:]
+                program = inc.edit(offset, deleted, inserted)
+
+                self.assertEqual(inc.src, new_src)
+                self.assertEqual(list(inc.tokens), tokenise(new_src))
+                self.assertEqual(len(program.declrs), len(translate(new_src, parse=True).declrs))
+                for i in reused:
+                    self.assertTrue(any(d is old[i] for d in program.declrs))
+                self.assertLessEqual(inc.reparsed, len(old) - len(reused) + 1)
+
+    def test_matches_full_parse(self):
+        # edits that keep every line in place, so reused tokens keep their positions
+        edits = [
+            (self.src.index("a + 2"), 5, "a * 3"),
+            (self.src.index("p.x"), 3, "p.y"),
+            (self.src.index("10\n"), 2, "20"),
+        ]
+
+        inc = IncrementalParser(self.src)
+        src = self.src
+        for offset, deleted, inserted in edits:
+            with self.subTest(edit=(offset, deleted, inserted)):
+                src = src[:offset] + inserted + src[offset + deleted:]
+                self.assertEqual(inc.edit(offset, deleted, inserted), translate(src, parse=True))
+                self.assertEqual(inc.reparsed, 1)
+                self.assertLessEqual(inc.relexed, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,20 @@
 import unittest
+from array import array
 from fractions import Fraction
 
-from src.python.interpreter import StaObject, StaArray
+from src.python.interpreter import (
+    StaObject, StaArray, StaStruct, StaBuiltinFunction, call_builtin,
+    new_sequence, get_element, set_element, elements, concat, flatten, View,
+)
+from src.python.resolve import resolve_ropes
+from src.python import ir_nodes as ir
 from src.python import builtin
 from src.python import type_defs as types
 from src.python import cmd
 
 
 class TestInterpreter(unittest.TestCase):
+    flags = {"backend": "interpreter"}
     global_declrs = """
         struct test_struct_def {x int; y str;}
         var test_struct = test_struct_def(5, \"test\");
@@ -21,7 +28,7 @@ class TestInterpreter(unittest.TestCase):
     """
 
     def testing_prerequisites(self):
-        cmd.exec_src(self.global_declrs)
+        cmd.exec_src(self.global_declrs, **self.flags)
 
     @unittest.expectedFailure
     def test_expr_eval(self):
@@ -59,7 +66,7 @@ class TestInterpreter(unittest.TestCase):
         for test, expected in tests.items():
             test = self.global_declrs + "fn test() {return " + test + ";}"
             with self.subTest(test=test):
-                res = cmd.exec_src(test, entry_name="test")
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
                 self.assertEqual(res, expected)
 
     def test_stmt_eval(self):
@@ -81,5 +88,474 @@ class TestInterpreter(unittest.TestCase):
         for test, expected in tests.items():
             test = self.global_declrs + "fn test() {" + test + "}"
             with self.subTest(test=test):
-                res = cmd.exec_src(test, entry_name="test")
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
                 self.assertEqual(res, expected)
+
+    def test_long_loop(self):
+        # many more iterations than the recursion limit has frames
+        test = """
+        fn test() int {
+            var i = 0
+            var s = 0
+            while i < 5000 {
+                if i < 2500 {s = s + 2;} else {s = s - 1;}
+                i = i + 1
+            }
+            return s
+        }
+        """
+        res = cmd.exec_src(test, entry_name="test", **self.flags)
+        self.assertEqual(res, StaObject(builtin.types["int"], 2500))
+
+    def test_calls(self):
+        tests = {
+            # recursion keeps each call's parameters apart
+            """
+            fn fib(n int) int {
+                if n < 2 {return n;}
+                return fib(n - 1) + fib(n - 2)
+            }
+            fn test() int {return fib(15);}
+            """: 610,
+            # fields are read from the struct passed to each call
+            """
+            struct p {x int; y int;}
+            fn f(a p) int {return a.x * a.y;}
+            fn test() int {return f(p(3, 4)) + f(p(5, 6));}
+            """: 42,
+            # a nested function sees the current value of an outer local
+            """
+            fn test() int {
+                var k = 10
+                fn g(x int) int {return x + k;}
+                k = 20
+                return g(1) + g(2)
+            }
+            """: 43,
+            # recursion keeps apart the variables nested functions use
+            """
+            fn outer(n int) int {
+                var m = n * 2
+                fn inner() int {return n + m;}
+                if n == 0 {return 0;}
+                var r = outer(n - 1)
+                return r + inner()
+            }
+            fn test() int {return outer(5);}
+            """: 45,
+            # globals are shared between calls
+            """
+            var g = 5
+            fn inc(n int) int {
+                g = g + n
+                return g
+            }
+            fn test() int {
+                inc(1)
+                return inc(2)
+            }
+            """: 8,
+            # a return inside a loop leaves the loop and the function only
+            """
+            fn find(n int) int {
+                var i = 0
+                while i < 100 {
+                    if i * i > n {return i;}
+                    i = i + 1
+                }
+                return 0
+            }
+            fn test() int {return find(50) + find(10);}
+            """: 12,
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, StaObject(builtin.types["int"], expected))
+
+    def test_sequences(self):
+        tests = {
+            # elements of each kind of storage are read and written in place
+            """
+            struct p {x int; y int;}
+            fn test() int {
+                var a = [1, 2, 3]
+                var b = [true, false]
+                var ps = [p(1, 2), p(3, 4)]
+                a[1] = a[0] + a[2]
+                b[1] = !b[1]
+                if b[1] {return a[1] + ps[1].y;}
+                return 0
+            }
+            """: StaObject(builtin.types["int"], 8),
+            """
+            fn test() float {
+                var v = vec[1.5, 2.5]
+                v[0] = v[1] * 2.0
+                return v[0]
+            }
+            """: StaObject(builtin.types["float"], 5.0),
+            """
+            fn test() char {
+                var c = ['a', 'b']
+                c[0] = c[1]
+                return c[0]
+            }
+            """: StaObject(builtin.types["char"], "b"),
+            # ranges can be indexed
+            "fn test() int {var r = [3:10]; return r[4];}": StaObject(builtin.types["int"], 7),
+            # without building them, however long they are
+            "fn test() int {return [0:1000000000000][5] + count([0:1000000000000]);}": (
+                StaObject(builtin.types["int"], 1000000000005)
+            ),
+            # and are built once they are written to
+            "fn test() int {var r = [0:5]; r[1] = 10; return sum(r);}": (
+                StaObject(builtin.types["int"], 19)
+            ),
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, expected)
+
+    def test_strings(self):
+        tests = {
+            'fn test() str {var s = "ab"; return s + "cd";}': (
+                StaObject(builtin.types["str"], "abcd")
+            ),
+            'fn test() char {var s = "abc"; return s[2];}': StaObject(builtin.types["char"], "c"),
+            'fn test() bool {return "ab" + "c" == "abc";}': StaObject(builtin.types["bool"], True),
+            """
+            struct named {name str;}
+            fn test() str {var n = named("text"); return n.name;}
+            """: StaObject(builtin.types["str"], "text"),
+            # strings built in a loop read the same as any other
+            """
+            fn test() str {
+                var s = ""
+                var first = ""
+                var i = 0
+                while i < 4 {
+                    s = s + "ab"
+                    if i == 0 {first = s;}
+                    if s[1] == 'b' {s = s + ",";}
+                    i = i + 1
+                }
+                return s + first
+            }
+            """: StaObject(builtin.types["str"], "ab,ab,ab,ab,ab"),
+            'fn test() str {return join(vec["a", "b"], ", ") + join(["c"], "-");}': (
+                StaObject(builtin.types["str"], "a, bc")
+            ),
+            # writing a char rebuilds the string, leaving its other copies
+            """
+            fn test() str {
+                var s = "abc"
+                var t = s
+                s[1] = 'x'
+                var v = vec["de"]
+                v[0][0] = 'f'
+                return s + t + v[0]
+            }
+            """: StaObject(builtin.types["str"], "axcabcfe"),
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, expected)
+
+    def test_elementwise(self):
+        tests = {
+            # sequences of the same length pair their elements
+            "fn test() int {var a = [1, 2, 3]; var b = a + [10, 20, 30]; return b[2];}": (
+                StaObject(builtin.types["int"], 33)
+            ),
+            # scalars apply to every element, on either side
+            "fn test() int {var a = 2 * [1:5] - 1; return a[3];}": (
+                StaObject(builtin.types["int"], 7)
+            ),
+            "fn test() float {var a = vec[1, 2] / 4; return a[1];}": (
+                StaObject(builtin.types["float"], 0.5)
+            ),
+            # comparisons give a mask of bools
+            """
+            fn test() int {
+                var m = vec[1.5, 2.5, 3.5] > 2.0
+                if m[0] {return 0;}
+                if m[2] {return 1;}
+                return 2
+            }
+            """: StaObject(builtin.types["int"], 1),
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, expected)
+
+    def test_reductions(self):
+        tests = {
+            "fn test() int {return sum([1:101]);}": StaObject(builtin.types["int"], 5050),
+            "fn test() int {return min([4, 2, 7]) * max([4, 2, 7]);}": (
+                StaObject(builtin.types["int"], 14)
+            ),
+            "fn test() int {return count(vec[true, false]);}": StaObject(builtin.types["int"], 2),
+            "fn test() float {return mean([1, 2, 3, 4]);}": StaObject(builtin.types["float"], 2.5),
+            "fn test() float {return sum(vec[0.5, 1.5]);}": StaObject(builtin.types["float"], 2.0),
+            # one pass keeps its precision far from zero
+            "fn test() float {return variance([1000000004.0, 1000000007.0, 1000000013.0]);}": (
+                StaObject(builtin.types["float"], 14.0)
+            ),
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, expected)
+
+    def test_slices(self):
+        tests = {
+            "fn test() int {var a = [1, 2, 3, 4, 5]; var b = a[1:4]; return b[0] + count(b);}": (
+                StaObject(builtin.types["int"], 5)
+            ),
+            # writes through a view are seen by what it is a view of
+            "fn test() int {var a = vec[1, 2, 3]; var b = a[1:3]; b[0] = 7; return a[1];}": (
+                StaObject(builtin.types["int"], 7)
+            ),
+            # a view of a view indexes the same elements
+            "fn test() int {var a = [0:10]; var b = a[2:8]; var c = b[3:5]; return c[1];}": (
+                StaObject(builtin.types["int"], 6)
+            ),
+            "fn test() float {var a = [1.0, 2.0, 3.0, 4.0]; return sum(a[0:2] * a[2:4]);}": (
+                StaObject(builtin.types["float"], 11.0)
+            ),
+            "fn test() str {var a = [\"a\", \"b\", \"c\"]; return join(a[1:3], \",\");}": (
+                StaObject(builtin.types["str"], "b,c")
+            ),
+            "fn test() str {var s = \"starling\"; return s[4:8];}": (
+                StaObject(builtin.types["str"], "ling")
+            ),
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, expected)
+
+        # indices are checked against the length of the view
+        tests = [
+            "fn test() int {var a = [1, 2, 3]; var b = a[0:2]; return b[2];}",
+            "fn test() int {var a = [1, 2, 3]; var b = a[2:4]; return 0;}",
+            "fn test() int {var a = [1, 2, 3]; var b = a[2:1]; return 0;}",
+        ]
+        for test in tests:
+            with self.subTest(test=test):
+                self.assertRaises(
+                    AssertionError, cmd.exec_src, test, entry_name="test", **self.flags
+                )
+
+    def test_vectors(self):
+        tests = {
+            """
+            fn test() int {
+                var v vec[int] = vec[]
+                v.reserve(2)
+                var i = 0
+                while i < 10 {
+                    if i > 4 {v.push(i * i);}
+                    i = i + 1
+                }
+                return v.pop() + v.len() * 100 + v[0]
+            }
+            """: StaObject(builtin.types["int"], 506),
+            "fn test() int {var v = vec[1, 2]; v.clear(); v.push(3); return v[0] + v.len();}": (
+                StaObject(builtin.types["int"], 4)
+            ),
+            "fn test() bool {var v = vec[true]; v.push(false); return v.pop();}": (
+                StaObject(builtin.types["bool"], False)
+            ),
+            """
+            fn test() str {
+                var v vec[str] = vec[]
+                v.push("a")
+                v.push("b")
+                return join(v, ",")
+            }
+            """: StaObject(builtin.types["str"], "a,b"),
+            # pushing to a slice copies it, leaving what it was taken of
+            """
+            fn test() int {
+                var v = vec[1, 2, 3]
+                var w = v[0:2]
+                w.push(4)
+                w[0] = 5
+                return v[0] * 10 + w[2]
+            }
+            """: StaObject(builtin.types["int"], 14),
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, expected)
+
+        test = "fn test() int {var v = vec[1]; v.pop(); return v.pop();}"
+        self.assertRaises(AssertionError, cmd.exec_src, test, entry_name="test", **self.flags)
+
+    def test_maps(self):
+        tests = {
+            # counts the keys of a group-by, removing one group
+            """
+            fn test() int {
+                var m map[int, int] = map[]
+                var i = 0
+                var k = 0
+                while i < 100 {
+                    if m.contains(k) {m.insert(k, m.get(k) + 1);} else {m.insert(k, 1);}
+                    i = i + 1
+                    k = k + 1
+                    if k == 7 {k = 0;}
+                }
+                m.remove(6)
+                m.remove(8)
+                return m.len() * 100 + m.get(0) + m.get(6 - 4)
+            }
+            """: StaObject(builtin.types["int"], 629),
+            """
+            fn test() int {
+                var m = map["a": 1, "b": 2]
+                m.insert("c", 3)
+                m.insert("a", 4)
+                var ks = m.keys()
+                return sum(m.values()) * 10 + ks.len()
+            }
+            """: StaObject(builtin.types["int"], 93),
+            "fn test() bool {var m = map['x': true]; return m.get('x') == m.contains('y');}": (
+                StaObject(builtin.types["bool"], False)
+            ),
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                res = cmd.exec_src(test, entry_name="test", **self.flags)
+                self.assertEqual(res, expected)
+
+        test = "fn test() int {var m = map[1: 2]; m.remove(1); return m.get(1);}"
+        self.assertRaises(AssertionError, cmd.exec_src, test, entry_name="test", **self.flags)
+
+
+class TestSequenceStorage(unittest.TestCase):
+    def test_buffers(self):
+        int_t, float_t = builtin.types["int"], builtin.types["float"]
+        bool_t, char_t = builtin.types["bool"], builtin.types["char"]
+        struct_t = types.StructType({"x": int_t})
+        tests = [
+            (types.ArrayType(int_t, 2), [1, 2], "q"),
+            (types.VectorType(float_t), [1.5, 2.5], "d"),
+            (types.ArrayType(bool_t, 2), [True, False], "B"),
+            (types.ArrayType(char_t, 2), ["a", "b"], "L"),
+        ]
+        for typ, values, typecode in tests:
+            with self.subTest(typ=typ):
+                sequence = new_sequence(typ, values)
+                self.assertEqual(sequence.value.typecode, typecode)
+                set_element(sequence, 0, values[1])
+                self.assertEqual([get_element(sequence, i) for i in range(2)], [values[1]] * 2)
+
+        # ranges keep a range until written to
+        ref = builtin.names["range_constructor@builtin"]
+        func = StaBuiltinFunction(ref.typ, ref.params, ref.block)
+        sequence = call_builtin(func, [StaObject(int_t, 2), StaObject(int_t, 5)])
+        self.assertIsInstance(sequence.value, range)
+        self.assertEqual(get_element(sequence, 1), 3)
+        set_element(sequence, 1, 7)
+        self.assertEqual(sequence.value, array("q", [2, 7, 4]))
+
+        # sequences of any other type keep a list
+        struct = StaStruct(struct_t, {})
+        sequence = new_sequence(types.ArrayType(struct_t, 1), [struct])
+        self.assertIsInstance(sequence.value, list)
+        self.assertIs(get_element(sequence, 0), struct)
+
+    def test_big_ints(self):
+        # ints beyond 64 bits move an int buffer to a list
+        big = 2 ** 63
+        tests = {
+            "fn test() int {var a = [1, 2]; a[0] = 9223372036854775807 + 1; return a[0];}": big,
+            "fn test() int {var v = vec[1]; v.push(9223372036854775807 + 1); return v[1];}": big,
+            "fn test() int {var a = [9223372036854775807, 2] + 1; return a[0];}": big,
+            "fn test() int {var a = [0:3]; a[1] = 9223372036854775807 + 1; return a[1];}": big,
+        }
+        for test, expected in tests.items():
+            for flags in ({}, {"unboxed": True}, {"backend": "closure"}, {"backend": "vm"},
+                          {"backend": "python"}):
+                with self.subTest(test=test, flags=flags):
+                    res = cmd.exec_src(test, entry_name="test", **flags)
+                    self.assertEqual(res, StaObject(builtin.types["int"], expected))
+
+        sequence = new_sequence(types.ArrayType(builtin.types["int"], 2), [1, big])
+        self.assertEqual(sequence.value, [1, big])
+
+    def test_views(self):
+        # a slice shares the buffer of what it is taken of
+        int_t = builtin.types["int"]
+        ref = builtin.names["slice@builtin"]
+        func = StaBuiltinFunction(ref.typ, ref.params, ref.block)
+        sequence = new_sequence(types.VectorType(int_t), [1, 2, 3, 4])
+        view = call_builtin(func, [sequence, StaObject(int_t, 1), StaObject(int_t, 3)])
+        self.assertIsInstance(view.value, View)
+        self.assertIs(view.value.base, sequence)
+        set_element(sequence, 2, 9)
+        self.assertEqual(list(elements(view)), [2, 9])
+
+
+class TestRopes(unittest.TestCase):
+    def test_resolve(self):
+        # only strings appended to in a loop are held as ropes
+        program = cmd.translate("""
+        fn test() str {
+            var once = "a"
+            once = once + "b"
+            var built = ""
+            while built != "aaa" {built = built + "a";}
+            return once + built
+        }
+        """)
+        resolve_ropes(program)
+        declared = program.block.instrs[0].ref.block.instrs
+        refs = {instr.ref.name: instr.ref for instr in declared if isinstance(instr, ir.Declare)}
+        self.assertFalse(refs["once"].rope)
+        self.assertTrue(refs["built"].rope)
+
+    def test_concat(self):
+        # appending to a rope leaves the ropes it was built from as they were
+        start = concat("a", "b")
+        longer = concat(start, "c")
+        other = concat(start, "d")
+        self.assertEqual(
+            [flatten(rope) for rope in (start, longer, other)], ["ab", "abc", "abd"]
+        )
+        self.assertEqual(flatten(concat(longer, "e")), "abce")
+
+
+class TestUnboxedInterpreter(TestInterpreter):
+    # the same programs, with values of basic types unboxed
+    flags = {"backend": "interpreter", "unboxed": True}
+
+
+class TestClosureInterpreter(TestInterpreter):
+    # the same programs, compiled into closures before they run
+    flags = {"backend": "closure"}
+
+
+class TestVMInterpreter(TestInterpreter):
+    # the same programs, lowered to register bytecode
+    flags = {"backend": "vm"}
+
+
+class TestPythonInterpreter(TestInterpreter):
+    # the same programs, transpiled to Python
+    flags = {"backend": "python"}
@@ -1,3 +1,6 @@
+import io
+import mmap
+import tempfile
 import unittest
 from src.python.lexer import Token, TokenType as T
 from src.python import lexer
@@ -24,6 +27,7 @@ class TestLexer(unittest.TestCase):
             "impl": [Token(T.IMPL, "impl", start_pos)],
             "arr": [Token(T.ARR, "arr", start_pos)],
             "vec": [Token(T.VEC, "vec", start_pos)],
+            "map": [Token(T.MAP, "map", start_pos)],
         }
 
         for test, expected in tests.items():
@@ -192,6 +196,96 @@ class TestLexer(unittest.TestCase):
             with self.subTest(test=test):
                 self.assertEqual(translate(test, tokenise=True), expected)
 
+    def test_semicolon_insertion(self):
+        tests = {
+            "x\ny": [
+                Token(T.IDENTIFIER, "x", start_pos),
+                Token(T.SEMICOLON, ";", lexer.Pos(1, 2)),
+                Token(T.IDENTIFIER, "y", lexer.Pos(2, 2)),
+            ],
+            "return\n}": [
+                Token(T.RETURN, "return", start_pos),
+                Token(T.SEMICOLON, ";", lexer.Pos(1, 7)),
+                Token(T.RIGHT_CURLY, "}", lexer.Pos(2, 2)),
+            ],
+            "+\n1": [
+                Token(T.PLUS, "+", start_pos),
+                Token(T.INTEGER, "1", lexer.Pos(2, 1)),
+            ],
+        }
+
+        for test, expected in tests.items():
+            with self.subTest(test=test):
+                self.assertEqual(translate(test, tokenise=True), expected)
+
+    def test_matches_reference(self):
+        tests = [
+            "fn main() int {\n    var x = 1.5 + 2//3\n    return x\n}\n",
+            "struct s {\n a str;\n}\nvar t = s(\"multi\nline\")\n",
+            "1..5 1.2.3 1//2//3 4/2 [1:3]\n",
+            "'a' ',' '\n'\n",
+            "a==b!=c<=d>=e::f:g\r\n\t\x0bh",
+            "\u00e9t\u00e9 = 12\u00b2 + x\u00b2y * \u00bd\n",
+        ]
+
+        for test in tests:
+            with self.subTest(test=test):
+                self.assertEqual(lexer.tokenise(test), lexer.tokenise_reference(test))
+
+    def test_tokenise_iter(self):
+        src = (
+            "fn main() int {\n    var s = \"a string that spans chunks\"\n"
+            "    var f = 12.75 + 1//3\n    return x >= 10\n}\n"
+        )
+        expected = lexer.tokenise(src)
+
+        for chunk_size in (1, 2, 3, 5, 64):
+            with self.subTest(chunk_size=chunk_size):
+                tokens = lexer.tokenise_iter(io.StringIO(src), chunk_size=chunk_size)
+                self.assertEqual(list(tokens), expected)
+                tokens = lexer.tokenise_iter(io.BytesIO(src.encode()), chunk_size=chunk_size)
+                self.assertEqual(list(tokens), expected)
+
+        with tempfile.TemporaryFile() as f:
+            f.write(src.encode())
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                self.assertEqual(list(lexer.tokenise_iter(m, chunk_size=7)), expected)
+
+    def test_chunk_errors(self):
+        # an error near the end of a chunk is reported once
+        src = "var a = 'xy' + 1\n"
+        expected = []
+        tokens = lexer.tokenise(src, error_handler=expected.append)
+
+        for split in range(1, len(src)):
+            with self.subTest(split=split):
+                errors = []
+                chunks = [src[:split], src[split:]]
+                res = lexer.lex_chunks(chunks, error_handler=errors.append)
+                self.assertEqual(list(res), tokens)
+                self.assertEqual(errors, expected)
+
+    def test_tokenise_compact(self):
+        tests = [
+            "fn main() int {\n    var x = 1.5 + 2//3\n    return x\n}\n",
+            "struct s {\n a str;\n}\nvar t = s(\"multi\nline\")\n",
+            "var x = 1\n\nvar y\t= 'c'\nvar \u00e9t\u00e9 = 12\u00b2\n",
+        ]
+
+        for test in tests:
+            with self.subTest(test=test):
+                expected = lexer.tokenise(test)
+                tokens = lexer.tokenise_compact(test)
+                self.assertEqual(len(tokens), len(expected))
+                self.assertEqual(list(tokens), expected)
+                self.assertEqual(tokens[-1], expected[-1])
+                self.assertEqual(tokens[1:3], expected[1:3])
+                self.assertEqual(
+                    translate(test, parse=True, compact_tokens=True),
+                    translate(test, parse=True),
+                )
+
 
 if __name__ == "__main__":
     unittest.main()
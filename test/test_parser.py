@@ -1,7 +1,9 @@
+import io
 import logging
 import unittest
-from src.python.lexer import Token, TokenType as T, Pos
+from src.python.lexer import Token, TokenType as T, Pos, tokenise
 import src.python.ast_nodes as ast
+from src.python.parser import Parser, TokenWindow
 from src.python.cmd import translate
 
 
@@ -45,6 +47,15 @@ class TestParser(unittest.TestCase):
                 ast.TypeName(ast.Identifier("int")),
                 ast.Identifier("x"),
             ),
+
+            "var test map[int, str] = x;": ast.VariableDeclr(
+                ast.Identifier("test"),
+                ast.MapType(
+                    ast.TypeName(ast.Identifier("int")),
+                    ast.TypeName(ast.Identifier("str")),
+                ),
+                ast.Identifier("x"),
+            ),
         }
 
         for test, expected in tests.items():
@@ -140,6 +151,13 @@ class TestParser(unittest.TestCase):
                 ast.Identifier("test"),
                 ast.Identifier("x"),
             ),
+            "test[x:y]": ast.IndexExpr(
+                ast.Identifier("test"),
+                ast.RangeExpr(
+                    ast.Identifier("x"),
+                    ast.Identifier("y"),
+                ),
+            ),
             "test.x": ast.SelectorExpr(
                 ast.Identifier("test"),
                 ast.Identifier("x"),
@@ -153,6 +171,20 @@ class TestParser(unittest.TestCase):
                 ast.Identifier("x"),
                 ast.Identifier("y"),
             ),
+            "[x]": ast.SequenceExpr([ast.Identifier("x")]),
+            "map[x: y]": ast.MapExpr([ast.Identifier("x")], [ast.Identifier("y")]),
+            "map[]": ast.MapExpr([], []),
+            "-x.y * z": ast.BinaryExpr(
+                Token(T.STAR, "*", Pos(1, 26)),
+                ast.UnaryExpr(
+                    Token(T.MINUS, "-", Pos(1, 21)),
+                    ast.SelectorExpr(
+                        ast.Identifier("x"),
+                        ast.Identifier("y"),
+                    ),
+                ),
+                ast.Identifier("z"),
+            ),
         }
 
         for test_contents, expected_contents in tests.items():
@@ -261,6 +293,43 @@ class TestParser(unittest.TestCase):
             with self.subTest(test=test):
                 self.assertEqual(translate(test, parse=True), expected)
 
+    def test_large_expr(self):
+        # far longer and deeper than the recursion limit allows
+        n = 20000
+        tests = [
+            # Tests given as a tuple:
+            #   A string for the expression
+            #   A function from a node to its child on the path to the bottom
+            #   The number of nodes on that path and the type at the bottom
+
+            (" + ".join(["x"] * n), lambda node: node.lhs, n - 1, ast.Identifier),
+            ("(" * n + "x" + ")" * n, lambda node: node.value, n, ast.Identifier),
+            ("-!" * n + "x", lambda node: node.rhs, 2 * n, ast.Identifier),
+            ("f(" * n + "x" + ")" * n, lambda node: node.args[0], n, ast.Identifier),
+            ("vec[" * n + "1, 2" + "]" * n, lambda node: node.elements[0], n, ast.Literal),
+            ("a[" * n + "i" + "]" * n, lambda node: node.index, n, ast.Identifier),
+        ]
+
+        for test, child, depth, bottom in tests:
+            with self.subTest(test=test[:20]):
+                program = translate("var a = " + test + ";", parse=True)
+                node = program.declrs[0].value
+                for _ in range(depth):
+                    node = child(node)
+                self.assertIsInstance(node, bottom)
+
+    def test_slotted_nodes(self):
+        tree = translate("fn f(x int) int { return -x * (x + 1); }", parse=True)
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(node)
+            elif isinstance(node, ast.Node):
+                with self.subTest(node=type(node).__name__):
+                    self.assertFalse(hasattr(node, "__dict__"))
+                stack.extend(getattr(node, name) for name in node.__dataclass_fields__)
+
     def test_error_reporting(self):
         tests = [
             # Tests given as a tuple:
@@ -294,3 +363,19 @@ class TestParser(unittest.TestCase):
 
                     for log, expected in zip(cm.output, test[1]):
                         self.assertRegex(log, expected)
+
+    def test_streamed_tokens(self):
+        tests = [
+            "fn test(x int, y int) int {\n    return x + y * 2\n}\n",
+            "struct test {x int; y str;}\nvar z = test(1, \"a\")\n",
+            "fn main() {\n    while a < b {\n        a = a + 1;\n    }\n}",
+        ]
+
+        for test in tests:
+            with self.subTest(test=test):
+                expected = translate(test, parse=True)
+                self.assertEqual(translate(io.StringIO(test), parse=True), expected)
+                parser = Parser(iter(tokenise(test)))
+                self.assertIsInstance(parser.tokens, TokenWindow)
+                self.assertEqual(parser.parse_program(), expected)
+                self.assertLessEqual(len(parser.tokens.buffer), parser.tokens.depth + 1)
@@ -0,0 +1,62 @@
+import io
+import unittest
+
+from src.python.lexer import Pos, tokenise
+from src.python.parser import Parser
+from src.python.interpreter import Interpreter
+from src.python.trace import TraceEvent, TraceRecorder, TraceCounter, TraceWriter
+from src.python import cmd
+
+
+class TestTrace(unittest.TestCase):
+    src = "fn main() int {\n    var a = 1 + 2\n    return a * 3\n}\n"
+
+    def test_phases(self):
+        recorder = TraceRecorder()
+        self.assertEqual(cmd.exec_src(self.src, tracer=recorder).value, 9)
+        events = list(recorder.events)
+        phases = []
+        for event in events:
+            if event.phase not in phases:
+                phases.append(event.phase)
+        self.assertEqual(phases, ["parse", "ir", "typecheck", "interpret"])
+
+        parsed = [event for event in events if event.phase == "parse"]
+        self.assertEqual(parsed, [
+            TraceEvent("parse", "BinaryExpr", Pos(2, 13)),
+            TraceEvent("parse", "VariableDeclr", Pos(2, 5)),
+            TraceEvent("parse", "DeclrStmt", Pos(2, 5)),
+            TraceEvent("parse", "BinaryExpr", Pos(3, 13)),
+            TraceEvent("parse", "ReturnStmt", Pos(3, 6)),
+            TraceEvent("parse", "FunctionDeclr", Pos(1, 1)),
+        ])
+
+    def test_binary_operands_evaluated_once(self):
+        counter = TraceCounter()
+        cmd.exec_src(self.src, tracer=counter)
+        # each operand is evaluated once, and its ref loaded once
+        self.assertEqual(counter.counts["interpret", "Binary"], 2)
+        self.assertEqual(counter.counts["interpret", "Constant"], 3)
+        self.assertEqual(counter.counts["interpret", "Load"], 1)
+
+    def test_sinks(self):
+        recorder = TraceRecorder(maxlen=3)
+        cmd.translate(self.src, tracer=recorder)
+        self.assertEqual(len(recorder.events), 3)
+
+        stream = io.StringIO()
+        writer = TraceWriter(stream)
+        writer(TraceEvent("parse", "Literal", Pos(1, 2)))
+        writer(TraceEvent("interpret", "Load", None))
+        self.assertEqual(stream.getvalue(), "parse\tLiteral\t1:2\ninterpret\tLoad\t-\n")
+
+    def test_disabled(self):
+        # without a tracer the phases run their methods directly
+        parser = Parser(tokenise(self.src))
+        self.assertEqual(parser.parse_expression.__func__, Parser.parse_expression)
+        interpreter = Interpreter()
+        self.assertEqual(interpreter.eval_node.__func__, Interpreter.eval_node)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from src.python.interpreter import StaObject
+from src.python import builtin
+from src.python import cmd
+
+
+class TestTranspiler(unittest.TestCase):
+    src = """
+    var calls = 0
+    fn sum(n int) int {
+        var i = 0
+        var s = 0
+        calls = calls + 1
+        while i < n {
+            s = s + i
+            i = i + 1
+        }
+        return s
+    }
+    fn main() int {
+        return sum(10) + calls
+    }
+    """
+
+    def test_source(self):
+        self.assertEqual(cmd.transpile_src(self.src), "\n".join([
+            "def program():",
+            "    global v0_calls",
+            "    v0_calls = None",
+            "    v0_calls = 0",
+            "    return None",
+            "",
+            "",
+            "def f0_sum(n_0):",
+            "    global v0_calls",
+            "    block = 0",
+            "    while True:",
+            "        if block == 0:",
+            "            i_1 = 0",
+            "            s_2 = 0",
+            "            v0_calls = (v0_calls + 1)",
+            "            block = 1",
+            "        elif block == 1:",
+            "            if (i_1 < n_0):",
+            "                block = 2",
+            "            else:",
+            "                block = 3",
+            "        elif block == 2:",
+            "            s_2 = (s_2 + i_1)",
+            "            i_1 = (i_1 + 1)",
+            "            block = 1",
+            "        else:",
+            "            return s_2",
+            "",
+            "",
+            "def f1_main():",
+            "    return (f0_sum(10) + v0_calls)",
+            "",
+        ]))
+
+    def test_code_cache(self):
+        expected = StaObject(builtin.types["int"], 46)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            def code_entries():
+                return [name for name in os.listdir(cache_dir) if name.endswith(".pyc")]
+
+            self.assertEqual(cmd.transpile_and_run_src(self.src, cache_dir=cache_dir), expected)
+            [name] = code_entries()
+            self.assertEqual(cmd.transpile_and_run_src(self.src, cache_dir=cache_dir), expected)
+            self.assertEqual(code_entries(), [name])
+
+            # a damaged entry is compiled again
+            with open(os.path.join(cache_dir, name), "wb") as f:
+                f.write(b"not code")
+            with self.assertLogs(level=logging.WARNING):
+                res = cmd.transpile_and_run_src(self.src, cache_dir=cache_dir)
+            self.assertEqual(res, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
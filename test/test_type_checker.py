@@ -164,7 +164,7 @@ class TestTypeChecker(unittest.TestCase):
             ),
             "a = \"a\" + \"b\"": (
                 " DECLARE a [str]\n"
-                " ASSIGN a [str] <- ([a] [str] + [b] [str]) [str]"
+                " ASSIGN a [str] <- (\"a\" [str] + \"b\" [str]) [str]"
             ),
             "a = 3 / 2": (
                 " DECLARE a [float]\n"
@@ -179,6 +179,15 @@ class TestTypeChecker(unittest.TestCase):
                 " DECLARE a [bool]\n"
                 " ASSIGN a [bool] <- !True [bool] [bool]"
             ),
+            "a = [1, 2] * 2": (
+                " DECLARE a [sequence[int]]\n"
+                " ASSIGN a [sequence[int]] <- ([1,2] [sequence[int]] * 2 [int]) [sequence[int]]"
+            ),
+            "a = vec[1.5] > vec[2.5]": (
+                " DECLARE a [vec[bool]]\n"
+                " ASSIGN a [vec[bool]] <- "
+                "(vec[1.5] [vec[float]] > vec[2.5] [vec[float]]) [vec[bool]]"
+            ),
         }
 
         for test_contents, expected_contents in tests.items():
@@ -199,6 +208,13 @@ class TestTypeChecker(unittest.TestCase):
             "x - \"a\"",
             "!1.5",
             "-\"a\"",
+            "[1, 2] + 1.5",
+            "[1, 2] + vec[1, 2]",
+            "[true] * [false]",
+            "sum(1)",
+            "mean(vec[true])",
+            "1[0:1]",
+            "[1, 2][0:1.5]",
         ]
 
         for test_contents in tests:
@@ -213,6 +229,15 @@ class TestTypeChecker(unittest.TestCase):
             "while x {}",
             "while 7 {}",
             "return x;",
+            "var s = \"ab\"; s[0] = 1;",
+            "var a = [1, 2]; a[0:1] = [3];",
+            "var v = vec[1]; v.push(1.5);",
+            "var v = vec[1]; v.push();",
+            "var a = [1]; a.push(2);",
+            "var m = map[1: 2]; m.insert(1, 1.5);",
+            "var m map[str, int] = map[1: 2];",
+            "var m = map[1: 2]; m.get(\"a\");",
+            "var m = map[vec[1]: 2];",
         ]
 
         for test_contents in tests:
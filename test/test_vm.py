@@ -0,0 +1,50 @@
+import unittest
+
+from src.python.interpreter import StaObject
+from src.python.vm import VM, disassemble
+from src.python import builtin
+from src.python import cmd
+
+
+class TestVM(unittest.TestCase):
+    src = """
+    fn sum(n int) int {
+        var i = 0
+        var s = 0
+        while i < n {
+            s = s + i
+            i = i + 1
+        }
+        return s
+    }
+    """
+
+    def test_lowering(self):
+        vm = VM(entry_name="sum")
+        vm.load(cmd.translate(self.src))
+        code = vm.entry
+        self.assertEqual(code.ops.typecode, "l")
+        # n, i and s take the frame's slots, then a temporary, then the constants
+        self.assertEqual(code.template, [None, None, None, None, 0, 1])
+        self.assertEqual(disassemble(code), [
+            "   0 move      1 4",
+            "   3 move      2 4",
+            "   6 <         3 1 0",
+            # the loop body follows the condition, so only the back edge jumps
+            "  10 jumpf     3 23",
+            "  13 +         2 2 1",
+            "  17 +         1 1 5",
+            "  21 jump      6",
+            "  23 ret       2",
+        ])
+
+    def test_boxing(self):
+        # values are boxed only where they leave the VM
+        vm = VM(entry_name="sum")
+        vm.load(cmd.translate(self.src))
+        res = vm.call(vm.entry, [StaObject(builtin.types["int"], 10)])
+        self.assertEqual(res, StaObject(builtin.types["int"], 45))
+
+
+if __name__ == "__main__":
+    unittest.main()